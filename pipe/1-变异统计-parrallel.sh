@@ -8,11 +8,13 @@ PYTHON="/home/luolintao/miniconda3/envs/pyg/bin/python3"
 SCRIPT="/mnt/f/OneDrive/文档（科研）/脚本/Download/1-Variants-stat/python/2-伪二倍体文件统计.py"
 DATA_DIR="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/conf/东亚低地和高地/"
 OUT_DIR="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/output/东亚低地和高地/"
+# 结果缓存：输入 VCF 和参数未变化的群体直接复用上次的结果，只统计新增 / 变化的群体
+CACHE_DIR="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/cache/"
 
 # 确保输出目录存在
 mkdir -p "$OUT_DIR"
 
-export PYTHON SCRIPT OUT_DIR
+export PYTHON SCRIPT OUT_DIR CACHE_DIR
 
 # 并行执行
 find "$DATA_DIR" -maxdepth 1 -type f -name '*.vcf.gz' | \
@@ -22,7 +24,8 @@ parallel -j $JOBS '
   "$PYTHON" "$SCRIPT" \
     --vcf "$infile" \
     --out  "$OUT_DIR/${base}.csv" \
-    --var-out "$OUT_DIR/${base}.var.csv"
+    --var-out "$OUT_DIR/${base}.var.csv" \
+    --cache-dir "$CACHE_DIR" --cache-max-size 50
 '
 
 echo "All done."
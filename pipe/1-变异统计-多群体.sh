@@ -0,0 +1,43 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# 多群体单次遍历：直接读取合并后的总 VCF 和样本列表目录（每个 .txt 为一个群体），
+# 一次遍历输出所有群体的 <群体>.csv / <群体>.var.csv，
+# 代替 pipe/0_循环分配vcf.sh + pipe/1-变异统计-parrallel.sh 的“先拆分再逐个统计”。
+
+PYTHON="/home/luolintao/miniconda3/envs/pyg/bin/python3"
+SCRIPT="/mnt/f/OneDrive/文档（科研）/脚本/Download/1-Variants-stat/python/2-伪二倍体文件统计.py"
+VCF_FILE="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/global/merged_biallelic_7544.NoN.vcf.gz"
+SAMPLE_DIR="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/conf/东亚低地和高地/"
+OUT_DIR="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/output/东亚低地和高地/"
+
+"$PYTHON" "$SCRIPT" \
+  --vcf "$VCF_FILE" \
+  --sample-dir "$SAMPLE_DIR" \
+  --out-dir "$OUT_DIR"
+
+# 两个群体的联合频率谱 / 联合 MAF 分箱矩阵（代替 7-分箱堆叠.py 的两表合并），
+# 群体名即样本列表 .txt 的文件名：
+# "$PYTHON" "$SCRIPT" \
+#   --vcf "$VCF_FILE" \
+#   --sample-dir "$SAMPLE_DIR" \
+#   --out-dir "$OUT_DIR" \
+#   --summary-only --joint Global,East_Asia
+
+# 直接按样本信息表定义群体（代替 jupyter/1.ipynb 写出 ID 列表），父群体由叶子计数相加得到：
+# "$PYTHON" "$SCRIPT" \
+#   --vcf "$VCF_FILE" \
+#   --metadata "/mnt/f/OneDrive/文档（科研）/P0_幽门螺旋杆菌/基础信息表/HP数据收集2.xlsx" \
+#   --sheet HP数据收集 --where "\`7544个样本\` == 'YES'" \
+#   --group "East_Asia_High=Continent == 'East_Asia' and Elevation >= 2000" \
+#   --group "East_Asia_Low=Continent == 'East_Asia' and Elevation < 2000" \
+#   --group-by Continent,Chromopainter4 \
+#   --out-dir "$OUT_DIR"
+
+# 同一个 VCF 反复统计时，先转换为基因型存储（只需一次），之后 --vcf 直接指定 .gtstore，
+# 只解压群体用到的样本块，不再重复解析文本 VCF：
+# "$PYTHON" "$(dirname "$SCRIPT")/10-基因型存储转换.py" \
+#   --vcf "$VCF_FILE" --out "${VCF_FILE%.vcf.gz}.gtstore"
+# VCF_FILE="${VCF_FILE%.vcf.gz}.gtstore"
+
+echo "All done."
@@ -16,6 +16,9 @@
 #    - 输出总体统计结果（Africa_单倍体.csv）和变异位点统计（Africa.var_单倍体.csv）。
 #
 # 每个 Python 脚本均通过命令行参数指定输入 VCF 文件、输出统计文件和变异位点统计文件。
+#
+# 也可以使用统一入口 9-变异统计.py，自动识别倍性和 AN/AC 来源（INFO 或基因型）：
+#   --ploidy auto --ac-source auto
 # -----------------------------------------------------------------------------
 #! 请根据自己的文件类型使用下列任意一个脚本
 # 统计
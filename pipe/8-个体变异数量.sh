@@ -24,4 +24,5 @@ find "$INPUT_DIR" -type f \( -name '*.vcf' -o -name '*.vcf.gz' \) | \
     '"$PYTHON"' '"$SCRIPT"' \
       --vcf {} \
       --out '"$OUTPUT_DIR"'/${base}_variants_per_genome.csv
+    # 需要按频率 / 类型 / Singleton 分类的个体变异数时加 --by-class（输出宽表）
   '
@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# 一次运行整个流程：拆分子集 → 统计 → 结果整理 → 韦恩数据 / 分箱堆叠 → 个体变异数量，
+# 代替依次运行 pipe/0_循环分配vcf.sh、1-变异统计-parrallel.sh、2-结果整理.sh、
+# 7-分箱堆叠.sh、8-个体变异数量.sh。输出比输入新的任务自动跳过，重跑只做变化的部分；
+# 各任务的耗时和峰值内存记录在 "$OUT_DIR/flow_timing.tsv"。
+
+PYTHON="/home/luolintao/miniconda3/envs/pyg/bin/python3"
+SCRIPT="/mnt/f/OneDrive/文档（科研）/脚本/Download/1-Variants-stat/python/13-流程编排.py"
+VCF_FILE="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/global/merged_biallelic_7544.NoN.vcf.gz"
+SAMPLE_DIR="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/conf/东亚低地和高地/"
+OUT_DIR="/mnt/d/幽门螺旋杆菌/Script/分析结果/2-变异统计/output/东亚低地和高地/"
+
+# 先加 --dry-run 查看哪些任务会运行；需要两个群体的 MAF 分箱对比时加 --bins 群体A,群体B
+"$PYTHON" "$SCRIPT" \
+  --vcf "$VCF_FILE" \
+  --sample-dir "$SAMPLE_DIR" \
+  --out-dir "$OUT_DIR" \
+  --jobs 16 --mem-budget 48 \
+  --counts-args="--by-class"
+
+echo "All done."
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+10-基因型存储转换.py
+
+把（双等位的）VCF 一次性转换为基因型存储目录（.gtstore，格式见 store_utils.py）：
+基因型编码为 int8 ALT 剂量，按 位点块 × 样本块 分块、zlib 压缩存放；
+CHROM/POS/REF/ALT/FILTER 及 INFO/AN、INFO/AC 按列存放并内存映射读取。
+
+之后 1/2/3/9 统计脚本和 8-个体变异数量.py 的 --vcf 可直接指定 .gtstore 目录，
+结果与读取原 VCF 完全相同；多群体模式只解压群体用到的样本块，
+按区域并行 / 断点时只读取区域所在的位点块，不再重复解压、解析文本 VCF。
+
+多等位位点无法用 ALT 剂量表示，转换前请先拆分或过滤，如：
+    bcftools view -m2 -M2 in.vcf.gz -Oz -o in.biallelic.vcf.gz
+
+用法：
+    python 10-基因型存储转换.py --vcf merged_biallelic_7544.NoN.vcf.gz \
+        --out merged_biallelic_7544.NoN.gtstore
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from cyvcf2 import VCF
+from cache_utils import vcf_identity
+from profile_utils import add_profile_args, start_profile, finish_profile, profile_records, stage
+from store_utils import StoreWriter, STORE_SUFFIX, encode_genotypes
+from vcf_utils import derive_source
+
+
+def convert(vcf_path, out_path, chunk_sites, chunk_samples, compress, level):
+    """逐条读取 VCF 写入存储，返回写入的位点数。"""
+    vcf = VCF(vcf_path)
+    info_fields = []
+    try:
+        for tag in ("AN", "AC"):
+            vcf.get_header_type(tag)
+        info_fields = ["AN", "AC"]
+    except KeyError:
+        pass
+    try:
+        lengths = list(vcf.seqlens)
+    except Exception:
+        lengths = [0] * len(vcf.seqnames)
+
+    try:
+        n_sites = _convert_records(vcf, vcf_path, out_path, chunk_sites, chunk_samples,
+                                   compress, level, info_fields, lengths)
+    except BaseException:
+        # 中途退出时不留下半个存储
+        shutil.rmtree(out_path.rstrip("/") + ".tmp", ignore_errors=True)
+        raise
+    return n_sites
+
+
+def _convert_records(vcf, vcf_path, out_path, chunk_sites, chunk_samples,
+                     compress, level, info_fields, lengths):
+    contig_index = {name: k for k, name in enumerate(vcf.seqnames)}
+    writer = None
+    last = (-1, 0)
+    for var in profile_records(vcf):
+        if len(var.ALT) != 1:
+            sys.exit(f"{var.CHROM}:{var.POS} 为多等位位点，基因型存储只支持双等位位点"
+                     "（先用 bcftools view -m2 -M2 过滤或 bcftools norm -m - 拆分）。")
+        if writer is None:
+            writer = StoreWriter(out_path, vcf.samples, vcf.seqnames, lengths, var.ploidy,
+                                 chunk_sites, chunk_samples, compress, level, info_fields,
+                                 {"path": os.path.abspath(vcf_path),
+                                  "identity": vcf_identity(vcf_path)})
+        if var.ploidy != writer.meta["ploidy"]:
+            sys.exit(f"{var.CHROM}:{var.POS} 的倍性（{var.ploidy}）与前面的记录不同，无法转换。")
+        key = (contig_index.get(var.CHROM, -1), var.POS)
+        if key[0] < 0:
+            sys.exit(f"{var.CHROM} 不在 VCF header 的 contig 列表中。")
+        if key < last:
+            sys.exit(f"{var.CHROM}:{var.POS} 未按 header 中的 contig 顺序和位置排序（先运行 bcftools sort）。")
+        last = key
+
+        codes = encode_genotypes(var.genotype.array(), var.ploidy)
+        if codes is None:
+            sys.exit(f"{var.CHROM}:{var.POS} 的基因型中有无法编码的等位基因。")
+        an, ac = -1, -1
+        if info_fields:
+            an = var.INFO.get("AN")
+            ac = var.INFO.get("AC")
+            if isinstance(ac, (list, tuple)):
+                ac = ac[0]
+            an = -1 if an is None else int(an)
+            ac = -1 if ac is None else int(ac)
+        with stage("写入存储"):
+            writer.add(var.CHROM, var.POS, var.REF, var.ALT[0], var.FILTER or "",
+                       bool(var.is_snp), codes, an, ac)
+    vcf.close()
+
+    if writer is None:
+        sys.exit(f"{vcf_path} 中没有记录，未生成存储。")
+    with stage("关闭输出"):
+        writer.close()
+    return writer.n_sites
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="把双等位 VCF 转换为分块压缩的基因型存储（.gtstore 目录）"
+    )
+    parser.add_argument("-i", "--vcf", required=True, help="输入 VCF.gz 文件")
+    parser.add_argument(
+        "-o", "--out",
+        help=f"输出存储目录 [默认: 与 VCF 同名的 <基本名>{STORE_SUFFIX}]"
+    )
+    parser.add_argument(
+        "--chunk-sites", type=int, default=16384,
+        help="每个基因型块的位点数 [默认: 16384]"
+    )
+    parser.add_argument(
+        "--chunk-samples", type=int, default=1024,
+        help="每个基因型块的样本数，多群体模式只读取用到的样本块 [默认: 1024]"
+    )
+    parser.add_argument(
+        "--compress", choices=["zlib", "none"], default="zlib",
+        help="基因型块压缩方式：zlib / none（不压缩，直接内存映射）[默认: zlib]"
+    )
+    parser.add_argument("--level", type=int, default=1, help="zlib 压缩级别 1-9 [默认: 1]")
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.vcf):
+        sys.exit(f"找不到 VCF 文件：{args.vcf}")
+    out = args.out or os.path.join(os.path.dirname(args.vcf), derive_source(args.vcf) + STORE_SUFFIX)
+    if os.path.exists(out):
+        sys.exit(f"输出目录 {out} 已存在，请先删除或指定其他 --out。")
+    if args.chunk_sites <= 0 or args.chunk_samples <= 0:
+        sys.exit("--chunk-sites / --chunk-samples 必须为正整数。")
+
+    print(f"[INFO] 开始转换：{args.vcf} -> {out}")
+    start_profile(args, args.vcf)
+    n_sites = convert(args.vcf, out, args.chunk_sites, args.chunk_samples,
+                      args.compress, args.level)
+    finish_profile(args)
+    print(f"[INFO] 完成：{n_sites} 个位点已写入 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+11-模拟VCF生成.py
+
+生成可复现的模拟 VCF，用于在没有真实数据（7544 个样本的合并 VCF）时
+测试和衡量各统计脚本的吞吐量（见 12-性能基准.py）：
+- 样本数、位点数、contig 数可调
+- 倍性：haploid（GT 为 0/1/.）、diploid（真二倍体，两个等位基因独立抽取）、
+  pseudo-diploid（单倍体按二倍体写出：0/0、1/1，--het-rate 比例的杂合）
+- 多等位位点比例、indel 比例、缺失率、非 PASS 位点比例
+- 等位基因频率分布：neutral（中性模型下密度 ∝ 1/x，稀有变异占多数）/
+  uniform / beta:a,b
+- INFO/AN、INFO/AC 按 bcftools 的规则由基因型计算（伪二倍体按二倍体计数）
+
+输出 .vcf.gz 时为 BGZF 压缩，并尝试建立 .csi 索引（需要 pysam 或 bcftools，
+否则只提示，按区域并行的模式无法使用）。
+
+用法：
+    python 11-模拟VCF生成.py --out sim.vcf.gz --samples 7544 --sites 200000 \
+        --ploidy pseudo-diploid --multiallelic-rate 0.02 --indel-rate 0.1
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+from cyvcf2 import Writer
+from profile_utils import add_profile_args, start_profile, finish_profile, add_rows, stage
+
+PLOIDIES = ("haploid", "diploid", "pseudo-diploid")
+BASES = np.array(list("ACGT"))
+
+
+def parse_af_dist(text):
+    """解析 --af-dist：neutral / uniform / beta:a,b，返回 (名称, 参数)。"""
+    name, _, params = text.partition(":")
+    if name in ("neutral", "uniform") and not params:
+        return name, ()
+    if name == "beta":
+        try:
+            a, b = (float(x) for x in params.split(","))
+        except ValueError:
+            sys.exit(f"--af-dist 格式应为 beta:a,b：{text}")
+        if a <= 0 or b <= 0:
+            sys.exit(f"beta 分布的参数必须为正：{text}")
+        return name, (a, b)
+    sys.exit(f"无法识别的 --af-dist：{text}（可选 neutral / uniform / beta:a,b）")
+
+
+def draw_af(rng, dist, size, n_chrom):
+    """抽取 size 个位点的 ALT 总频率，限制在 [1/n_chrom, 1)。"""
+    name, params = dist
+    lo = 1.0 / n_chrom
+    if name == "neutral":
+        # 密度 ∝ 1/x 在 [lo, 1-lo] 上：逆变换抽样
+        x = lo * ((1 - lo) / lo) ** rng.random(size)
+    elif name == "uniform":
+        x = rng.uniform(lo, 1 - lo, size)
+    else:
+        x = rng.beta(*params, size)
+    return np.clip(x, lo, 1 - lo)
+
+
+def make_alleles(rng, n_alt, indel_rate):
+    """随机生成 REF 和 n_alt 个互不相同的 ALT（SNV 或 indel）。"""
+    ref = str(rng.choice(BASES))
+    if rng.random() < indel_rate:
+        # 缺失：REF 延长，第一个 ALT 为锚定碱基
+        if rng.random() < 0.5:
+            ref += "".join(rng.choice(BASES, rng.integers(1, 6)))
+            alts = [ref[0]]
+        else:
+            alts = [ref + "".join(rng.choice(BASES, rng.integers(1, 6)))]
+    else:
+        alts = [str(rng.choice(BASES[BASES != ref[0]]))]
+    while len(alts) < n_alt:
+        if rng.random() < indel_rate or len(ref) > 1:
+            alt = ref[0] + "".join(rng.choice(BASES, rng.integers(1, 6)))
+        else:
+            alt = str(rng.choice(BASES[BASES != ref[0]]))
+        if alt != ref and alt not in alts:
+            alts.append(alt)
+    return ref, alts
+
+
+def gt_table(ploidy, max_alleles):
+    """
+    基因型编码 -> GT 字符串表。haploid 的编码为等位基因 a（0..max_alleles-1），
+    二倍体为 a * max_alleles + b；最后一项为缺失。
+    """
+    if ploidy == "haploid":
+        strings = [str(a) for a in range(max_alleles)] + ["."]
+    else:
+        strings = [f"{a}/{b}" for a in range(max_alleles) for b in range(max_alleles)] + ["./."]
+    return np.array(strings, dtype=object)
+
+
+def simulate_block(rng, n_sites, n_samples, n_alts, args, dist):
+    """
+    模拟一批位点的基因型，返回 (编码矩阵 位点×样本, AN 数组, 各位点 AC 列表)。
+    编码含义见 gt_table；每个位点的 ALT 频率为总频率按 Dirichlet 拆分。
+    """
+    max_alleles = int(n_alts.max()) + 1
+    n_chrom = n_samples * (1 if args.ploidy == "haploid" else 2)
+    total = draw_af(rng, dist, n_sites, n_chrom)
+    freqs = np.zeros((n_sites, max_alleles))
+    for k in range(n_sites):
+        freqs[k, 1:n_alts[k] + 1] = total[k] * rng.dirichlet(np.ones(n_alts[k]))
+    freqs[:, 0] = 1 - freqs[:, 1:].sum(axis=1)
+    cum = np.cumsum(freqs, axis=1)[:, None, :-1]
+
+    def draw():
+        alleles = (rng.random((n_sites, n_samples))[:, :, None] >= cum).sum(axis=2)
+        # 累计频率的舍入误差可能越过最后一个 ALT
+        return np.minimum(alleles, n_alts[:, None])
+
+    a = draw()
+    if args.ploidy == "haploid":
+        alleles = [a]
+        codes = a
+    else:
+        if args.ploidy == "diploid":
+            b = draw()
+        else:
+            # 伪二倍体：同型写出，少量杂合换成另一个随机等位基因
+            het = rng.random((n_sites, n_samples)) < args.het_rate
+            shift = rng.integers(1, n_alts[:, None] + 1, (n_sites, n_samples))
+            b = np.where(het, (a + shift) % (n_alts[:, None] + 1), a)
+        alleles = [a, b]
+        codes = a * max_alleles + b
+    missing = rng.random((n_sites, n_samples)) < args.missing_rate
+    codes = np.where(missing, len(gt_table(args.ploidy, max_alleles)) - 1, codes)
+
+    # INFO/AN、AC：与 bcftools +fill-tags 相同，缺失不计入
+    called = ~missing
+    an = called.sum(axis=1) * len(alleles)
+    acs = []
+    for k in range(n_sites):
+        counts = sum(np.bincount(x[k][called[k]], minlength=max_alleles) for x in alleles)
+        acs.append(counts[1:n_alts[k] + 1].tolist())
+    return codes, an, acs, max_alleles
+
+
+def build_header(samples, contigs, lengths):
+    lines = [
+        "##fileformat=VCFv4.2",
+        '##FILTER=<ID=PASS,Description="All filters passed">',
+        '##FILTER=<ID=LowQual,Description="Low quality">',
+    ]
+    lines += [f"##contig=<ID={c},length={n}>" for c, n in zip(contigs, lengths)]
+    lines += [
+        '##INFO=<ID=AC,Number=A,Type=Integer,Description="Allele count in genotypes">',
+        '##INFO=<ID=AN,Number=1,Type=Integer,Description="Total number of alleles in called genotypes">',
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t" + "\t".join(samples),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class TextOutput:
+    """未压缩的 .vcf 输出。"""
+
+    def __init__(self, path, header):
+        self._f = open(path, "w", encoding="utf-8")
+        self._f.write(header)
+
+    def write(self, line):
+        self._f.write(line + "\n")
+
+    def close(self):
+        self._f.close()
+
+
+class BgzfOutput:
+    """.vcf.gz 输出：经 cyvcf2（htslib）写为 BGZF，可建立索引。"""
+
+    def __init__(self, path, header):
+        self._w = Writer.from_string(path, header, mode="wz")
+
+    def write(self, line):
+        self._w.write_record(self._w.variant_from_string(line))
+
+    def close(self):
+        self._w.close()
+
+
+def build_index(path):
+    """为 BGZF 压缩的 VCF 建立 .csi 索引：优先 pysam，其次 bcftools；都没有时返回 False。"""
+    try:
+        import pysam
+    except ImportError:
+        pysam = None
+    if pysam is not None:
+        pysam.tabix_index(path, preset="vcf", csi=True, force=True)
+        return True
+    if shutil.which("bcftools"):
+        subprocess.run(["bcftools", "index", "-f", path], check=True)
+        return True
+    return False
+
+
+def simulate(args):
+    """按参数生成 VCF，返回写出的位点数。"""
+    rng = np.random.default_rng(args.seed)
+    dist = parse_af_dist(args.af_dist)
+    samples = [f"{args.sample_prefix}{i}" for i in range(args.samples)]
+    contigs = [f"chr{k + 1}" for k in range(args.contigs)]
+
+    # 位点均分到各 contig，位置按随机间隔递增
+    per_contig = np.bincount(np.arange(args.sites) % args.contigs, minlength=args.contigs)
+    positions = [np.cumsum(rng.integers(1, 2 * args.mean_gap, n)) for n in per_contig]
+    lengths = [int(p[-1]) + args.mean_gap if len(p) else args.mean_gap for p in positions]
+
+    header = build_header(samples, contigs, lengths)
+    out = (BgzfOutput if args.out.endswith(".gz") else TextOutput)(args.out, header)
+    n_written = 0
+    try:
+        for contig, pos in zip(contigs, positions):
+            for start in range(0, len(pos), args.block_sites):
+                block = pos[start:start + args.block_sites]
+                n = len(block)
+                extra = rng.random(n) < args.multiallelic_rate
+                n_alts = 1 + extra + (extra & (rng.random(n) < 0.2))
+                with stage("模拟基因型"):
+                    codes, an, acs, max_alleles = simulate_block(
+                        rng, n, args.samples, n_alts, args, dist)
+                table = gt_table(args.ploidy, max_alleles)
+                filters = np.where(rng.random(n) < args.filter_rate, "LowQual", "PASS")
+                with stage("写出记录"):
+                    for k in range(n):
+                        ref, alts = make_alleles(rng, int(n_alts[k]), args.indel_rate)
+                        info = f"AC={','.join(map(str, acs[k]))};AN={an[k]}"
+                        out.write("\t".join([
+                            contig, str(block[k]), ".", ref, ",".join(alts), "50",
+                            filters[k], info, "GT", "\t".join(table[codes[k]]),
+                        ]))
+                n_written += n
+                add_rows(n)
+    finally:
+        with stage("关闭输出"):
+            out.close()
+    return n_written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="生成可复现的模拟 VCF（倍性、多等位、indel、缺失率和频率分布可调）"
+    )
+    parser.add_argument("-o", "--out", required=True, help="输出 .vcf.gz（或未压缩的 .vcf）")
+    parser.add_argument("-n", "--samples", type=int, default=1000, help="样本数 [默认: 1000]")
+    parser.add_argument("-m", "--sites", type=int, default=10000, help="位点数 [默认: 10000]")
+    parser.add_argument("--contigs", type=int, default=2, help="contig 数 [默认: 2]")
+    parser.add_argument(
+        "-p", "--ploidy", choices=PLOIDIES, default="pseudo-diploid",
+        help="倍性：haploid / diploid / pseudo-diploid [默认: pseudo-diploid]"
+    )
+    parser.add_argument(
+        "--multiallelic-rate", type=float, default=0.0,
+        help="多等位位点比例（2 个 ALT，其中 20%% 为 3 个）[默认: 0]"
+    )
+    parser.add_argument("--indel-rate", type=float, default=0.1, help="indel 比例 [默认: 0.1]")
+    parser.add_argument("--missing-rate", type=float, default=0.01,
+                        help="基因型缺失率 [默认: 0.01]")
+    parser.add_argument("--het-rate", type=float, default=0.002,
+                        help="pseudo-diploid 中杂合基因型的比例 [默认: 0.002]")
+    parser.add_argument("--filter-rate", type=float, default=0.05,
+                        help="FILTER 为 LowQual（非 PASS）的位点比例 [默认: 0.05]")
+    parser.add_argument(
+        "--af-dist", default="neutral",
+        help="ALT 频率分布：neutral（密度 ∝ 1/x）/ uniform / beta:a,b [默认: neutral]"
+    )
+    parser.add_argument("--mean-gap", type=int, default=50, help="相邻位点的平均间隔（bp）[默认: 50]")
+    parser.add_argument("--sample-prefix", default="S", help="样本 ID 前缀 [默认: S]")
+    parser.add_argument("--seed", type=int, default=1, help="随机数种子 [默认: 1]")
+    parser.add_argument("--block-sites", type=int, default=256,
+                        help="每批模拟的位点数（影响内存）[默认: 256]")
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    if args.samples <= 0 or args.sites <= 0 or args.contigs <= 0:
+        sys.exit("--samples / --sites / --contigs 必须为正整数。")
+    for name in ("multiallelic_rate", "indel_rate", "missing_rate", "het_rate", "filter_rate"):
+        if not 0 <= getattr(args, name) <= 1:
+            sys.exit(f"--{name.replace('_', '-')} 必须在 0 到 1 之间。")
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    print(f"[INFO] 生成 {args.samples} 个样本 × {args.sites} 个位点（{args.ploidy}）-> {args.out}")
+    start_profile(args)
+    n_sites = simulate(args)
+    if args.out.endswith(".gz"):
+        with stage("建立索引"):
+            indexed = build_index(args.out)
+        if indexed:
+            print(f"[INFO] 已建立索引：{args.out}.csi")
+        else:
+            print(f"[WARN] 未找到 pysam 或 bcftools，未建立索引；并行模式需先运行：bcftools index {args.out}")
+    finish_profile(args)
+    print(f"[INFO] 完成：{n_sites} 个位点")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+12-性能基准.py
+
+在模拟数据（11-模拟VCF生成.py）上按多个规模运行流程的各个阶段，记录
+墙钟时间、位点吞吐量（sites/s）和峰值内存（最大单进程 RSS），并检查各优化模式
+（多进程、基因型存储、断点等）的输出与基准模式逐字节相同。
+
+阶段与模式：
+  stats   9-变异统计.py                 base / threads / store / checkpoint / auto
+  groups  2-伪二倍体文件统计.py 多群体   base / threads / store
+  burden  8-个体变异数量.py --by-class   base / threads / store / auto
+  tidy    4-结果整理.py --var-dir       base / parquet（输入为 Parquet 详情）
+  bins    7-分箱堆叠.py                 base / parquet
+每个阶段的 base 以单进程读取 VCF；其余模式的输出与 base 比较。
+auto 模式不给 --ploidy（按基因型自动识别倍性），检查识别结果与模拟数据的倍性一致：
+伪二倍体数据含 --het-rate 比例的零星杂合，不应被识别为 diploid。
+--reference 指定另一份 python/ 脚本目录（如系列改动前的 git worktree）时，
+用旧版脚本的命令行运行各阶段的等价用法（模式 reference），逐文件与 base 比较：
+  stats   按倍性用 1/2/3 号脚本 --vcf --out --var-out
+  groups  先用 bcftools view --samples-file 取各群体子集 VCF（同 pipe/0_循环分配vcf.sh，
+          不计入用时），再逐个群体运行 2 号脚本
+  burden  8 号脚本不加 --by-class，只比较旧版输出的列（sample, variant_count, Source）
+  tidy    4 号脚本 --var-dir，忽略行顺序（透视表现在按基因组位置排序）
+  bins    7 号脚本，参数相同
+
+模拟数据和群体样本列表按参数缓存在 --work-dir 下，重复运行不再生成。
+结果追加到 --out（CSV）：scale, samples, sites, ploidy, stage, mode, threads,
+wall_s, sites_per_s, peak_rss_mb, exit_code, identical。
+
+用法：
+    python 12-性能基准.py --scales 200x5000,1000x20000 --ploidy pseudo-diploid \
+        --threads 4 --work-dir bench --out bench/benchmark.csv
+"""
+
+import argparse
+import csv
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("stats", "groups", "burden", "tidy", "bins")
+RESULT_HEADER = [
+    "scale", "samples", "sites", "ploidy", "stage", "mode", "threads",
+    "wall_s", "sites_per_s", "peak_rss_mb", "exit_code", "identical",
+]
+
+
+def parse_scales(text):
+    """解析 --scales：逗号分隔的 样本数x位点数，如 200x5000,1000x20000。"""
+    scales = []
+    for item in text.split(","):
+        try:
+            n, m = (int(x) for x in item.lower().split("x"))
+        except ValueError:
+            sys.exit(f"--scales 格式应为 样本数x位点数（逗号分隔）：{item}")
+        if n <= 0 or m <= 0:
+            sys.exit(f"--scales 中的样本数和位点数必须为正：{item}")
+        scales.append((n, m))
+    return scales
+
+
+def run_timed(cmds, log_path):
+    """
+    依次运行命令（遇到非零退出码即停止），返回 (退出码, 墙钟秒数, 峰值 RSS MB)。
+    峰值 RSS 取 wait4 的 ru_maxrss，即各进程及其已回收子进程中最大的单进程 RSS
+    （多进程模式下为最大的 worker 或主进程）。
+    """
+    code, wall, rss = 0, 0.0, 0.0
+    with open(log_path, "w", encoding="utf-8") as log:
+        for cmd in cmds:
+            log.flush()
+            start = time.perf_counter()
+            proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+            _, status, usage = os.wait4(proc.pid, 0)
+            wall += time.perf_counter() - start
+            code = os.waitstatus_to_exitcode(status)
+            # Linux 上 ru_maxrss 单位为 KB
+            rss = max(rss, usage.ru_maxrss / 1024)
+            if code != 0:
+                break
+    return code, wall, rss
+
+
+def output_files(path):
+    """输出目录中的文件（相对路径，排序），跳过日志、断点和分片等中间文件。"""
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.startswith(".") or name.endswith((".log", ".ckpt")):
+                continue
+            files.append(os.path.relpath(os.path.join(root, name), path))
+    return sorted(files)
+
+
+def same_outputs(dir_a, dir_b):
+    """两个输出目录的文件列表相同且逐字节相同时返回 True，否则返回不同的文件说明。"""
+    files_a, files_b = output_files(dir_a), output_files(dir_b)
+    if files_a != files_b:
+        return f"文件列表不同：{sorted(set(files_a) ^ set(files_b))}"
+    diff = [f for f in files_a
+            if not filecmp.cmp(os.path.join(dir_a, f), os.path.join(dir_b, f), shallow=False)]
+    return True if not diff else f"内容不同：{diff}"
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def same_columns(dir_a, dir_b):
+    """
+    dir_b 为旧版输出：文件列表相同，且 dir_a 各文件中 dir_b 表头所列的列与 dir_b 相同
+    （新版在旧版的列之外新增了列）。
+    """
+    files_a, files_b = output_files(dir_a), output_files(dir_b)
+    if files_a != files_b:
+        return f"文件列表不同：{sorted(set(files_a) ^ set(files_b))}"
+    diff = []
+    for name in files_a:
+        rows_a, rows_b = read_rows(os.path.join(dir_a, name)), read_rows(os.path.join(dir_b, name))
+        header = rows_b[0] if rows_b else []
+        if not rows_a or any(col not in rows_a[0] for col in header):
+            diff.append(name)
+            continue
+        idx = [rows_a[0].index(col) for col in header]
+        if [[row[i] for i in idx] for row in rows_a] != rows_b:
+            diff.append(name)
+    return True if not diff else f"内容不同：{diff}"
+
+
+def same_rows(dir_a, dir_b):
+    """文件列表相同，且各文件表头相同、数据行（忽略顺序）相同。"""
+    files_a, files_b = output_files(dir_a), output_files(dir_b)
+    if files_a != files_b:
+        return f"文件列表不同：{sorted(set(files_a) ^ set(files_b))}"
+    diff = []
+    for name in files_a:
+        rows_a, rows_b = read_rows(os.path.join(dir_a, name)), read_rows(os.path.join(dir_b, name))
+        if rows_a[:1] != rows_b[:1] or sorted(rows_a[1:]) != sorted(rows_b[1:]):
+            diff.append(name)
+    return True if not diff else f"内容不同：{diff}"
+
+
+class Scale:
+    """一个规模的模拟数据：VCF、基因型存储、群体样本列表和各阶段输出目录。"""
+
+    def __init__(self, args, n_samples, n_sites):
+        self.args = args
+        self.n_samples = n_samples
+        self.n_sites = n_sites
+        self.name = f"{n_samples}x{n_sites}"
+        params = {
+            "samples": n_samples, "sites": n_sites, "ploidy": args.ploidy,
+            "multiallelic_rate": args.multiallelic_rate, "indel_rate": args.indel_rate,
+            "missing_rate": args.missing_rate, "af_dist": args.af_dist, "seed": args.seed,
+            "het_rate": args.het_rate,
+        }
+        tag = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:8]
+        self.data_dir = os.path.join(args.work_dir, f"{self.name}_{args.ploidy}_{tag}")
+        self.vcf = os.path.join(self.data_dir, "sim.vcf.gz")
+        self.store = os.path.join(self.data_dir, "sim.gtstore")
+        self.group_dir = os.path.join(self.data_dir, "groups")
+        self.run_dir = os.path.join(self.data_dir, "runs")
+        self.params = params
+
+    def script(self, name):
+        return os.path.join(SCRIPT_DIR, name)
+
+    def ensure_vcf(self):
+        if os.path.exists(self.vcf + ".csi") or os.path.exists(self.vcf + ".tbi"):
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        print(f"[INFO] 生成模拟数据：{self.vcf}")
+        cmd = [sys.executable, self.script("11-模拟VCF生成.py"), "--out", self.vcf,
+               "--samples", str(self.n_samples), "--sites", str(self.n_sites),
+               "--ploidy", self.args.ploidy, "--seed", str(self.args.seed),
+               "--multiallelic-rate", str(self.args.multiallelic_rate),
+               "--indel-rate", str(self.args.indel_rate),
+               "--missing-rate", str(self.args.missing_rate), "--af-dist", self.args.af_dist,
+               "--het-rate", str(self.args.het_rate)]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        if not (os.path.exists(self.vcf + ".csi") or os.path.exists(self.vcf + ".tbi")):
+            sys.exit(f"{self.vcf} 没有索引（需要 pysam 或 bcftools），无法运行并行模式。")
+        with open(os.path.join(self.data_dir, "params.json"), "w", encoding="utf-8") as f:
+            json.dump(self.params, f, ensure_ascii=False, indent=1)
+
+    def ensure_groups(self):
+        """随机把样本分为 --groups 个群体，另加包含全部样本的 All。"""
+        if os.path.isdir(self.group_dir):
+            return
+        rng = np.random.default_rng(self.args.seed)
+        labels = rng.integers(0, self.args.groups, self.n_samples)
+        tmp = self.group_dir + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        samples = np.array([f"S{i}" for i in range(self.n_samples)])
+        for k in range(self.args.groups):
+            with open(os.path.join(tmp, f"G{k + 1}.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(samples[labels == k]) + "\n")
+        with open(os.path.join(tmp, "All.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(samples) + "\n")
+        os.replace(tmp, self.group_dir)
+
+    def ensure_group_vcfs(self):
+        """
+        旧版 2 号脚本没有 --sample-dir：与 pipe/0_循环分配vcf.sh 相同，用
+        bcftools view --samples-file 取各群体的子集 VCF，按需生成一次。
+        没有 bcftools 命令时使用 pysam 自带的 bcftools。
+        """
+        out = os.path.join(self.data_dir, "group_vcf")
+        if os.path.isdir(out):
+            return out
+        self.ensure_groups()
+        if shutil.which("bcftools"):
+            def view(*argv):
+                subprocess.run(["bcftools", "view", *argv], check=True)
+        else:
+            try:
+                import pysam.bcftools
+            except ImportError:
+                sys.exit("取群体子集 VCF 需要 bcftools 或 pysam。")
+
+            def view(*argv):
+                pysam.bcftools.view(*argv, catch_stdout=False)
+        print(f"[INFO] 取群体子集 VCF：{out}")
+        tmp = out + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in sorted(os.listdir(self.group_dir)):
+            group = os.path.splitext(name)[0]
+            view("--force-samples", "--samples-file", os.path.join(self.group_dir, name),
+                 "-Oz", "-o", os.path.join(tmp, group + ".vcf.gz"), self.vcf)
+        os.replace(tmp, out)
+        return out
+
+    def ensure_store(self):
+        """基因型存储只支持双等位位点；有多等位位点时返回 False（跳过 store 模式）。"""
+        if self.args.multiallelic_rate > 0:
+            return False
+        if not os.path.isdir(self.store):
+            print(f"[INFO] 转换基因型存储：{self.store}")
+            subprocess.run([sys.executable, self.script("10-基因型存储转换.py"),
+                            "--vcf", self.vcf, "--out", self.store],
+                           check=True, stdout=subprocess.DEVNULL)
+        return True
+
+    def ensure_var_dir(self, fmt):
+        """tidy / bins 的输入：多群体统计得到的各群体详情（csv 或 parquet），按需生成一次。"""
+        out = os.path.join(self.data_dir, f"var_{fmt}")
+        if not os.path.isdir(out):
+            self.ensure_groups()
+            tmp = out + ".tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            subprocess.run([sys.executable, self.script("2-伪二倍体文件统计.py"),
+                            "--vcf", self.vcf, "--sample-dir", self.group_dir,
+                            "--out-dir", tmp, "--var-format", fmt],
+                           check=True, stdout=subprocess.DEVNULL)
+            os.replace(tmp, out)
+        return out
+
+
+def stage_modes(scale, stage, threads, has_store):
+    """
+    返回该阶段的 [(模式, 生成命令的函数)]，函数参数为 (脚本目录, 输出目录)。
+    第一个为 base。
+    """
+    py = sys.executable
+    ploidy_args = ["--ploidy", scale.args.ploidy]
+
+    def stats(vcf, extra=(), ploidy=ploidy_args):
+        return lambda d, out: [py, os.path.join(d, "9-变异统计.py"), "--vcf", vcf,
+                               "--out", os.path.join(out, "sim.csv"),
+                               "--var-out", os.path.join(out, "sim.var.csv"),
+                               *ploidy, *extra]
+
+    def groups(vcf, extra=()):
+        return lambda d, out: [py, os.path.join(d, "2-伪二倍体文件统计.py"), "--vcf", vcf,
+                               "--sample-dir", scale.group_dir, "--out-dir", out, *extra]
+
+    def burden(vcf, extra=(), ploidy=ploidy_args):
+        return lambda d, out: [py, os.path.join(d, "8-个体变异数量.py"), "--vcf", vcf,
+                               "--out", os.path.join(out, "sim.csv"), "--by-class",
+                               *ploidy, *extra]
+
+    def tidy(fmt):
+        return lambda d, out: [py, os.path.join(d, "4-结果整理.py"),
+                               "--var-dir", scale.ensure_var_dir(fmt),
+                               "--out", os.path.join(out, "pivot.var.csv")]
+
+    def bins(fmt):
+        ext = ".var.csv" if fmt == "csv" else f".var.{fmt}"
+        return lambda d, out: [py, os.path.join(d, "7-分箱堆叠.py"),
+                               "--global_csv", os.path.join(scale.ensure_var_dir(fmt), "All" + ext),
+                               "--eas_csv", os.path.join(scale.ensure_var_dir(fmt), "G1" + ext),
+                               "--out_dir", out]
+
+    threads_args = ["--threads", str(threads)]
+    if stage == "stats":
+        modes = [("base", stats(scale.vcf)), ("threads", stats(scale.vcf, threads_args)),
+                 ("store", stats(scale.store)),
+                 ("checkpoint", stats(scale.vcf, ["--checkpoint"])),
+                 ("auto", stats(scale.vcf, ploidy=()))]
+    elif stage == "groups":
+        modes = [("base", groups(scale.vcf)), ("threads", groups(scale.vcf, threads_args)),
+                 ("store", groups(scale.store))]
+    elif stage == "burden":
+        modes = [("base", burden(scale.vcf)), ("threads", burden(scale.vcf, threads_args)),
+                 ("store", burden(scale.store)), ("auto", burden(scale.vcf, ploidy=()))]
+    elif stage == "tidy":
+        modes = [("base", tidy("csv")), ("parquet", tidy("parquet"))]
+    else:
+        modes = [("base", bins("csv")), ("parquet", bins("parquet"))]
+    return [(mode, make) for mode, make in modes if has_store or mode != "store"]
+
+
+def legacy_mode(scale, stage):
+    """
+    返回 (生成命令列表的函数, 比较函数)：旧版脚本（--reference）命令行下与该阶段 base
+    等价的用法。旧版没有 9 号脚本、--sample-dir、--ploidy 和 --by-class。
+    """
+    py = sys.executable
+    if stage == "stats":
+        script = {"diploid": "1-二倍体文件统计.py", "pseudo-diploid": "2-伪二倍体文件统计.py",
+                  "haploid": "3-单倍体文件统计.py"}[scale.args.ploidy]
+        return (lambda d, out: [[py, os.path.join(d, script), "--vcf", scale.vcf,
+                                 "--out", os.path.join(out, "sim.csv"),
+                                 "--var-out", os.path.join(out, "sim.var.csv")]],
+                same_outputs)
+    if stage == "groups":
+        def make(d, out):
+            vcf_dir = scale.ensure_group_vcfs()
+            groups = sorted(os.path.splitext(n)[0] for n in os.listdir(scale.group_dir))
+            return [[py, os.path.join(d, "2-伪二倍体文件统计.py"),
+                     "--vcf", os.path.join(vcf_dir, g + ".vcf.gz"),
+                     "--out", os.path.join(out, g + ".csv"),
+                     "--var-out", os.path.join(out, g + ".var.csv")] for g in groups]
+        return make, same_outputs
+    if stage == "burden":
+        return (lambda d, out: [[py, os.path.join(d, "8-个体变异数量.py"), "--vcf", scale.vcf,
+                                 "--out", os.path.join(out, "sim.csv")]],
+                same_columns)
+    if stage == "tidy":
+        return (lambda d, out: [[py, os.path.join(d, "4-结果整理.py"),
+                                 "--var-dir", scale.ensure_var_dir("csv"),
+                                 "--out", os.path.join(out, "pivot.var.csv")]],
+                same_rows)
+    var_dir = scale.ensure_var_dir("csv")
+    return (lambda d, out: [[py, os.path.join(d, "7-分箱堆叠.py"),
+                             "--global_csv", os.path.join(var_dir, "All.var.csv"),
+                             "--eas_csv", os.path.join(var_dir, "G1.var.csv"),
+                             "--out_dir", out]],
+            same_outputs)
+
+
+def run_stage(scale, stage, args, writer):
+    has_store = False
+    if stage in ("stats", "groups", "burden"):
+        has_store = scale.ensure_store()
+        if not has_store:
+            print(f"[WARN] 模拟数据含多等位位点，基因型存储不支持，{stage} 跳过 store 模式。")
+    if stage == "groups":
+        scale.ensure_groups()
+    modes = [(mode, lambda d, out, make=make: [make(d, out)], same_outputs)
+             for mode, make in stage_modes(scale, stage, args.threads, has_store)]
+    if args.reference:
+        modes.insert(1, ("reference", *legacy_mode(scale, stage)))
+
+    base_dir = None
+    for mode, make, compare in modes:
+        out = os.path.join(scale.run_dir, stage, mode)
+        shutil.rmtree(out, ignore_errors=True)
+        os.makedirs(out)
+        script_dir = args.reference if mode == "reference" else SCRIPT_DIR
+        cmds = make(script_dir, out)
+        code, wall, rss = run_timed(cmds, os.path.join(scale.run_dir, stage, f"{mode}.log"))
+
+        identical = ""
+        if code != 0:
+            identical = False
+            print(f"[WARN] {stage}/{mode} 退出码 {code}，日志：{os.path.join(scale.run_dir, stage, mode)}.log")
+        elif base_dir is None:
+            base_dir = out
+        else:
+            result = compare(base_dir, out)
+            identical = result is True
+            if result is not True:
+                print(f"[WARN] {stage}/{mode} 与 base 输出不一致：{result}")
+
+        threads = args.threads if mode == "threads" else 1
+        # 失败的运行不计吞吐量
+        rate = scale.n_sites / wall if code == 0 and wall > 0 else None
+        print(f"[BENCH] {scale.name} {stage}/{mode}: {wall:.2f} s，"
+              + ("失败" if rate is None else f"{rate:,.0f} sites/s")
+              + f"，峰值 RSS {rss:.0f} MB" + ("" if identical == "" or code != 0 else
+                                              f"，与 base {'相同' if identical else '不同'}"))
+        writer.writerow([scale.name, scale.n_samples, scale.n_sites, args.ploidy, stage, mode,
+                         threads, f"{wall:.3f}", "" if rate is None else f"{rate:.1f}",
+                         f"{rss:.1f}", code, identical])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="在模拟 VCF 上按多个规模测量各阶段的吞吐量和内存，并检查优化模式的输出一致"
+    )
+    parser.add_argument(
+        "--scales", default="200x5000,1000x20000",
+        help="规模列表：样本数x位点数，逗号分隔 [默认: 200x5000,1000x20000]"
+    )
+    parser.add_argument(
+        "--stages", default=",".join(STAGES),
+        help=f"要运行的阶段（逗号分隔）：{', '.join(STAGES)} [默认: 全部]"
+    )
+    parser.add_argument(
+        "-p", "--ploidy", choices=["haploid", "diploid", "pseudo-diploid"],
+        default="pseudo-diploid", help="模拟数据的倍性 [默认: pseudo-diploid]"
+    )
+    parser.add_argument("-t", "--threads", type=int, default=4,
+                        help="threads 模式的进程数 [默认: 4]")
+    parser.add_argument("--groups", type=int, default=4,
+                        help="groups 阶段随机划分的群体数（另加 All）[默认: 4]")
+    parser.add_argument(
+        "--multiallelic-rate", type=float, default=0.0,
+        help="模拟数据的多等位位点比例；大于 0 时跳过 store 模式（存储只支持双等位）[默认: 0]"
+    )
+    parser.add_argument("--indel-rate", type=float, default=0.1, help="indel 比例 [默认: 0.1]")
+    parser.add_argument("--missing-rate", type=float, default=0.01, help="缺失率 [默认: 0.01]")
+    parser.add_argument("--het-rate", type=float, default=0.01,
+                        help="伪二倍体模拟数据中的杂合比例（检查 auto 模式的倍性识别）[默认: 0.01]")
+    parser.add_argument("--af-dist", default="neutral",
+                        help="频率分布：neutral / uniform / beta:a,b [默认: neutral]")
+    parser.add_argument("--seed", type=int, default=1, help="随机数种子 [默认: 1]")
+    parser.add_argument(
+        "--reference",
+        help="系列改动前的 python/ 脚本目录，用旧版命令行运行各阶段的等价用法并逐文件比较"
+    )
+    parser.add_argument("--work-dir", default="benchmark",
+                        help="模拟数据和运行输出目录 [默认: ./benchmark]")
+    parser.add_argument("-o", "--out", help="结果 CSV（追加）[默认: <work-dir>/benchmark.csv]")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        sys.exit(f"未知的阶段：{', '.join(unknown)}（可选 {', '.join(STAGES)}）")
+    if args.reference and not os.path.isdir(args.reference):
+        sys.exit(f"找不到 --reference 目录：{args.reference}")
+    if args.threads < 1 or args.groups < 1:
+        sys.exit("--threads / --groups 必须为正整数。")
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    out_path = args.out or os.path.join(args.work_dir, "benchmark.csv")
+    new_file = not os.path.exists(out_path)
+    with open(out_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(RESULT_HEADER)
+        for n_samples, n_sites in parse_scales(args.scales):
+            scale = Scale(args, n_samples, n_sites)
+            scale.ensure_vcf()
+            for stage in stages:
+                run_stage(scale, stage, args, writer)
+                f.flush()
+    print(f"[INFO] 结果已追加到：{out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+13-流程编排.py
+
+用一个入口代替 pipe/0…8 的 shell 脚本链：把整个流程建模为有向无环图（DAG），
+按依赖关系并发运行以下各阶段的任务：
+
+  subset  bcftools 按样本列表拆分子集 VCF 并建索引（pipe/0_循环分配vcf.sh）
+  stats   逐群体统计（默认 2-伪二倍体文件统计.py，pipe/1-变异统计-parrallel.sh）
+  merge   4-结果整理.py 合并汇总表并透视详情（pipe/2-结果整理.sh）
+  venn    5-韦恩数据.py
+  bins    7-分箱堆叠.py，每对 --bins 群体一个任务（pipe/7-分箱堆叠.sh）
+  counts  8-个体变异数量.py，逐群体（pipe/8-个体变异数量.sh）
+
+每个任务是依次运行的一组命令，声明输入、输出文件和上游任务。
+--stats-args 含 --summary-only 时统计不写详情：merge 只合并汇总表，不运行 venn，
+也不能指定 --bins。
+
+跳过：任务的输出都存在且都比输入新（输入含上游输出、所运行的脚本及同目录的
+*_utils.py），并且命令行与上次成功运行时相同（记录在 <out-dir>/.flow_state.json）
+时跳过。上游重跑后下游的输出自然变旧而重跑；失败的任务不记录，下次重跑。
+
+调度：就绪的任务按 CPU（--jobs，任务占用的核数为其线程数）和内存（--mem-budget）
+预算并发启动，先到先启动，放不下的任务等前面的任务结束。内存按阶段估计：
+流式阶段为常数，读整表的 venn / bins 按输入文件大小放大，可用 --job-mem 覆盖。
+单个任务超出内存预算时，等其他任务都结束后单独运行。
+
+计时：每个任务的输出写到 <out-dir>/logs/<任务>.log；开始时间、状态、墙钟秒数、
+峰值 RSS（wait4 的 ru_maxrss）和估计内存追加到 <out-dir>/flow_timing.tsv，
+可据此调整 --job-mem。
+
+输出目录结构与 pipe/2-结果整理.sh 整理后相同，汇总和详情直接写到各自的子目录，
+不再需要 mv：
+  subset/<群体>.vcf.gz    csv/<群体>.csv    var/<群体>.var.csv
+  merged.csv    merged_all_sources.csv    venn_counts.csv
+  bins/<A>__<B>/Bin_MAF_Comparison.csv, Bin_MAF_Comparison_with_eas.csv
+  counts/<群体>_variants_per_genome.csv
+
+用法：
+    python 13-流程编排.py --vcf merged_biallelic_7544.NoN.vcf.gz \
+        --sample-dir conf/东亚低地和高地/ --out-dir output/东亚低地和高地/ \
+        --bins Global,East_Asia --jobs 8 --mem-budget 32 --dry-run
+"""
+
+import argparse
+import glob
+import json
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("subset", "stats", "merge", "venn", "bins", "counts")
+# 各阶段的内存估计：(常数 MB, 输入文件大小的倍数)；读整表的阶段内存随输入增长
+STAGE_MEM = {
+    "subset": (300, 0),
+    "stats": (500, 0),
+    "merge": (300, 0),
+    "venn": (300, 6),
+    "bins": (300, 6),
+    "counts": (500, 0),
+}
+TIMING_HEADER = [
+    "start", "job", "stage", "status", "wall_s", "peak_rss_mb", "cpus", "mem_est_mb",
+]
+
+
+class Job:
+    """DAG 中的一个任务：依次运行的命令、输入 / 输出文件、上游任务和占用的核数。"""
+
+    def __init__(self, name, stage, cmds, inputs, outputs, deps=(), code=(), cpus=1):
+        self.name = name
+        self.stage = stage
+        self.cmds = cmds
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.code = list(code)
+        self.cpus = cpus
+
+    def mem_mb(self, overrides):
+        """估计内存（MB）：--job-mem 覆盖，否则为阶段常数 + 倍数 × 输入文件大小。"""
+        if self.stage in overrides:
+            return overrides[self.stage]
+        base, factor = STAGE_MEM[self.stage]
+        if not factor:
+            return base
+        size = sum(os.path.getsize(p) for p in self.inputs if os.path.exists(p))
+        return base + factor * size / 2**20
+
+    def outdated(self, state):
+        """返回需要运行的原因；输出都比输入新且命令行未变时返回 None。"""
+        if state.get(self.name) != self.cmds:
+            return "首次运行或命令行变化" if self.name not in state else "命令行变化"
+        missing = [p for p in self.outputs if not os.path.exists(p)]
+        if missing:
+            return f"缺少输出 {missing[0]}"
+        oldest_out = min(os.stat(p).st_mtime_ns for p in self.outputs)
+        for path in self.inputs + self.code:
+            if os.path.exists(path) and os.stat(path).st_mtime_ns > oldest_out:
+                return f"输入较新：{path}"
+        return None
+
+
+def python_cmd(args, script, *rest):
+    return [args.python, os.path.join(SCRIPT_DIR, script), *rest]
+
+
+def code_files(script):
+    """脚本及同目录的共用模块，修改后依赖它们的任务重跑。"""
+    shared = sorted(glob.glob(os.path.join(SCRIPT_DIR, "*_utils.py")))
+    return [os.path.join(SCRIPT_DIR, script)] + shared
+
+
+def build_jobs(args, groups, pairs):
+    """按参数生成任务列表（已按拓扑顺序排列）。"""
+    out = args.out_dir
+    summary_only = "--summary-only" in args.stats_args
+    d = {name: os.path.join(out, name) for name in ("subset", "csv", "var", "bins", "counts")}
+    jobs = []
+    subset, stats = {}, {}
+    for name, sample_file in groups.items():
+        vcf = os.path.join(d["subset"], f"{name}.vcf.gz")
+        subset[name] = Job(
+            f"subset:{name}", "subset",
+            [[args.bcftools, "view", "--force-samples", "--threads", str(args.subset_threads),
+              "--samples-file", sample_file, "-Oz", args.vcf, "-o", vcf],
+             [args.bcftools, "index", "-f", vcf]],
+            inputs=[args.vcf, sample_file], outputs=[vcf, vcf + ".csi"],
+            cpus=args.subset_threads,
+        )
+        threads = ["--threads", str(args.stats_threads)] if args.stats_threads > 1 else []
+        summary = os.path.join(d["csv"], f"{name}.csv")
+        outputs, var_out = [summary], []
+        if not summary_only:
+            var = os.path.join(d["var"], name + args.var_suffix)
+            outputs.append(var)
+            var_out = ["--var-out", var]
+        stats[name] = Job(
+            f"stats:{name}", "stats",
+            [python_cmd(args, args.stats_script, "--vcf", vcf, "--out", summary,
+                        *var_out, *threads, *args.stats_args)],
+            inputs=[vcf], outputs=outputs, deps=[subset[name]],
+            code=code_files(args.stats_script), cpus=args.stats_threads,
+        )
+        jobs += [subset[name], stats[name]]
+
+    merged = os.path.join(out, "merged.csv")
+    pivot = os.path.join(out, "merged_all_sources.csv")
+    # 只有汇总表时不透视详情，也没有韦恩数据的输入
+    pivot_args = [] if summary_only else ["--var-dir", d["var"], "--out", pivot]
+    merge = Job(
+        "merge", "merge",
+        [python_cmd(args, "4-结果整理.py", "--merge-dir", d["csv"], "--merge-out", merged,
+                    *pivot_args)],
+        inputs=[p for job in stats.values() for p in job.outputs],
+        outputs=[merged] + ([] if summary_only else [pivot]), deps=list(stats.values()),
+        code=code_files("4-结果整理.py"),
+    )
+    jobs.append(merge)
+    if not summary_only:
+        venn_out = os.path.join(out, "venn_counts.csv")
+        jobs.append(Job(
+            "venn", "venn",
+            [python_cmd(args, "5-韦恩数据.py", "--input", pivot, "--output", venn_out,
+                        *args.venn_args)],
+            inputs=[pivot], outputs=[venn_out], deps=[merge], code=code_files("5-韦恩数据.py"),
+        ))
+
+    for a, b in pairs:
+        bin_dir = os.path.join(d["bins"], f"{a}__{b}")
+        var_a, var_b = stats[a].outputs[1], stats[b].outputs[1]
+        jobs.append(Job(
+            f"bins:{a}__{b}", "bins",
+            [python_cmd(args, "7-分箱堆叠.py", "--global_csv", var_a, "--eas_csv", var_b,
+                        "--out_dir", bin_dir)],
+            inputs=[var_a, var_b],
+            outputs=[os.path.join(bin_dir, "Bin_MAF_Comparison.csv"),
+                     os.path.join(bin_dir, "Bin_MAF_Comparison_with_eas.csv")],
+            deps=[stats[a], stats[b]], code=code_files("7-分箱堆叠.py"),
+        ))
+
+    for name in groups:
+        vcf = subset[name].outputs[0]
+        counts = os.path.join(d["counts"], f"{name}_variants_per_genome.csv")
+        jobs.append(Job(
+            f"counts:{name}", "counts",
+            [python_cmd(args, "8-个体变异数量.py", "--vcf", vcf, "--out", counts,
+                        *args.counts_args)],
+            inputs=[vcf], outputs=[counts], deps=[subset[name]],
+            code=code_files("8-个体变异数量.py"),
+        ))
+    return jobs
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"[WARN] 无法读取 {path}，所有任务按首次运行处理。")
+        return {}
+
+
+def save_state(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def run_job(job, log_path, finished):
+    """
+    在后台线程中依次运行任务的命令，输出写入日志；结束后把
+    (任务名, 退出码, 墙钟秒数, 峰值 RSS MB) 放入 finished 队列。
+    """
+    rc, peak = 0, 0.0
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        for path in job.outputs:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        for cmd in job.cmds:
+            log.write(f"$ {shlex.join(cmd)}\n")
+            log.flush()
+            try:
+                proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+            except OSError as e:
+                log.write(f"无法启动：{e}\n")
+                rc = 127
+                break
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = rc = os.waitstatus_to_exitcode(status)
+            # Linux 上 ru_maxrss 单位为 KB
+            peak = max(peak, usage.ru_maxrss / 1024)
+            if rc != 0:
+                break
+    finished.put((job.name, rc, time.perf_counter() - start, peak))
+
+
+def tail(path, n=10):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return "".join(f.readlines()[-n:])
+
+
+def dry_run(jobs, state, force):
+    """打印执行计划：上游要运行的任务其下游也要运行。"""
+    will_run = set()
+    for job in jobs:
+        reason = "--force" if force else job.outdated(state)
+        upstream = [dep.name for dep in job.deps if dep.name in will_run]
+        if upstream:
+            reason = f"上游 {upstream[0]} 将运行"
+        if reason is None:
+            print(f"[PLAN] 跳过 {job.name}（已是最新）")
+            continue
+        will_run.add(job.name)
+        print(f"[PLAN] 运行 {job.name}（{reason}）")
+        for cmd in job.cmds:
+            print(f"         {shlex.join(cmd)}")
+    print(f"[INFO] 共 {len(jobs)} 个任务，将运行 {len(will_run)} 个。")
+
+
+def schedule(jobs, args, state, state_path, timing):
+    """
+    按 CPU / 内存预算并发运行 DAG。返回 {任务名: 状态}，
+    状态为 done / skipped / failed / blocked（上游失败未运行）。
+    """
+    log_dir = os.path.join(args.out_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    budget_mb = args.mem_budget * 1024
+    status, ran = {}, set()
+    pending = list(jobs)
+    running = {}
+    finished = queue.Queue()
+    free_cpus, free_mem = args.jobs, budget_mb
+    failed = False
+
+    while pending or running:
+        progress = True
+        while progress and not (failed and not args.keep_going):
+            progress = False
+            for job in list(pending):
+                dep_status = [status.get(dep.name) for dep in job.deps]
+                if any(s in ("failed", "blocked") for s in dep_status):
+                    pending.remove(job)
+                    status[job.name] = "blocked"
+                    print(f"[WARN] 上游失败，不运行 {job.name}")
+                    progress = True
+                    continue
+                if not all(s in ("done", "skipped") for s in dep_status):
+                    continue
+                reason = "--force" if args.force else job.outdated(state)
+                upstream = [dep.name for dep in job.deps if dep.name in ran]
+                if upstream:
+                    reason = f"上游 {upstream[0]} 已重跑"
+                if reason is None:
+                    pending.remove(job)
+                    status[job.name] = "skipped"
+                    print(f"[INFO] 跳过 {job.name}（已是最新）")
+                    timing(job, "skipped", 0.0, 0.0, 0, 0)
+                    progress = True
+                    continue
+                cpus = min(job.cpus, args.jobs)
+                mem = job.mem_mb(args.job_mem)
+                if mem > budget_mb and running:
+                    continue
+                if cpus > free_cpus or (mem > free_mem and running):
+                    continue
+                if mem > budget_mb:
+                    print(f"[WARN] {job.name} 估计需要 {mem:.0f} MB，超出内存预算，单独运行。")
+                pending.remove(job)
+                free_cpus -= cpus
+                free_mem -= mem
+                running[job.name] = (job, cpus, mem, time.time())
+                print(f"[INFO] 开始 {job.name}（{reason}；{cpus} 核，估计 {mem:.0f} MB）")
+                threading.Thread(
+                    target=run_job,
+                    args=(job, os.path.join(log_dir, job.name.replace(":", "_") + ".log"),
+                          finished),
+                    daemon=True,
+                ).start()
+                progress = True
+        if not running:
+            break
+
+        name, rc, wall, peak = finished.get()
+        job, cpus, mem, started = running.pop(name)
+        free_cpus += cpus
+        free_mem += mem
+        log_path = os.path.join(log_dir, name.replace(":", "_") + ".log")
+        if rc == 0:
+            status[name] = "done"
+            ran.add(name)
+            state[name] = job.cmds
+            save_state(state_path, state)
+            print(f"[INFO] 完成 {name}：{wall:.1f} s，峰值 RSS {peak:.0f} MB")
+        else:
+            status[name] = "failed"
+            failed = True
+            state.pop(name, None)
+            save_state(state_path, state)
+            print(f"[WARN] {name} 失败（退出码 {rc}），日志：{log_path}\n{tail(log_path)}")
+        timing(job, status[name], wall, peak, cpus, mem, started)
+
+    for job in pending:
+        status.setdefault(job.name, "blocked")
+    return status
+
+
+def parse_pairs(items, groups):
+    pairs = []
+    for item in items:
+        pair = tuple(x.strip() for x in item.split(","))
+        if len(pair) != 2 or not all(pair) or pair[0] == pair[1]:
+            sys.exit(f"--bins 格式应为 群体A,群体B：{item}")
+        missing = [name for name in pair if name not in groups]
+        if missing:
+            sys.exit(f"--bins 中的群体不存在：{', '.join(missing)}")
+        pairs.append(pair)
+    return pairs
+
+
+def parse_job_mem(items):
+    overrides = {}
+    for item in items:
+        stage, sep, value = item.partition("=")
+        try:
+            mb = float(value) * 1024
+        except ValueError:
+            mb = -1
+        if not sep or stage not in STAGES or mb < 0:
+            sys.exit(f"--job-mem 格式应为 阶段=GB（阶段为 {', '.join(STAGES)}）：{item}")
+        overrides[stage] = mb
+    return overrides
+
+
+def available_mem_gb():
+    """可用内存（GB）：优先取 /proc/meminfo 的 MemAvailable。"""
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 2**20
+    except OSError:
+        pass
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") / 2**30
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="按 DAG 运行 拆分子集 → 统计 → 合并透视 → 韦恩 / 分箱 → 个体变异数 的整个流程"
+    )
+    parser.add_argument("-i", "--vcf", required=True, help="合并后的总 VCF.gz")
+    parser.add_argument("-s", "--sample-dir", required=True,
+                        help="样本列表目录（每个 .txt 为一个群体的 ID 列表）")
+    parser.add_argument("-O", "--out-dir", required=True, help="输出目录")
+    parser.add_argument("--bins", action="append", default=[], metavar="A,B",
+                        help="对群体 A、B 运行 7-分箱堆叠.py（A 为 --global_csv），可重复指定")
+    parser.add_argument("--stats-script", default="2-伪二倍体文件统计.py",
+                        help="统计脚本（python/ 下的 1/2/3/9 号脚本）[默认: 2-伪二倍体文件统计.py]")
+    parser.add_argument("--stats-args", type=shlex.split, default=[],
+                        help="传给统计脚本的其他参数（一个字符串），如 --stats-args=\"--ac-source auto --pipeline\"；"
+                             "含 --summary-only 时不写详情，不运行 venn")
+    parser.add_argument("--stats-threads", type=int, default=1,
+                        help="每个统计任务的进程数（统计脚本的 --threads）[默认: 1]")
+    parser.add_argument("--var-suffix", default=".var.csv",
+                        help="详情文件后缀，统计脚本按后缀选择格式 / 压缩，如 .var.parquet、"
+                             ".var.csv.gz [默认: .var.csv]")
+    parser.add_argument("--venn-args", type=shlex.split, default=[],
+                        help="传给 5-韦恩数据.py 的其他参数，如 --venn-args=\"--mode upset\"")
+    parser.add_argument("--counts-args", type=shlex.split, default=[],
+                        help="传给 8-个体变异数量.py 的其他参数，如 --counts-args=\"--by-class\"")
+    parser.add_argument("--bcftools", default="bcftools", help="bcftools 可执行文件 [默认: bcftools]")
+    parser.add_argument("--subset-threads", type=int, default=2,
+                        help="每个拆分任务的 bcftools 线程数 [默认: 2]")
+    parser.add_argument("--python", default=sys.executable,
+                        help="运行各脚本的 Python 解释器 [默认: 当前解释器]")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="同时使用的 CPU 核数 [默认: CPU 数]")
+    parser.add_argument("--mem-budget", type=float,
+                        help="同时运行的任务估计内存之和的上限（GB）[默认: 可用内存的 80%%]")
+    parser.add_argument("--job-mem", action="append", default=[], metavar="STAGE=GB",
+                        help="覆盖某阶段每个任务的内存估计，如 venn=8，可重复指定")
+    parser.add_argument("-f", "--force", action="store_true", help="忽略时间戳，重跑所有任务")
+    parser.add_argument("-k", "--keep-going", action="store_true",
+                        help="有任务失败时继续运行与其无关的任务")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="只打印执行计划")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.vcf):
+        sys.exit(f"找不到 VCF 文件：{args.vcf}")
+    files = sorted(glob.glob(os.path.join(args.sample_dir, "*.txt")))
+    if not files:
+        sys.exit(f"在目录 {args.sample_dir} 中未找到 .txt 样本列表。")
+    groups = {os.path.basename(p)[:-len(".txt")]: p for p in files}
+    pairs = parse_pairs(args.bins, groups)
+    if pairs and "--summary-only" in args.stats_args:
+        sys.exit("--stats-args 含 --summary-only 时没有变异详情，不能指定 --bins。")
+    args.job_mem = parse_job_mem(args.job_mem)
+    if args.jobs < 1 or args.stats_threads < 1 or args.subset_threads < 1:
+        sys.exit("--jobs / --stats-threads / --subset-threads 必须为正整数。")
+    if not os.path.exists(os.path.join(SCRIPT_DIR, args.stats_script)):
+        sys.exit(f"找不到统计脚本：{args.stats_script}")
+    if args.mem_budget is None:
+        args.mem_budget = round(available_mem_gb() * 0.8, 1)
+
+    jobs = build_jobs(args, groups, pairs)
+    os.makedirs(args.out_dir, exist_ok=True)
+    state_path = os.path.join(args.out_dir, ".flow_state.json")
+    state = load_state(state_path)
+    print(f"[INFO] 共 {len(groups)} 个群体、{len(jobs)} 个任务；"
+          f"{args.jobs} 核，内存预算 {args.mem_budget:g} GB")
+    if args.dry_run:
+        dry_run(jobs, state, args.force)
+        return
+
+    timing_path = os.path.join(args.out_dir, "flow_timing.tsv")
+    new_file = not os.path.exists(timing_path)
+    start = time.perf_counter()
+    with open(timing_path, "a", encoding="utf-8") as f:
+        if new_file:
+            f.write("\t".join(TIMING_HEADER) + "\n")
+
+        def timing(job, job_status, wall, peak, cpus, mem, started=None):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started))
+            f.write(f"{stamp}\t{job.name}\t{job.stage}\t{job_status}\t{wall:.2f}\t"
+                    f"{peak:.0f}\t{cpus}\t{mem:.0f}\n")
+            f.flush()
+
+        status = schedule(jobs, args, state, state_path, timing)
+
+    counts = {s: sum(1 for v in status.values() if v == s)
+              for s in ("done", "skipped", "failed", "blocked")}
+    print(f"[INFO] 运行 {counts['done']}、跳过 {counts['skipped']}、失败 {counts['failed']}、"
+          f"未运行 {counts['blocked']} 个任务，总耗时 {time.perf_counter() - start:.1f} s；"
+          f"计时记录：{timing_path}")
+    if counts["failed"] or counts["blocked"]:
+        sys.exit("流程未全部完成，失败任务的日志见 " + os.path.join(args.out_dir, "logs"))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,147 +4,460 @@
 1-伪二倍体文件统计_带MAF.py
 
 在原有功能基础上，新增 MAF 列，输出每个 allele 的具体 MAF 值（如 0.25%），暂不做分箱。
+
+AN/AC 默认从基因型计算（只统计同型基因型）；--ac-source info 时直接取 INFO
+（bcftools 按二倍体写出，除以 2，无法整除的位点回退到基因型），
+auto 时检查前若干条记录的 INFO 是否与基因型计数一致后自动选择。
+
+多群体模式（--sample-dir + --out-dir）：
+直接读取合并后的总 VCF 和一个样本列表目录（每个 .txt 为一个群体的 ID 列表，
+与 pipe/0_循环分配vcf.sh 使用的文件相同），只遍历一次 VCF，
+为每个群体输出 <群体>.csv 和 <群体>.var.csv，无需先用 bcftools 拆分子集 VCF。
+
+也可用 --metadata 样本信息表 + 表达式定义群体（代替 jupyter/1.ipynb 中先筛选、
+再写出 ID 列表的做法），如：
+    --metadata HP数据收集2.xlsx --where "`7544个样本` == 'YES'" \
+    --group "East_Asia_High=Continent == 'East_Asia' and Elevation >= 2000" \
+    --group "East_Asia_Low=Continent == 'East_Asia' and Elevation < 2000" \
+    --group-by Continent,Chromopainter4
+各群体（含嵌套的父群体）由最细的叶子划分的计数相加得到，多定义一层群体
+只多一次数组求和，不需要再遍历 VCF。
 """
 
 import argparse
 import sys
 import csv
 import os
-from cyvcf2 import VCF
+import shutil
+import numpy as np
+from functools import partial
+from vcf_utils import (
+    add_ac_source_args, resolve_counting, write_site_variants, classify_freq,
+    classify_special, format_maf, pseudo_diploid_categories, Bitplanes,
+    add_format_arg, var_format, var_compression, open_var_writer, write_summary,
+    VAR_FORMATS, VAR_COMPRESSIONS, add_maf_args, MafHistogram,
+    add_sfs_args, SiteFrequencySpectrum, JointFrequencySpectrum,
+    load_sample_groups, load_metadata_groups, GroupRollup,
+    derive_source, open_vcf, fetch_region, run_stats, stats_code_digest, merge_counts,
+    add_parallel_args, split_regions, run_regions, make_part_dir, concat_parts,
+    add_checkpoint_args, open_checkpoint, resume_offsets, run_checkpointed,
+    add_pipeline_args, WriterThread,
+)
+from cache_utils import add_cache_args, open_cache, cache_key, vcf_identity
+from profile_utils import (
+    add_profile_args, start_profile, finish_profile, profile_records, profile_writer, stage,
+)
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="伪二倍体 VCF 统计脚本（带 MAF 列）"
-    )
-    parser.add_argument("-i", "--vcf", required=True, help="输入 VCF.gz 文件")
-    parser.add_argument("-o", "--out", required=True, help="输出统计结果 CSV")
-    parser.add_argument("-v", "--var-out", required=True, help="输出变异详情 CSV")
-    args = parser.parse_args()
 
-    # 计算来源基础名
-    base = os.path.basename(args.vcf)
-    for ext in (".vcf.gz", ".vcf"):
-        if base.endswith(ext):
-            base = base[:-len(ext)]
-            break
+def write_group_variants(records, rollup, writers, maf_edges=None, sfs=False, pairs=(),
+                         batch_sites=1024):
+    """
+    多群体版本：每个位点只解析一次基因型数组，按叶子划分计数后汇总出各群体的
+    AN / AC（rollup 为各群体的 GroupRollup），详情行写入对应群体的 writer，返回 (counts, joints)：
+    counts 为 {群体: (freq, type, special, MAF 直方图, 频率谱)}，
+    joints 为 {(群体A, 群体B): 联合频率谱}（pairs 中的每一对）。
+    双等位位点每 batch_sites 个一批按位打包计数（Bitplanes），结果与逐位点计数相同。
+    maf_edges 不为 None 时，每个群体的 MAF 直方图同时按该变异在哪些群体中
+    出现（AC > 0）拆分计数；否则直方图为 None。sfs 为假时频率谱为 None。
+    """
+    names = rollup.names
+    counts = {
+        name: ({}, {}, {},
+               MafHistogram(maf_edges, names) if maf_edges is not None else None,
+               SiteFrequencySpectrum() if sfs else None)
+        for name in names
+    }
+    joints = {pair: JointFrequencySpectrum() for pair in pairs}
+    pair_index = [(names.index(a), names.index(b), joints[(a, b)]) for a, b in pairs]
 
-    try:
-        vcf = VCF(args.vcf)
-    except Exception as e:
-        sys.exit(f"无法打开 VCF：{e}")
-
-    # ----- 写入变异详情（含 Freq, Type, Special, MAF 列） -----
-    try:
-        var_f = open(args.var_out, "w", newline="", encoding="utf-8")
-    except Exception as e:
-        sys.exit(f"无法创建 {args.var_out}：{e}")
-    var_writer = csv.writer(var_f)
-    var_writer.writerow([
-        "CHROM", "POS", "REF", "ALT", "AC", "Source",
-        "Freq", "Type", "Special", "MAF"
-    ])
-
-    for var in vcf:
-        genos = var.genotypes
+    def add_site(var, site):
         n_alt = len(var.ALT)
-        ac_list = [0] * n_alt
-        an = 0
+        type_label = "SNV" if var.is_snp else "Indel"
+        if maf_edges is not None:
+            # 每个 ALT 在哪些群体中出现：第 k 位对应 names[k]
+            present = np.zeros(n_alt, dtype=np.int64)
+            for k, (an, ac_arr) in enumerate(site):
+                present |= (ac_arr > 0).astype(np.int64) << k
+            present = present.tolist()
 
-        # 统计等位基因个数（只算同型非缺失的基因型）
-        for g in genos:
-            a0, a1, _ = g
-            if a0 is None or a1 is None or a0 != a1:
-                continue
-            an += 1
-            if a0 == 0:
+        # 联合频率谱：至少在一个群体中出现的 ALT 按两群体的 (AN, AC) 计数
+        for ka, kb, joint in pair_index:
+            an_a, ac_a = site[ka]
+            an_b, ac_b = site[kb]
+            for x, y in zip(ac_a.tolist(), ac_b.tolist()):
+                if x > 0 or y > 0:
+                    joint.add(an_a, x, an_b, y)
+
+        for name, (an, ac_arr) in zip(names, site):
+            if an == 0 or not ac_arr.any():
                 continue
-            idx = a0 - 1
-            if 0 <= idx < n_alt:
-                ac_list[idx] += 1
+            var_writer = writers.get(name)
+            freq_counts, type_counts, special_counts, maf_hist, sfs_hist = counts[name]
+
+            for i, (alt, ac_val) in enumerate(zip(var.ALT, ac_arr.tolist())):
+                if ac_val <= 0:
+                    continue
+                af = ac_val / an
+                maf = af if af <= 0.5 else 1 - af
+                freq_label = classify_freq(maf)
+                special_label = classify_special(ac_val)
+                if var_writer is not None:
+                    var_writer.writerow([
+                        var.CHROM, var.POS, var.REF, alt, ac_val, name,
+                        freq_label, type_label, special_label, format_maf(maf)
+                    ])
+                freq_counts[freq_label] = freq_counts.get(freq_label, 0) + 1
+                type_counts[type_label] = type_counts.get(type_label, 0) + 1
+                special_counts[special_label] = special_counts.get(special_label, 0) + 1
+                if maf_hist is not None:
+                    maf_hist.add(maf, present[i])
+                if sfs_hist is not None:
+                    sfs_hist.add(an, ac_val)
+
+    # 双等位位点攒成一批，位打包后用 popcount 一次算出整批各群体的 AN / AC；
+    # 多等位位点先处理完当前批次，再按叶子划分逐位点计数，输出顺序不变
+    batch, gts = [], []
+
+    def flush():
+        if not batch:
+            return
+        an, ac = rollup.packed_counts(Bitplanes(np.stack(gts), "pseudo-diploid"))
+        an = an.tolist()
+        for b, var in enumerate(batch):
+            add_site(var, [(an[k][b], ac[k, b:b + 1]) for k in range(len(names))])
+        batch.clear()
+        gts.clear()
 
-        total_ac = sum(ac_list)
-        if an == 0 or total_ac == 0:
+    for var in records:
+        gt = var.genotype.array()
+        if len(var.ALT) == 1:
+            if gts and gts[0].shape != gt.shape:
+                flush()
+            batch.append(var)
+            gts.append(gt)
+            if len(batch) == batch_sites:
+                flush()
             continue
+        flush()
+        n_alt = len(var.ALT)
+        add_site(var, rollup.counts(pseudo_diploid_categories(gt, n_alt), n_alt))
+    flush()
+    return counts, joints
 
-        # 类型分类（基于位点，对所有ALT相同）
-        type_label = "SNV" if var.is_snp else "Indel"
 
-        for alt, ac_val in zip(var.ALT, ac_list):
-            if ac_val > 0:
-                # 计算等位基因频率 AF
-                af_individual = ac_val / an
-
-                # 计算 MAF：
-                # MAF = min(af_individual, 1 - af_individual)
-                maf_individual = af_individual if af_individual <= 0.5 else 1 - af_individual
-
-                # 格式化为百分比字符串，保留两位小数
-                maf_pct_str = f"{maf_individual * 100:.2f}%"
-
-                # 基于个体 MAF 进行频率分类（原有逻辑）
-                if maf_individual >= 0.05:
-                    freq_label_individual = "Common"
-                elif maf_individual >= 0.01:
-                    freq_label_individual = "LowFreq"
-                elif maf_individual >= 0.001:
-                    freq_label_individual = "Rare"
-                else:
-                    freq_label_individual = "UltraRare"
-
-                # 基于个体 AC 计算 special 标签
-                if ac_val == 1:
-                    special_label_individual = "Singleton"
-                elif ac_val == 2:
-                    special_label_individual = "Doubleton"
-                else:
-                    special_label_individual = ""
-
-                var_writer.writerow([
-                    var.CHROM,
-                    var.POS,
-                    var.REF,
-                    alt,
-                    ac_val,
-                    base,
-                    freq_label_individual,
-                    type_label,
-                    special_label_individual,
-                    maf_pct_str
-                ])
-
-    var_f.close()
-
-    # ----- 剩余部分保持不变：从详情文件读回统计汇总 -----
-    freq_counts    = {}
-    type_counts    = {}
-    special_counts = {}
-    with open(args.var_out, newline="", encoding="utf-8") as vf:
-        reader = csv.DictReader(vf)
-        for row in reader:
-            f = row["Freq"]
-            freq_counts[f] = freq_counts.get(f, 0) + 1
-            t = row["Type"]
-            type_counts[t] = type_counts.get(t, 0) + 1
-            s = row["Special"]
-            special_counts[s] = special_counts.get(s, 0) + 1
+def process_group_region(vcf_path, region, part_path, rollup,
+                         maf_edges=None, sfs=False, pairs=(), samples=None):
+    """
+    并行 worker（多群体）：每个群体写一个分片文件 <part_path>.<群体>；
+    part_path 为 None 时只计数。samples 为只读取的样本子集（rollup 的样本下标相对于它）。
+    """
+    vcf = open_vcf(vcf_path, samples)
+    records = profile_records(fetch_region(vcf, region))
+    if part_path is None:
+        return write_group_variants(records, rollup, {}, maf_edges, sfs, pairs)
+    part_fs = {name: open(f"{part_path}.{name}", "w", newline="", encoding="utf-8")
+               for name in rollup.names}
+    try:
+        writers = {name: profile_writer(csv.writer(f)) for name, f in part_fs.items()}
+        return write_group_variants(records, rollup, writers, maf_edges, sfs, pairs)
+    finally:
+        for f in part_fs.values():
+            f.close()
+
 
+def combine_group_results(results):
+    """
+    按区域顺序合并各区域的 (各群体计数, 联合频率谱)，结果累加到第一个上；
+    None（断点模式的初始状态）跳过，全为 None 时返回 None。
+    """
+    results = [r for r in results if r is not None]
+    if not results:
+        return None
+    counts, joints = results[0]
+    for result_counts, result_joints in results[1:]:
+        for name, group_counts in result_counts.items():
+            for dst, src in zip(counts[name], group_counts):
+                if isinstance(dst, dict):
+                    merge_counts(dst, src)
+                elif dst is not None:
+                    dst.merge(src)
+        for pair, joint in result_joints.items():
+            joints[pair].merge(joint)
+    return counts, joints
+
+
+def run_groups(args, group_source, pairs=(), cache=None):
+    """
+    多群体单次遍历：每个群体一个样本下标数组，逐位点用同一份基因型数组
+    计算各群体的 AN / AC，并在 args.out_dir 写出与单群体模式相同格式的结果文件
+    （详情为 <群体>.var.<fmt>；args.summary_only 时只写 <群体>.csv）。
+    group_source 为样本列表目录，或 VCF 样本列表 -> {组名: 样本下标数组} 的函数
+    （如按样本信息表定义群体的 load_metadata_groups）。
+    args.maf_hist 时按 args.maf_bins 另写 <群体>.maf.csv（MAF 分箱及在其他群体中的出现情况）；
+    args.sfs 时另写 <群体>.sfs.csv（按 args.sfs_an 投影、args.sfs_fold 折叠）。
+    pairs 中的每对群体 (A, B) 另写 A__B.joint_sfs.csv（稀疏联合频率谱，
+    按频率谱的投影 / 折叠设置）和 A__B.joint_maf.csv（按 args.maf_bins 的联合 MAF 分箱矩阵）。
+    cache（cache_utils.ResultCache）不为 None 时，以 VCF 身份 + 群体样本 + 参数为键
+    逐群体缓存输出：命中的群体直接复制结果，只对新增或变化的群体遍历 VCF。
+    args.checkpoint / args.resume 时按区域顺序统计并把断点保存在 <out_dir>/.checkpoint。
+    args.pipeline 时单进程读取使用 args.io_threads 个 htslib 解压线程，
+    各群体的详情由一个后台线程写出（WriterThread）。
+    args.var_compress（gzip / zstd）时 CSV 详情压缩写出为 <群体>.var.csv.gz / .zst。
+    """
+    vcf_path, out_dir, threads = args.vcf, args.out_dir, args.threads
+    summary_only = args.summary_only
+    fmt = var_format(None, args.var_format)
+    compress = var_compression(None, args.var_compress)
+    maf_edges = args.maf_bins if args.maf_hist else None
+    sfs = (args.sfs_an, args.sfs_fold) if args.sfs else None
+    var_suffix = VAR_FORMATS[fmt] + VAR_COMPRESSIONS.get(compress, "")
+    io_threads = args.io_threads if args.pipeline else None
     try:
-        with open(args.out, "w", newline="", encoding="utf-8") as out_f:
-            writer = csv.writer(out_f)
-            writer.writerow(["Category", "Class", "Count", "Source"])
-            for cls, cnt in freq_counts.items():
-                writer.writerow(["Frequency", cls, cnt, base])
-            for cls, cnt in type_counts.items():
-                writer.writerow(["Type", cls, cnt, base])
-            for cls, cnt in special_counts.items():
-                writer.writerow(["Special", cls, cnt, base])
+        vcf = open_vcf(vcf_path, threads=io_threads)
     except Exception as e:
-        sys.exit(f"无法写入 {args.out}：{e}")
+        sys.exit(f"无法打开 VCF：{e}")
+    # cyvcf2 每次访问 .samples 都重新生成列表，取一次后复用
+    vcf_samples = vcf.samples
 
-    print(
-        f"Done. 统计文件：{args.out}；"
-        f"变异详情（含 MAF 列）：{args.var_out}"
+    if callable(group_source):
+        groups = group_source(vcf_samples)
+    else:
+        groups = load_sample_groups(group_source, vcf_samples)
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"[INFO] 共 {len(groups)} 个群体：{', '.join(groups)}")
+    for pair in pairs:
+        missing = [name for name in pair if name not in groups]
+        if missing:
+            sys.exit(f"--joint 中的群体不存在：{', '.join(missing)}")
+
+    def group_outputs(name):
+        outputs = {"summary": os.path.join(out_dir, f"{name}.csv")}
+        if not summary_only:
+            outputs["var"] = os.path.join(out_dir, name + var_suffix)
+        if sfs is not None:
+            outputs["sfs"] = os.path.join(out_dir, f"{name}.sfs.csv")
+        return outputs
+
+    keys = {}
+    if cache is not None and (maf_edges is not None or pairs):
+        # <群体>.maf.csv 和联合频率谱依赖其他群体，不能逐群体缓存
+        print("[WARN] --maf-hist / --joint 的结果依赖所有群体，本次不使用缓存。")
+        cache = None
+    if cache is not None:
+        identity = vcf_identity(vcf_path)
+        code = stats_code_digest()
+        params = {"summary_only": summary_only, "var_format": fmt, "sfs": sfs}
+        if compress:
+            params["var_compress"] = compress
+        for name, idx in groups.items():
+            keys[name] = cache_key(vcf=identity, group=name,
+                                   samples=[vcf_samples[i] for i in idx.tolist()],
+                                   params=params, code=code)
+        hits = [name for name in groups if cache.fetch(keys[name], group_outputs(name))]
+        if hits:
+            print(f"[CACHE] 使用缓存结果的群体：{', '.join(hits)}")
+        groups = {name: idx for name, idx in groups.items() if name not in hits}
+        if not groups:
+            print(f"Done. 多群体统计结果已输出到：{out_dir}")
+            return
+
+    # 只读取各群体用到的样本（基因型存储只解压对应的样本块，VCF 也跳过其余样本的解析），
+    # 群体下标换算为子集中的下标
+    used = np.unique(np.concatenate(list(groups.values())))
+    samples = None
+    if len(used) < len(vcf_samples):
+        samples = [vcf_samples[i] for i in used.tolist()]
+        groups = {name: np.searchsorted(used, idx) for name, idx in groups.items()}
+        vcf = open_vcf(vcf_path, samples, threads=io_threads)
+        vcf_samples = samples
+    # 叶子划分只建一次，单进程、并行 worker 和断点各批次共用
+    rollup = GroupRollup(groups)
+    print(f"[INFO] 叶子划分：{rollup.n_leaves} 个叶子，各群体由叶子计数相加得到")
+
+    ckpt = open_checkpoint(
+        args, os.path.join(out_dir, ".checkpoint"), vcf_path,
+        groups={name: [vcf_samples[i] for i in idx.tolist()] for name, idx in groups.items()},
+        params={"summary_only": summary_only, "var_format": fmt, "maf_edges": maf_edges,
+                "sfs": sfs, "pairs": pairs, "var_compress": compress},
+        code=stats_code_digest())
+    names = [] if summary_only else list(groups)
+    offsets = resume_offsets(ckpt, len(names))
+    writers = {}
+    for name, offset in zip(names, offsets):
+        var_path = os.path.join(out_dir, name + var_suffix)
+        writers[name] = open_var_writer(var_path, fmt, name, resume_offset=offset,
+                                        staged=ckpt is not None, compress=compress,
+                                        threads=args.compress_threads)
+
+    if ckpt is not None:
+        state = run_checkpointed(
+            ckpt, process_group_region, vcf_path, threads,
+            [(var_writer, f".{name}") for name, var_writer in writers.items()],
+            lambda state, results: combine_group_results([state, *results]),
+            rollup, maf_edges, sfs is not None, pairs, samples)
+        counts, joints = state or write_group_variants(
+            [], rollup, {}, maf_edges, sfs is not None, pairs)
+    elif threads > 1:
+        # 按区域并行，分片按区域顺序拼接，计数按区域顺序合并
+        regions = split_regions(vcf_path, threads, args.region_chunk)
+        part_dir = None if summary_only else make_part_dir(
+            os.path.join(out_dir, f"{next(iter(groups))}.csv"))
+        try:
+            results = run_regions(process_group_region, vcf_path, regions,
+                                  threads, part_dir, rollup, maf_edges, sfs is not None,
+                                  pairs, samples)
+            for name, var_writer in writers.items():
+                concat_parts(part_dir, len(regions), var_writer, f".{name}")
+        finally:
+            if part_dir:
+                shutil.rmtree(part_dir, ignore_errors=True)
+        counts, joints = combine_group_results(results) or write_group_variants(
+            [], rollup, {}, maf_edges, sfs is not None, pairs)
+    else:
+        with WriterThread(enabled=args.pipeline) as writer_thread:
+            counts, joints = write_group_variants(
+                profile_records(vcf), rollup,
+                {name: profile_writer(writer_thread.wrap(w)) for name, w in writers.items()},
+                maf_edges, sfs is not None, pairs)
+
+    with stage("关闭输出"):
+        for var_writer in writers.values():
+            var_writer.close()
+    for name in groups:
+        freq_counts, type_counts, special_counts, maf_hist, sfs_hist = counts[name]
+        write_summary(os.path.join(out_dir, f"{name}.csv"),
+                      freq_counts, type_counts, special_counts, name)
+        if maf_hist is not None:
+            maf_hist.write(os.path.join(out_dir, f"{name}.maf.csv"), name)
+        if sfs_hist is not None:
+            sfs_hist.write(os.path.join(out_dir, f"{name}.sfs.csv"), name, *sfs)
+    for (name_a, name_b), joint in joints.items():
+        prefix = os.path.join(out_dir, f"{name_a}__{name_b}")
+        joint.write(f"{prefix}.joint_sfs.csv", (name_a, name_b), *(sfs or (None, False)))
+        joint.write_maf(f"{prefix}.joint_maf.csv", (name_a, name_b), args.maf_bins)
+    if ckpt is not None:
+        ckpt.remove()
+    for name in keys:
+        if name in groups:
+            cache.store(keys[name], group_outputs(name))
+
+    print(f"Done. 多群体统计结果已输出到：{out_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="伪二倍体 VCF 统计脚本（带 MAF 列）"
+    )
+    parser.add_argument("-i", "--vcf", required=True, help="输入 VCF.gz 文件")
+    parser.add_argument("-o", "--out", help="输出统计结果 CSV")
+    parser.add_argument("-v", "--var-out", help="输出变异详情 CSV")
+    parser.add_argument(
+        "-s", "--sample-dir",
+        help="多群体模式：样本列表目录（每个 .txt 为一个群体），需同时指定 --out-dir"
+    )
+    parser.add_argument(
+        "--metadata",
+        help="多群体模式：样本信息表（.xlsx/.csv/.tsv），用 --group / --group-by 按表达式定义群体，"
+             "代替 --sample-dir"
     )
+    parser.add_argument("--id-column", default="ID", help="样本信息表中的样本 ID 列 [默认: ID]")
+    parser.add_argument("--sheet", help="样本信息表为 Excel 时的工作表名 [默认: 第一个]")
+    parser.add_argument(
+        "--where",
+        help="先筛选样本信息表（pandas query 表达式，非 ASCII 列名用反引号，如 \"`7544个样本` == 'YES'\"）"
+    )
+    parser.add_argument(
+        "--group", action="append", default=[], metavar="NAME=EXPR",
+        help="定义群体：名称=pandas query 表达式，如 \"East_Asia_High=Continent == 'East_Asia' "
+             "and Elevation >= 2000\"，可重复指定"
+    )
+    parser.add_argument(
+        "--group-by", metavar="COL[,COL...]",
+        help="按列的各级取值组合生成层级群体，如 Continent,Chromopainter4 生成 "
+             "East_Asia、East_Asia-hspEAsia 等"
+    )
+    parser.add_argument(
+        "-O", "--out-dir",
+        help="多群体模式：输出目录，为每个群体写出 <群体>.csv 和 <群体>.var.csv"
+    )
+    parser.add_argument(
+        "--summary-only", action="store_true",
+        help="只输出汇总统计，不写变异详情文件（此时无需 --var-out）"
+    )
+    add_ac_source_args(parser, "genotypes")
+    add_maf_args(parser, multi=True)
+    add_sfs_args(parser, multi=True)
+    parser.add_argument(
+        "--joint", action="append", default=[], metavar="A,B",
+        help="多群体模式：输出群体 A、B 的联合频率谱 A__B.joint_sfs.csv "
+             "和联合 MAF 分箱矩阵 A__B.joint_maf.csv，可重复指定"
+    )
+    add_format_arg(parser)
+    add_parallel_args(parser)
+    add_pipeline_args(parser)
+    add_checkpoint_args(parser)
+    add_cache_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    start_profile(args, args.vcf)
+
+    # 参数校验
+    if (args.group or args.group_by or args.where) and not args.metadata:
+        sys.exit("--group / --group-by / --where 需要同时指定 --metadata 样本信息表。")
+    if args.sample_dir or args.metadata or args.out_dir:
+        if not ((args.sample_dir or args.metadata) and args.out_dir):
+            sys.exit("多群体模式需同时指定 --sample-dir（或 --metadata）和 --out-dir。")
+        if args.sample_dir and args.metadata:
+            sys.exit("--sample-dir 和 --metadata 只能指定一个。")
+        group_source = args.sample_dir
+        if args.metadata:
+            defs = []
+            for item in args.group:
+                name, sep, expr = item.partition("=")
+                if not sep or not name.strip() or not expr.strip():
+                    sys.exit(f"--group 格式应为 名称=表达式：{item}")
+                defs.append((name.strip(), expr.strip()))
+            group_by = [c.strip() for c in args.group_by.split(",")] if args.group_by else []
+            group_source = partial(load_metadata_groups, args.metadata, id_column=args.id_column,
+                                   sheet=args.sheet, where=args.where, defs=defs,
+                                   group_by=group_by)
+        if args.ac_source != "genotypes":
+            print("[WARN] 多群体模式的 INFO 计数对应整个 VCF，始终从基因型计算 AN/AC。")
+        if args.maf_out:
+            print("[WARN] 多群体模式请使用 --maf-hist（每个群体输出 <群体>.maf.csv），忽略 --maf-out。")
+        if args.sfs not in (None, True):
+            print("[WARN] 多群体模式的频率谱按群体写出 <群体>.sfs.csv，忽略 --sfs 给出的文件名。")
+        pairs = []
+        for item in args.joint:
+            pair = tuple(x.strip() for x in item.split(","))
+            if len(pair) != 2 or not all(pair) or pair[0] == pair[1]:
+                sys.exit(f"--joint 格式应为 群体A,群体B：{item}")
+            pairs.append(pair)
+        run_groups(args, group_source, pairs, open_cache(args))
+        finish_profile(args)
+        return
+    if not args.out or not (args.var_out or args.summary_only):
+        sys.exit("请同时指定 --out 和 --var-out（或使用 --sample-dir/--out-dir 多群体模式）。")
+
+    # 计算来源基础名
+    base = derive_source(args.vcf)
+
+    # ----- AN/AC 来源：默认解析基因型，info/auto 时可跳过基因型解析 -----
+    ploidy, ac_source = resolve_counting(args.vcf, "pseudo-diploid", args.ac_source)
+    write_variants = partial(write_site_variants, ploidy=ploidy, ac_source=ac_source)
+
+    # ----- 统计：详情（含 Freq, Type, Special, MAF 列）边写边计数，汇总直接由计数写出 -----
+    run_stats(args, write_variants, base, open_cache(args))
+    finish_profile(args)
+
+    if args.summary_only:
+        print(f"Done. 统计文件：{args.out}")
+    else:
+        print(
+            f"Done. 统计文件：{args.out}；"
+            f"变异详情（含 MAF 列）：{args.var_out}"
+        )
 
 if __name__ == "__main__":
     main()
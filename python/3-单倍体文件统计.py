@@ -11,13 +11,21 @@
 输出两份 CSV：
 1) 汇总统计：Frequency/Type/Special 分类计数（含 Source 列）
 2) 变异详情：CHROM, POS, REF, ALT, AC, Source, Freq, Type, Special, MAF
+
+AN/AC 默认取 INFO 字段；--ac-source genotypes 时从基因型计算，
+auto 时检查 header 和前若干条记录后自动选择。
 """
 
 import argparse
 import sys
-import csv
-import os
-from cyvcf2 import VCF
+from functools import partial
+from vcf_utils import (
+    derive_source, add_ac_source_args, add_format_arg, add_parallel_args, add_maf_args,
+    add_sfs_args, add_checkpoint_args, add_pipeline_args,
+    resolve_counting, run_stats, write_site_variants,
+)
+from cache_utils import add_cache_args, open_cache
+from profile_utils import add_profile_args, start_profile, finish_profile
 
 def main():
     parser = argparse.ArgumentParser(
@@ -25,124 +33,41 @@ def main():
     )
     parser.add_argument("-i", "--vcf",     required=True, help="输入 VCF.gz 文件")
     parser.add_argument("-o", "--out",     required=True, help="输出汇总统计 CSV")
-    parser.add_argument("-v", "--var-out", required=True, help="输出变异详情 CSV")
+    parser.add_argument("-v", "--var-out",                help="输出变异详情 CSV")
+    parser.add_argument("--summary-only", action="store_true",
+                        help="只输出汇总统计，不写变异详情文件（此时无需 --var-out）")
+    add_ac_source_args(parser, "info")
+    add_maf_args(parser)
+    add_sfs_args(parser)
+    add_format_arg(parser)
+    add_parallel_args(parser)
+    add_pipeline_args(parser)
+    add_checkpoint_args(parser)
+    add_cache_args(parser)
+    add_profile_args(parser)
     args = parser.parse_args()
+    if not args.summary_only and not args.var_out:
+        sys.exit("请指定 --var-out（或使用 --summary-only 只输出汇总统计）。")
 
     # 计算 Source 名称
-    base = os.path.basename(args.vcf)
-    for ext in (".vcf.gz", ".vcf"):
-        if base.endswith(ext):
-            base = base[:-len(ext)]
-            break
-
-    # 打开 VCF
-    try:
-        vcf = VCF(args.vcf)
-    except Exception as e:
-        sys.exit(f"无法打开 VCF：{e}")
-
-    # ----- 写入变异详情（含 MAF 列） -----
-    try:
-        var_f = open(args.var_out, "w", newline="", encoding="utf-8")
-    except Exception as e:
-        sys.exit(f"无法创建 {args.var_out}：{e}")
-    var_writer = csv.writer(var_f)
-    var_writer.writerow([
-        "CHROM", "POS", "REF", "ALT", "AC", "Source",
-        "Freq", "Type", "Special", "MAF"
-    ])
-
-    for var in vcf:
-        # 直接从 INFO 拿 AC 和 AN
-        an      = var.INFO.get("AN")
-        ac_info = var.INFO.get("AC")
-        if an is None or an == 0 or ac_info is None:
-            continue
-
-        # 多等位时 AC 可能是列表
-        ac_list = ac_info if isinstance(ac_info, list) else [ac_info]
-
-        # 位点类型
-        type_label = "SNV" if var.is_snp else "Indel"
-
-        # 逐个 ALT 等位统计
-        for alt, ac_val in zip(var.ALT, ac_list):
-            if ac_val == 0:
-                continue
-
-            # 计算 AF 和 MAF
-            af  = ac_val / an
-            maf = af if af <= 0.5 else 1 - af
-
-            # 格式化 MAF（百分比，保留两位小数）
-            maf_str = f"{maf * 100:.2f}%"
-
-            # 频率分类
-            if maf >= 0.05:
-                freq_label = "Common"
-            elif maf >= 0.01:
-                freq_label = "LowFreq"
-            elif maf >= 0.001:
-                freq_label = "Rare"
-            else:
-                freq_label = "UltraRare"
-
-            # Special 分类
-            if ac_val == 1:
-                special_label = "Singleton"
-            elif ac_val == 2:
-                special_label = "Doubleton"
-            else:
-                special_label = ""
-
-            # 写入详情行
-            var_writer.writerow([
-                var.CHROM,
-                var.POS,
-                var.REF,
-                alt,
-                ac_val,
-                base,
-                freq_label,
-                type_label,
-                special_label,
-                maf_str
-            ])
-
-    var_f.close()
-
-    # ----- 从详情文件读回，统计汇总 -----
-    freq_counts    = {}
-    type_counts    = {}
-    special_counts = {}
-    try:
-        with open(args.var_out, newline="", encoding="utf-8") as vf:
-            reader = csv.DictReader(vf)
-            for row in reader:
-                freq_counts   [row["Freq"]]    = freq_counts.get(row["Freq"], 0) + 1
-                type_counts   [row["Type"]]    = type_counts.get(row["Type"], 0) + 1
-                special_counts[row["Special"]] = special_counts.get(row["Special"], 0) + 1
-    except Exception as e:
-        sys.exit(f"无法读取详情文件 {args.var_out}：{e}")
-
-    # ----- 写入汇总统计 CSV -----
-    try:
-        with open(args.out, "w", newline="", encoding="utf-8") as out_f:
-            writer = csv.writer(out_f)
-            writer.writerow(["Category", "Class", "Count", "Source"])
-            for cls, cnt in freq_counts.items():
-                writer.writerow(["Frequency", cls, cnt, base])
-            for cls, cnt in type_counts.items():
-                writer.writerow(["Type", cls, cnt, base])
-            for cls, cnt in special_counts.items():
-                writer.writerow(["Special", cls, cnt, base])
-    except Exception as e:
-        sys.exit(f"无法写入 {args.out}：{e}")
-
-    print(
-        f"Done. 汇总统计：{args.out}；"
-        f"变异详情（含 MAF 列）：{args.var_out}"
-    )
+    base = derive_source(args.vcf)
+
+    # ----- AN/AC 默认直接取 INFO；genotypes 时按单倍体从基因型计算 -----
+    ploidy, ac_source = resolve_counting(args.vcf, "haploid", args.ac_source)
+    write_variants = partial(write_site_variants, ploidy=ploidy, ac_source=ac_source)
+
+    # ----- 统计：详情边写边计数，汇总直接由计数写出 -----
+    start_profile(args, args.vcf)
+    run_stats(args, write_variants, base, open_cache(args))
+    finish_profile(args)
+
+    if args.summary_only:
+        print(f"Done. 汇总统计：{args.out}")
+    else:
+        print(
+            f"Done. 汇总统计：{args.out}；"
+            f"变异详情（含 MAF 列）：{args.var_out}"
+        )
 
 if __name__ == "__main__":
     main()
@@ -4,7 +4,7 @@
 merge_variants.py
 
 功能一：将多个地区的 variants_with_source CSV 文件合并成一个按地区 AC 分列的整合表格。
-功能二：将指定目录下所有不以 .var.csv 结尾的 .csv 文件合并成一个 CSV，只保留一次表头，并在含有 Category/Class 时做自定义排序。
+功能二：将指定目录下所有汇总 CSV（表头为 Category,Class,Count,Source，不含 .var.csv、.sfs.csv、.maf.csv 等）合并成一个 CSV，只保留一次表头，并在含有 Category/Class 时做自定义排序。
 
 用法示例：
     # 仅做 .var.csv 透视整合
@@ -26,18 +26,44 @@ merge_variants.py
 """
 
 import argparse
+import csv
 import glob
+import heapq
+import itertools
 import os
 import sys
 import pandas as pd
+from table_utils import VAR_PATTERNS, iter_var_rows
+from profile_utils import add_profile_args, start_profile, finish_profile, add_rows, stage
+
+# 统计脚本汇总 CSV 的表头，--merge-dir 只合并这样的文件
+SUMMARY_HEADER = "Category,Class,Count,Source"
+
+def read_header(path):
+    """CSV 文件的第一行（去掉行尾），读不出时返回 None。"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.readline().rstrip("\r\n")
+    except (OSError, UnicodeDecodeError):
+        return None
+
 
 def merge_plain_csv(input_dir, output_file):
-    """合并普通 CSV（不包括以 .var.csv 或 .var_*.csv 结尾的），保留一次表头，
-       并在包含 Category/Class 列时做排序。"""
+    """合并统计脚本的汇总 CSV（表头为 Category,Class,Count,Source），保留一次表头，
+       并在包含 Category/Class 列时做排序。
+       同目录下的 .var.csv、.sfs.csv、.maf.csv、.joint_*.csv 等表头不同的文件和
+       输出文件本身不参与合并。"""
     pattern = os.path.join(input_dir, "*.csv")
-    all_files = glob.glob(pattern)
-    files = sorted(f for f in all_files
-                   if not (f.endswith(".var.csv") or os.path.basename(f).startswith("*.var_")))
+    all_files = sorted(glob.glob(pattern))
+    out_path = os.path.abspath(output_file)
+    files, skipped = [], []
+    for f in all_files:
+        if os.path.abspath(f) == out_path:
+            continue
+        (files if read_header(f) == SUMMARY_HEADER else skipped).append(f)
+    if skipped:
+        print(f"[INFO] 跳过 {len(skipped)} 个表头不是 {SUMMARY_HEADER} 的 CSV："
+              f"{', '.join(os.path.basename(f) for f in skipped)}")
     if not files:
         sys.exit(f"在目录 {input_dir} 中未找到符合条件的普通 CSV 文件。")
 
@@ -85,37 +111,107 @@ def merge_plain_csv(input_dir, output_file):
         df.to_csv(output_file, index=False, encoding='utf-8')
         print(f"[普通 CSV 排序] 已按 Category 与 Frequency 子类自定义顺序排序。")
 
+def contig_order(sequences):
+    """
+    由各文件中 CHROM 的出现顺序合并出全局顺序（拓扑排序，平局按首次出现先后）。
+    各文件顺序互相矛盾时退出。
+    """
+    first_seen = {}
+    succ = {}
+    indeg = {}
+    for seq in sequences:
+        for c in seq:
+            first_seen.setdefault(c, len(first_seen))
+            succ.setdefault(c, set())
+            indeg.setdefault(c, 0)
+        for a, b in zip(seq, seq[1:]):
+            if b not in succ[a]:
+                succ[a].add(b)
+                indeg[b] += 1
+
+    heap = [(first_seen[c], c) for c, d in indeg.items() if d == 0]
+    heapq.heapify(heap)
+    order = []
+    while heap:
+        _, c = heapq.heappop(heap)
+        order.append(c)
+        for n in succ[c]:
+            indeg[n] -= 1
+            if indeg[n] == 0:
+                heapq.heappush(heap, (first_seen[n], n))
+    if len(order) < len(indeg):
+        sys.exit("各 .var 文件中的染色体顺序不一致，无法归并。")
+    return {c: i for i, c in enumerate(order)}
+
+def scan_var_file(path):
+    """
+    预扫描一个 .var 文件的 CHROM / Source 列：返回 (CHROM 出现顺序, Source 集合)。
+    同一 CHROM 不连续出现说明文件未按位置排序，直接退出。
+    """
+    chroms = []
+    sources = set()
+    for chrom, source in iter_var_rows(path, ['CHROM', 'Source']):
+        if not chroms or chroms[-1] != chrom:
+            if chrom in chroms:
+                sys.exit(f"文件 {path} 未按基因组位置排序（{chrom} 不连续）。")
+            chroms.append(chrom)
+        sources.add(source)
+    return chroms, sources
+
+def keyed_rows(path, rank):
+    """逐行产出 ((染色体序号, 整数 POS), CHROM, POS, REF, ALT, AC, Source)，并检查排序。"""
+    needed = ['CHROM','POS','REF','ALT','AC','Source']
+    last = None
+    for chrom, pos, ref, alt, ac, source in iter_var_rows(path, needed):
+        key = (rank[chrom], int(pos))
+        if last is not None and key < last:
+            sys.exit(f"文件 {path} 未按基因组位置排序（{chrom}:{pos}）。")
+        last = key
+        yield key, chrom, str(pos), ref, alt, int(ac), source
+
 def merge_and_pivot_vars(var_dir, pivot_out):
-    """合并 .var.csv / .var_*.csv 并按 Source 透视 AC"""
-    pattern1 = os.path.join(var_dir, "*.var.csv")
-    pattern2 = os.path.join(var_dir, "*.var_*.csv")
-    files = sorted(set(glob.glob(pattern1) + glob.glob(pattern2)))
+    """
+    合并 .var.csv / .var_*.csv（以及 .var.parquet / .var.feather）并按 Source 透视 AC。
+
+    各文件已按基因组位置排序，这里做流式 k 路归并：每个输入只保留当前一批行，
+    同一位置的各 (REF, ALT) 在小字典中按 Source 求和，缺失的 Source 填 0，
+    内存与文件大小无关。输出列与原 pivot_table 相同（CHROM, POS, REF, ALT,
+    按名称排序的各 Source），行按基因组位置排序，同一位置内按 (REF, ALT) 排序。
+    """
+    files = sorted(set(
+        f for pattern in VAR_PATTERNS for f in glob.glob(os.path.join(var_dir, pattern))
+    ))
     if not files:
         sys.exit(f"在目录 {var_dir} 中未找到 '.var.csv' 或 '.var_*.csv' 文件。")
 
-    dfs = []
+    # 预扫描：只读 CHROM / Source 两列，确定染色体顺序和输出列
+    sequences = []
+    sources = set()
     for f in files:
-        df = pd.read_csv(f, dtype={'POS': str})
-        needed = {'CHROM','POS','REF','ALT','AC','Source'}
-        if not needed.issubset(df.columns):
-            sys.exit(f"文件 {f} 中缺少必需的列：{','.join(needed)}")
-        dfs.append(df[['CHROM','POS','REF','ALT','AC','Source']])
-
-    all_df = pd.concat(dfs, ignore_index=True)
-    pivot = (
-        all_df
-        .pivot_table(
-            index=['CHROM','POS','REF','ALT'],
-            columns='Source',
-            values='AC',
-            aggfunc='sum',
-            fill_value=0
-        )
-        .reset_index()
-    )
-    pivot.columns.name = None
-    pivot.to_csv(pivot_out, index=False, encoding='utf-8')
-    print(f"[.var.csv 透视] 已输出整合文件：{pivot_out}，共 {len(pivot)} 条记录")
+        chroms, file_sources = scan_var_file(f)
+        sequences.append(chroms)
+        sources |= file_sources
+    rank = contig_order(sequences)
+    sources = sorted(sources)
+
+    # k 路归并，同一位置的行一起聚合
+    merged = heapq.merge(*(keyed_rows(f, rank) for f in files), key=lambda r: r[0])
+    n_rows = 0
+    with open(pivot_out, 'w', newline='', encoding='utf-8') as fo:
+        # 与原 pivot_table(...).to_csv 相同使用 \n 行尾
+        writer = csv.writer(fo, lineterminator="\n")
+        writer.writerow(['CHROM','POS','REF','ALT'] + sources)
+        for _, rows in itertools.groupby(merged, key=lambda r: r[0]):
+            site = {}
+            for _, chrom, pos, ref, alt, ac, source in rows:
+                acs = site.setdefault((chrom, pos, ref, alt), {})
+                acs[source] = acs.get(source, 0) + ac
+            for (chrom, pos, ref, alt), acs in sorted(site.items()):
+                writer.writerow([chrom, pos, ref, alt] + [acs.get(src, 0) for src in sources])
+                n_rows += 1
+    add_rows(n_rows)
+
+    print(f"[.var.csv 透视] 已输出整合文件：{pivot_out}，共 {n_rows} 条记录")
 
 def main():
     parser = argparse.ArgumentParser(
@@ -131,12 +227,13 @@ def main():
     )
     parser.add_argument(
         "--merge-dir", "-m",
-        help="要合并的普通 CSV 文件目录（排除 *.var.csv）"
+        help="要合并的汇总 CSV 文件目录（只合并表头为 Category,Class,Count,Source 的文件）"
     )
     parser.add_argument(
         "--merge-out", "-r",
         help="普通 CSV 合并后的输出文件路径"
     )
+    add_profile_args(parser)
     args = parser.parse_args()
 
     # 参数校验
@@ -153,10 +250,14 @@ def main():
         sys.exit(1)
 
     # 执行功能
+    start_profile(args)
     if args.merge_dir and args.merge_out:
-        merge_plain_csv(args.merge_dir, args.merge_out)
+        with stage("合并汇总表"):
+            merge_plain_csv(args.merge_dir, args.merge_out)
     if args.var_dir and args.out:
-        merge_and_pivot_vars(args.var_dir, args.out)
+        with stage("透视详情表"):
+            merge_and_pivot_vars(args.var_dir, args.out)
+    finish_profile(args)
 
 if __name__ == "__main__":
     main()
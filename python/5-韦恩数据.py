@@ -8,30 +8,105 @@ generate_venn_sets.py
 - 列中的值是唯一的变异 ID，带有文字前缀（例如 var1, var2, ...）
 - 列长度相同，不足部分填空（""）
 
+--mode upset：把每个变异所属地区编码为整数位掩码（第 i 个地区对应第 i 位），
+直接输出每个非空交集的计数（UpSet 格式：各地区 0/1 列 + Intersection + Count），
+可选 --membership 输出紧凑的成员表（CHROM, POS, REF, ALT, Mask）。
+
 用法：
     python generate_venn_sets.py \
         --input  /path/to/merged_all_sources.csv \
         --output /path/to/venn_sets.csv
+
+    python generate_venn_sets.py --mode upset \
+        --input  /path/to/merged_all_sources.csv \
+        --output /path/to/upset_counts.csv \
+        --membership /path/to/membership.csv
 """
 
 import argparse
 import os
 import sys
+import numpy as np
 import pandas as pd
+from table_utils import read_var_table
+from profile_utils import add_profile_args, start_profile, finish_profile, add_rows, stage
+
+KEY_COLUMNS = ["CHROM", "POS", "REF", "ALT"]
+
+def region_masks(df, regions):
+    """按列向量化计算每行的地区位掩码：AC > 0 的地区 i 置第 i 位"""
+    if len(regions) > 63:
+        sys.exit(f"地区数 {len(regions)} 超过 63，无法用 64 位整数编码。")
+    present = df[regions].to_numpy() > 0
+    weights = np.left_shift(np.int64(1), np.arange(len(regions), dtype=np.int64))
+    return present.astype(np.int64) @ weights
+
+def upset_counts(masks, regions):
+    """统计每个非空交集（掩码）的变异数，按数量降序、掩码升序排列"""
+    values, counts = np.unique(masks[masks > 0], return_counts=True)
+    order = np.lexsort((values, -counts))
+    values, counts = values[order], counts[order]
+
+    out = pd.DataFrame({
+        region: ((values >> i) & 1).astype(np.int8) for i, region in enumerate(regions)
+    })
+    out["Intersection"] = [
+        "&".join(r for i, r in enumerate(regions) if (v >> i) & 1) for v in values.tolist()
+    ]
+    out["Count"] = counts
+    return out
+
+def ensure_parent(path):
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+def write_upset(df, regions, output, membership=None):
+    masks = region_masks(df, regions)
+    out_df = upset_counts(masks, regions)
+    ensure_parent(output)
+    out_df.to_csv(output, index=False, encoding="utf-8")
+    add_rows(len(out_df))
+    print(f"已生成交集计数文件：{output}（共 {len(out_df)} 个非空交集）")
+
+    if membership:
+        keep = masks > 0
+        member_df = df.loc[keep, KEY_COLUMNS].copy()
+        member_df["Mask"] = masks[keep]
+        ensure_parent(membership)
+        member_df.to_csv(membership, index=False, encoding="utf-8")
+        print(f"已生成成员表：{membership}（共 {len(member_df)} 行，Mask 第 i 位对应第 i 个地区："
+              f"{', '.join(regions)}）")
 
 def main():
     parser = argparse.ArgumentParser(description="生成 Venn 图集合列格式（带文字前缀）")
     parser.add_argument("--input", "-i", required=True, help="merged_all_sources.csv 路径")
-    parser.add_argument("--output", "-o", required=True, help="输出的 venn_sets.csv 路径")
+    parser.add_argument("--output", "-o", required=True,
+                        help="输出路径：sets 模式为 venn_sets.csv，upset 模式为交集计数 CSV")
+    parser.add_argument("--mode", choices=["sets", "upset"], default="sets",
+                        help="sets：列是集合（默认）；upset：位掩码交集计数")
+    parser.add_argument("--membership",
+                        help="upset 模式：额外输出紧凑成员表（CHROM, POS, REF, ALT, Mask）")
+    add_profile_args(parser)
     args = parser.parse_args()
+    if args.membership and args.mode != "upset":
+        sys.exit("--membership 仅在 --mode upset 时可用")
+    start_profile(args, args.input)
 
     # 读取 merged_all_sources.csv
-    df = pd.read_csv(args.input, dtype={"POS": str})
+    with stage("读取输入"):
+        df = read_var_table(args.input, dtype={"POS": str})
     # 地区列
-    regions = [c for c in df.columns if c not in ["CHROM", "POS", "REF", "ALT"]]
+    regions = [c for c in df.columns if c not in KEY_COLUMNS]
     if not regions:
         sys.exit("未发现地区列，请检查输入文件格式")
 
+    if args.mode == "upset":
+        with stage("交集计数"):
+            write_upset(df, regions, args.output, args.membership)
+        finish_profile(args)
+        return
+
     # 为每行变异分配带前缀的唯一 ID
     # 前缀使用 "var"，序号从1开始
     df["var_id"] = df.index.to_series().add(1).apply(lambda x: f"var{x}")
@@ -55,8 +130,11 @@ def main():
     out_df = pd.DataFrame(sets, columns=regions)
 
     # 保存为 CSV
-    os.makedirs(os.path.dirname(args.output), exist_ok=True)
-    out_df.to_csv(args.output, index=False, encoding="utf-8")
+    ensure_parent(args.output)
+    with stage("写出结果"):
+        out_df.to_csv(args.output, index=False, encoding="utf-8")
+    add_rows(len(out_df))
+    finish_profile(args)
     print(f"已生成集合格式文件：{args.output}（共 {max_len} 行，ID前缀为 'var'）")
 
 if __name__ == "__main__":
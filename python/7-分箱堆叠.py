@@ -3,24 +3,36 @@
 """
 maf_bin_analysis.py
 
-对 Global.var.csv 和 East_Asia.var.csv 两份文件：
+对 Global.var.csv 和 East_Asia.var.csv 两份文件（也可为 .var.parquet / .var.feather）：
 1. 基于全局 MAF 做分箱，标记东亚是否出现，输出 Bin_MAF_Comparison.csv
 2. 分别对全局/东亚 MAF 做分箱统计，输出 Bin_MAF_Comparison_with_eas.csv
+
+不需要详情表时，可在统计阶段直接得到同样的计数：单群体脚本加 --maf-out，
+2-伪二倍体文件统计.py 多群体模式加 --maf-hist（<群体>.maf.csv 中
+<其他群体>_count / non_<其他群体>_count 即对应 compute_presence 的结果）。
 """
 
 import os
 import argparse
 import pandas as pd
+from table_utils import VariantKeyEncoder, key_isin, read_var_table, maf_pct
+from profile_utils import add_profile_args, start_profile, finish_profile, stage
 
 
-def load_and_prepare(path: str) -> pd.DataFrame:
+def load_and_prepare(path: str, encoder: VariantKeyEncoder) -> pd.DataFrame:
     """
-    读取 CSV 并把 '0.06%' 形式的 MAF 转为浮点数（单位 %）。
+    读取变异表（CSV / Parquet / Feather），只加载键列和 MAF：
+    (CHROM, POS, REF, ALT) 编码为 64 位整数键 key，
+    MAF 转为浮点数（单位 %）：CSV 中 '0.06%' 形式的字符串去掉 '%' 后转换，
+    列式文件中已是浮点数。
     """
-    df = pd.read_csv(path, dtype=str)
-    # 去掉 '%' 并转换为 float
-    df['MAF_pct'] = df['MAF'].str.rstrip('%').astype(float)
-    return df
+    keys = ['CHROM', 'POS', 'REF', 'ALT']
+    df = read_var_table(path, columns=keys + ['MAF'],
+                        dtype={'CHROM': str, 'REF': str, 'ALT': str})
+    return pd.DataFrame({
+        'key': encoder.encode(df['CHROM'], df['POS'], df['REF'], df['ALT']),
+        'MAF_pct': maf_pct(df['MAF']),
+    })
 
 
 def define_bins():
@@ -50,21 +62,8 @@ def compute_presence(df_global: pd.DataFrame,
         labels=labels
     )
 
-    # 2. 构建东亚出现标记
-    eas_keys = (
-        df_eas
-        [['CHROM', 'POS', 'REF', 'ALT']]
-        .drop_duplicates()
-    )
-    eas_keys['present_eas'] = 1
-
-    # 3. 左合并
-    df = df.merge(
-        eas_keys,
-        on=['CHROM', 'POS', 'REF', 'ALT'],
-        how='left'
-    )
-    df['present_eas'] = df['present_eas'].fillna(0).astype(int)
+    # 2-3. 东亚出现标记：整数键直接做存在性判断
+    df['present_eas'] = key_isin(df['key'].to_numpy(), df_eas['key'].to_numpy()).astype(int)
 
     # 4. 分箱统计
     grp = df.groupby('maf_bin', observed=False)
@@ -135,26 +134,33 @@ def main():
         default="output",
         help="输出目录（默认 ./output）"
     )
+    add_profile_args(parser)
     args = parser.parse_args()
 
     os.makedirs(args.out_dir, exist_ok=True)
+    start_profile(args, args.global_csv)
 
     # 加载并预处理
-    df_global = load_and_prepare(args.global_csv)
-    df_eas    = load_and_prepare(args.eas_csv)
+    encoder   = VariantKeyEncoder()
+    with stage("读取输入"):
+        df_global = load_and_prepare(args.global_csv, encoder)
+        df_eas    = load_and_prepare(args.eas_csv, encoder)
     bins, labels = define_bins()
 
     # 1) 全局分箱 + 出现标记
-    res1 = compute_presence(df_global, df_eas, bins, labels)
+    with stage("分箱统计"):
+        res1 = compute_presence(df_global, df_eas, bins, labels)
     out1 = os.path.join(args.out_dir, "Bin_MAF_Comparison.csv")
     res1.to_csv(out1, index=True, index_label="MAF")
     print(f"已保存：{out1}")
 
     # 2) 分别分箱统计
-    res2 = compute_bin_only(df_global, df_eas, bins, labels)
+    with stage("分箱统计"):
+        res2 = compute_bin_only(df_global, df_eas, bins, labels)
     out2 = os.path.join(args.out_dir, "Bin_MAF_Comparison_with_eas.csv")
     res2.to_csv(out2, index=True, index_label="MAF")
     print(f"已保存：{out2}")
+    finish_profile(args)
 
 
 if __name__ == "__main__":
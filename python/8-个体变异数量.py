@@ -5,49 +5,238 @@ count_variants_per_sample.py
 
 对超大 VCF 文件流式统计每个样本的 variants per genome（任何非 0/0 都计作一次变异），
 输出 CSV，并自动从 VCF 基本名填写 Source 列。
+
+--by-class 时在同一遍历中按变异分类统计每个样本携带的 ALT 数：
+Common/LowFreq/Rare/UltraRare、SNV/Indel、Singleton/Doubleton
+（分类与统计脚本 .var.csv 中的 Freq/Type/Special 相同），输出宽表
+sample,variant_count,<各分类>,Source，供 pipe/8-个体变异数量箱线图.R 按分类作图。
 """
 
 import os
 import sys
 import argparse
 import csv
-from cyvcf2 import VCF
+import numpy as np
+from vcf_utils import (
+    derive_source, open_vcf, add_parallel_args, split_regions, fetch_region, run_regions,
+    add_checkpoint_args, open_checkpoint, run_checkpointed, stats_code_digest,
+    add_ac_source_args, resolve_counting, site_counts, classify_freq, classify_special,
+    Bitplanes, pack_bits, unpack_bits,
+)
+from profile_utils import (
+    add_profile_args, start_profile, finish_profile, profile_records, profile_writer,
+)
+
+# --by-class 输出的分类列（顺序即输出列顺序）
+BURDEN_CLASSES = [
+    "Common", "LowFreq", "Rare", "UltraRare",
+    "SNV", "Indel",
+    "Singleton", "Doubleton",
+]
+BURDEN_INDEX = {name: k for k, name in enumerate(BURDEN_CLASSES)}
 
-def count_variants(vcf_path):
+def carrier_mask(gt):
     """
-    遍历 VCF，返回 (samples, counts)：
-      - samples: 样本列表
-      - counts: 每个样本的变异计数（任何非 0/0 的基因型都算一次变异）
+    由基因型数组（var.genotype.array()，形状 n×3；或按位点堆叠的 位点×n×3）
+    得到携带变异的样本掩码：两个等位基因均非缺失，且任一等位基因 != 0。
+    单倍体记录的数组只有 n×2，第二列是相位标记而不是等位基因，只看第一个等位基因。
     """
-    vcf = VCF(vcf_path)
-    samples = vcf.samples
-    counts = [0] * len(samples)
+    a0 = gt[..., 0]
+    if gt.shape[-1] == 2:
+        return a0 > 0
+    a1 = gt[..., 1]
+    return (a0 >= 0) & (a1 >= 0) & ((a0 != 0) | (a1 != 0))
+
+def alt_carriers(gt, n_alt, ploidy):
+    """
+    每个样本是否携带各 ALT：返回 n×n_alt 布尔矩阵（堆叠输入时为 位点×n×n_alt）。
+    二倍体编码时与 carrier_mask 一致（两个等位基因均非缺失），单倍体只看第一个等位基因。
+    """
+    alts = np.arange(1, n_alt + 1)
+    a0 = gt[..., 0, None]
+    if ploidy == "haploid":
+        return a0 == alts
+    a1 = gt[..., 1, None]
+    return ((a0 == alts) | (a1 == alts)) & (a0 >= 0) & (a1 >= 0)
+
+class ClassBurden:
+    """
+    每个样本按变异分类的携带数：每个 ALT 的分类标签为一行 one-hot 向量，
+    与该 ALT 按位打包的携带者向量（pack_bits，每个样本 1 位）一起缓存，
+    攒满 batch_rows 个 ALT 后解包做一次 (ALT × 样本)ᵀ @ (ALT × 分类) 矩阵乘法
+    累加到 counts（n_samples × 分类数）。float32 在每批内精确（batch_rows < 2^24），
+    批间用 int64 累加。
+    """
+
+    def __init__(self, n_samples, batch_rows=1024):
+        self.counts = np.zeros((n_samples, len(BURDEN_CLASSES)), dtype=np.int64)
+        self.batch_rows = batch_rows
+        self._carriers = np.zeros((batch_rows, -(-n_samples // 64)), dtype=np.uint64)
+        self._labels = np.zeros((batch_rows, len(BURDEN_CLASSES)), dtype=np.float32)
+        self._n = 0
+
+    def add(self, carriers, labels):
+        """carriers 为 k×字 的打包携带者（pack_bits），labels 为 k 个 ALT 各自的分类名列表。"""
+        for j, names in enumerate(labels):
+            if self._n == self.batch_rows:
+                self.flush()
+            self._carriers[self._n] = carriers[j]
+            self._labels[self._n, [BURDEN_INDEX[name] for name in names]] = 1
+            self._n += 1
+
+    def flush(self):
+        if self._n:
+            n = self._n
+            carriers = unpack_bits(self._carriers[:n], len(self.counts)).astype(np.float32)
+            self.counts += np.rint(carriers.T @ self._labels[:n]).astype(np.int64)
+            self._labels[:n] = 0
+            self._n = 0
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.counts += other.counts
+
+    def __getstate__(self):
+        # 断点 / 进程间只传递累计结果，不传递批缓冲
+        self.flush()
+        return {"counts": self.counts, "batch_rows": self.batch_rows}
+
+    def __setstate__(self, state):
+        self.__init__(state["counts"].shape[0], state["batch_rows"])
+        self.counts = state["counts"]
+
+def site_burden_labels(var, ploidy, ac_source):
+    """
+    按统计脚本的规则给位点的各 ALT 分类，返回 (ALT 下标列表, 各 ALT 的分类名列表)；
+    AN 为 0 或 AC 为 0 的 ALT 不计入（与 .var.csv 的行一致）。
+    """
+    return burden_labels(site_counts(var, ploidy, ac_source), var.is_snp)
 
-    for var in vcf:
+def burden_labels(counts, is_snp):
+    """由位点的 (AN, AC 列表)（可为 None）给各 ALT 分类，返回值同 site_burden_labels。"""
+    if counts is None or counts[0] == 0:
+        return [], []
+    an, ac_list = counts
+    type_label = "SNV" if is_snp else "Indel"
+    idx, labels = [], []
+    for i, ac_val in enumerate(ac_list):
+        if ac_val <= 0:
+            continue
+        af = ac_val / an
+        names = [classify_freq(min(af, 1 - af)), type_label]
+        special = classify_special(ac_val)
+        if special:
+            names.append(special)
+        idx.append(i)
+        labels.append(names)
+    return idx, labels
+
+def accumulate(records, counts, burden=None, counting=None, batch_sites=1024):
+    """
+    把每条 FILTER=PASS 记录的携带者掩码累加到 counts 上；
+    burden（ClassBurden）不为 None 时按 counting=(ploidy, ac_source) 给各 ALT 分类并累计。
+
+    按分类统计时双等位位点每 batch_sites 个一批：整批一次计算携带者掩码，按位打包后
+    交给 burden；单倍体 / 伪二倍体从基因型计算 AN / AC 时，整批的 AN / AC 由
+    Bitplanes 的 popcount 得到。多等位位点先处理完当前批次再逐位点计数，结果与逐位点相同。
+    """
+    ploidy, ac_source = counting or (None, None)
+    packed = ac_source == "genotypes" and ploidy in ("haploid", "pseudo-diploid")
+    # 批内每个位点的 (SNV?, 非位打包时的 (AN, AC 列表))；cyvcf2 的记录在迭代前进后
+    # 不能再取基因型，需要的值在读到该位点时取出
+    batch, gts = [], []
+
+    def flush():
+        if not batch:
+            return
+        gt = np.stack(gts)
+        counts[:] += carrier_mask(gt).sum(axis=0)
+        site_ac = [ac for _, ac in batch]
+        if packed:
+            an, ac = Bitplanes(gt, ploidy).allele_counts()
+            site_ac = [(x, [y]) for x, y in zip(an.tolist(), ac.tolist())]
+        carriers = pack_bits(alt_carriers(gt, 1, ploidy)[..., 0])
+        for b, ((is_snp, _), ac) in enumerate(zip(batch, site_ac)):
+            idx, labels = burden_labels(ac, is_snp)
+            if idx:
+                burden.add(carriers[b:b + 1], labels)
+        batch.clear()
+        gts.clear()
+
+    for var in records:
         # 只统计 FILTER=PASS 的记录
         if var.FILTER not in (None, [], 'PASS'):
             continue
-        # 遍历每个样本的基因型
-        for i, gt in enumerate(var.genotypes):
-            a0, a1, _ = gt
-            # 跳过缺失或无效
-            if a0 is None or a1 is None or a0 < 0 or a1 < 0:
-                continue
-            # 只要任一等位基因 != 0，就算一次变异
-            if a0 != 0 or a1 != 0:
-                counts[i] += 1
-
-    return samples, counts
-
-def derive_source(vcf_path):
+        gt = var.genotype.array()
+        if burden is not None and len(var.ALT) == 1:
+            if gts and gts[0].shape != gt.shape:
+                flush()
+            batch.append((var.is_snp, None if packed else site_counts(var, ploidy, ac_source)))
+            gts.append(gt)
+            if len(batch) == batch_sites:
+                flush()
+            continue
+        flush()
+        # 整个位点一次向量化比较，累加到每个样本的计数上（跳过缺失或无效）
+        counts += carrier_mask(gt)
+        if burden is not None:
+            idx, labels = site_burden_labels(var, ploidy, ac_source)
+            if idx:
+                burden.add(pack_bits(alt_carriers(gt, len(var.ALT), ploidy)[:, idx].T), labels)
+    flush()
+    return counts, burden
+
+def count_region(vcf_path, region, part_path, counting=None):
+    """并行 worker：统计一个区域内每个样本的变异数（及分类携带数）。"""
+    vcf = open_vcf(vcf_path)
+    counts = np.zeros(len(vcf.samples), dtype=np.int64)
+    burden = ClassBurden(len(vcf.samples)) if counting else None
+    return accumulate(profile_records(fetch_region(vcf, region)), counts, burden, counting)
+
+def add_counts(state, parts):
+    """区域结果按顺序合并：变异数相加，分类携带数合并（state 为 None 时从第一个区域开始）。"""
+    for counts, burden in parts:
+        if state is None:
+            state = (counts, burden)
+            continue
+        total, total_burden = state
+        total += counts
+        if burden is not None:
+            total_burden.merge(burden)
+    return state
+
+def count_variants(vcf_path, threads=1, region_chunk=None, ckpt=None, counting=None):
     """
-    从文件名中提取基本名作为 Source，去掉 .vcf 或 .vcf.gz 后缀
+    遍历 VCF，返回 (samples, counts, burden)：
+      - samples: 样本列表
+      - counts: 每个样本的变异计数（任何非 0/0 的基因型都算一次变异），int64 数组
+      - burden: counting=(ploidy, ac_source) 时为每个样本的分类携带数
+        （n_samples × len(BURDEN_CLASSES)），否则为 None
+
+    threads > 1 时按索引切分区域并行统计，各区域计数相加；
+    ckpt（vcf_utils.Checkpoint）不为 None 时按区域顺序统计并保存断点。
     """
-    base = os.path.basename(vcf_path)
-    for ext in ('.vcf.gz', '.vcf'):
-        if base.endswith(ext):
-            return base[:-len(ext)]
-    return base
+    vcf = open_vcf(vcf_path)
+    samples = vcf.samples
+    counts = np.zeros(len(samples), dtype=np.int64)
+    burden = ClassBurden(len(samples)) if counting else None
+
+    if ckpt is not None:
+        parts = [run_checkpointed(ckpt, count_region, vcf_path, threads, [],
+                                  add_counts, counting)]
+    elif threads > 1:
+        regions = split_regions(vcf_path, threads, region_chunk)
+        parts = run_regions(count_region, vcf_path, regions, threads, None, counting)
+    else:
+        accumulate(profile_records(vcf), counts, burden, counting)
+        parts = []
+    add_counts((counts, burden), [p for p in parts if p is not None])
+
+    if burden is not None:
+        burden.flush()
+        return samples, counts, burden.counts
+    return samples, counts, None
 
 def main():
     parser = argparse.ArgumentParser(
@@ -61,6 +250,15 @@ def main():
         "--out", required=True,
         help="输出 CSV 文件路径"
     )
+    parser.add_argument(
+        "--by-class", action="store_true",
+        help="同时按 Common/LowFreq/Rare/UltraRare、SNV/Indel、Singleton/Doubleton "
+             "统计每个样本携带的 ALT 数，输出宽表"
+    )
+    add_ac_source_args(parser, "auto", with_ploidy=True)
+    add_parallel_args(parser)
+    add_checkpoint_args(parser)
+    add_profile_args(parser)
     args = parser.parse_args()
 
     vcf_path = args.vcf
@@ -70,17 +268,29 @@ def main():
         sys.exit(f"Error: 找不到 VCF 文件 {vcf_path}")
 
     source = derive_source(vcf_path)
+    start_profile(args, vcf_path)
     print(f"[INFO] 开始统计：{vcf_path} （Source={source}）")
 
-    samples, counts = count_variants(vcf_path)
+    counting = (resolve_counting(vcf_path, args.ploidy, args.ac_source, args.het_threshold)
+                if args.by_class else None)
+    ckpt = open_checkpoint(args, out_csv + ".ckpt", vcf_path,
+                           script=os.path.basename(sys.argv[0]), counting=counting,
+                           code=stats_code_digest())
+    samples, counts, burden = count_variants(vcf_path, args.threads, args.region_chunk,
+                                             ckpt, counting)
 
-    # 流式写出 CSV
+    # 流式写出 CSV（--by-class 时各分类列在 variant_count 与 Source 之间）
+    classes = BURDEN_CLASSES if burden is not None else []
     with open(out_csv, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['sample', 'variant_count', 'Source'])
-        for sample, cnt in zip(samples, counts):
-            writer.writerow([sample, cnt, source])
+        writer = profile_writer(csv.writer(f))
+        writer.writerow(['sample', 'variant_count', *classes, 'Source'])
+        for k, (sample, cnt) in enumerate(zip(samples, counts)):
+            row = burden[k].tolist() if burden is not None else []
+            writer.writerow([sample, int(cnt), *row, source])
 
+    if ckpt is not None:
+        ckpt.remove()
+    finish_profile(args)
     print(f"[INFO] 完成，结果已保存到：{out_csv}")
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+9-变异统计.py
+
+统一的变异统计入口，合并 1/2/3 三个脚本的功能：
+- --ploidy：diploid（真二倍体）/ pseudo-diploid（伪二倍体）/ haploid（单倍体）/
+  auto（检查前 1000 条记录：单倍体编码为 haploid；否则统计 MAF >= 5% 位点
+  （没有时为全部位点）上杂合基因型占非缺失基因型的比例，高于 --het-threshold
+  （默认 0.05）为 diploid，否则为 pseudo-diploid）
+- --ac-source：info（直接取 INFO/AC、INFO/AN，不解析基因型）/
+  genotypes（从基因型计算）/ auto（header 中有 AC、AN，且前若干条记录的
+  INFO 与基因型计数一致时用 info，否则用 genotypes）
+
+实际使用的倍性和 AN/AC 来源会打印出来。输出与 1/2/3 相同：
+1) 汇总统计：Frequency/Type/Special 分类计数（含 Source 列）
+2) 变异详情：CHROM, POS, REF, ALT, AC, Source, Freq, Type, Special, MAF
+
+用法示例：
+    python 9-变异统计.py \
+        --vcf Africa.vcf.gz \
+        --out Africa.csv \
+        --var-out Africa.var.csv \
+        --ploidy auto --ac-source auto
+"""
+
+import argparse
+import sys
+from functools import partial
+from vcf_utils import (
+    derive_source, add_ac_source_args, add_format_arg, add_parallel_args, add_maf_args,
+    add_sfs_args, add_checkpoint_args, add_pipeline_args,
+    resolve_counting, run_stats, write_site_variants,
+)
+from cache_utils import add_cache_args, open_cache
+from profile_utils import add_profile_args, start_profile, finish_profile
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="统一的 VCF 变异统计脚本（自动识别倍性和 AN/AC 来源）"
+    )
+    parser.add_argument("-i", "--vcf", required=True, help="输入 VCF.gz 文件")
+    parser.add_argument("-o", "--out", required=True, help="输出汇总统计 CSV")
+    parser.add_argument("-v", "--var-out", help="输出变异详情 CSV")
+    parser.add_argument(
+        "--summary-only", action="store_true",
+        help="只输出汇总统计，不写变异详情文件（此时无需 --var-out）"
+    )
+    add_ac_source_args(parser, "auto", with_ploidy=True)
+    add_maf_args(parser)
+    add_sfs_args(parser)
+    add_format_arg(parser)
+    add_parallel_args(parser)
+    add_pipeline_args(parser)
+    add_checkpoint_args(parser)
+    add_cache_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args()
+    if not args.summary_only and not args.var_out:
+        sys.exit("请指定 --var-out（或使用 --summary-only 只输出汇总统计）。")
+
+    base = derive_source(args.vcf)
+
+    # 解析 auto，确定倍性和 AN/AC 来源
+    ploidy, ac_source = resolve_counting(args.vcf, args.ploidy, args.ac_source,
+                                         args.het_threshold)
+    write_variants = partial(write_site_variants, ploidy=ploidy, ac_source=ac_source)
+
+    start_profile(args, args.vcf)
+    run_stats(args, write_variants, base, open_cache(args))
+    finish_profile(args)
+
+    if args.summary_only:
+        print(f"Done. 汇总统计：{args.out}")
+    else:
+        print(
+            f"Done. 汇总统计：{args.out}；"
+            f"变异详情（含 MAF 列）：{args.var_out}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cache_utils.py
+
+统计结果缓存：以输入 VCF 的身份（大小、修改时间、索引文件校验和）、
+样本列表内容、脚本模式与参数、统计代码本身的校验和作为键，
+缓存 .csv / .var.csv 等输出文件。键不变时直接复制缓存的结果，
+只有新增或变化的群体才重新统计；按总大小和最近使用时间淘汰旧条目。
+
+缓存目录结构：<cache_dir>/<键前两位>/<键>/ 下存放各输出文件和 meta.json。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+def add_cache_args(parser):
+    """为统计脚本添加 --cache-dir / --cache-max-size / --cache-max-age 参数。"""
+    parser.add_argument(
+        "--cache-dir",
+        help="结果缓存目录；输入 VCF、样本列表和参数都未变化时直接复用缓存的输出"
+    )
+    parser.add_argument(
+        "--cache-max-size", type=float, default=None,
+        help="缓存总大小上限（GB），超出时按最近使用时间淘汰 [默认: 不限]"
+    )
+    parser.add_argument(
+        "--cache-max-age", type=float, default=None,
+        help="缓存条目最长保留天数（按最近使用时间）[默认: 不限]"
+    )
+
+
+def open_cache(args):
+    """按命令行参数创建 ResultCache（先淘汰过期条目）；未指定 --cache-dir 时返回 None。"""
+    if not args.cache_dir:
+        return None
+    max_size = None if args.cache_max_size is None else int(args.cache_max_size * 1024 ** 3)
+    max_age = None if args.cache_max_age is None else args.cache_max_age * 86400
+    cache = ResultCache(args.cache_dir, max_size, max_age)
+    cache.evict()
+    return cache
+
+
+def file_sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def vcf_identity(vcf_path):
+    """
+    VCF 的身份：大小、修改时间和索引文件（.csi / .tbi）的校验和。
+    不读取 VCF 本身，索引随内容变化，足以区分重新生成的文件。
+    基因型存储目录（.gtstore）取 meta.json 的校验和（含来源 VCF 的身份）。
+    """
+    meta = os.path.join(vcf_path, "meta.json")
+    if os.path.isdir(vcf_path) and os.path.exists(meta):
+        return {"store": file_sha256(meta)}
+    st = os.stat(vcf_path)
+    identity = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    for ext in (".csi", ".tbi"):
+        if os.path.exists(vcf_path + ext):
+            identity["index" + ext] = file_sha256(vcf_path + ext)
+    return identity
+
+
+def code_digest(*paths):
+    """统计代码的校验和：代码变化后旧的缓存不再命中。"""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(file_sha256(path).encode())
+    return h.hexdigest()
+
+
+def cache_key(**parts):
+    """把各组成部分（需可 JSON 序列化）规范化后取 sha256 作为缓存键。"""
+    text = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    内容寻址的结果缓存。outputs 为 {角色: 输出路径}，如
+    {"summary": "Africa.csv", "var": "Africa.var.csv"}；同一个键下
+    各角色的文件一起存取。
+    """
+
+    def __init__(self, cache_dir, max_size=None, max_age=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.max_age = max_age
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def fetch(self, key, outputs):
+        """命中时把缓存文件复制到各输出路径并返回 True，否则返回 False。"""
+        entry = self._entry(key)
+        meta_path = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if not set(outputs) <= set(meta["files"]):
+                return False
+            for role, path in outputs.items():
+                shutil.copyfile(os.path.join(entry, role), path)
+            meta["last_used"] = time.time()
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] 读取缓存 {entry} 失败，重新统计：{e}")
+            return False
+        return True
+
+    def store(self, key, outputs):
+        """把各输出文件存入缓存（先写临时目录再改名，中途失败不会留下半个条目）。"""
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".tmp_", dir=self.cache_dir)
+        try:
+            size = 0
+            for role, path in outputs.items():
+                shutil.copyfile(path, os.path.join(tmp, role))
+                size += os.path.getsize(path)
+            now = time.time()
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"files": sorted(outputs), "size": size,
+                           "created": now, "last_used": now}, f)
+            if os.path.exists(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            print(f"[WARN] 写入缓存失败：{e}")
+            return
+        self.evict()
+
+    def entries(self):
+        """返回 [(最近使用时间, 大小, 条目目录)]。"""
+        result = []
+        for sub in os.listdir(self.cache_dir):
+            sub_dir = os.path.join(self.cache_dir, sub)
+            if sub.startswith(".") or not os.path.isdir(sub_dir):
+                continue
+            for key in os.listdir(sub_dir):
+                entry = os.path.join(sub_dir, key)
+                try:
+                    with open(os.path.join(entry, "meta.json"), encoding="utf-8") as f:
+                        meta = json.load(f)
+                    result.append((meta["last_used"], meta["size"], entry))
+                except (OSError, ValueError, KeyError):
+                    continue
+        return result
+
+    def evict(self):
+        """删除超过 max_age 未使用的条目，再按最近使用时间淘汰到 max_size 以内。"""
+        if self.max_size is None and self.max_age is None:
+            return
+        entries = sorted(self.entries())
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        for last_used, size, entry in entries:
+            too_old = self.max_age is not None and now - last_used > self.max_age
+            too_big = self.max_size is not None and total > self.max_size
+            if not (too_old or too_big):
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+profile_utils.py
+
+运行剖析（--profile / --metrics-json）：
+- 按阶段累计耗时：读取解析（bgzip 解压 + cyvcf2 解析，另给出解压耗时的估计）、
+  基因型解码、分类与计数、详情写出、合并分片等
+- 处理的记录数与吞吐量、写出的行数、读取的字节数、峰值内存（主进程 / 子进程）
+- 按 --progress-interval 秒打印进度和预计剩余时间，总记录数取自 .csi/.tbi 索引
+  （基因型存储取 meta.json 中的位点数）
+
+多进程时每个 worker 在子进程中单独计量，结果随区域结果返回并合并。
+未开启时 ACTIVE 为 None，各包装函数原样返回输入，不增加开销。
+"""
+
+import json
+import os
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 当前进程的 Metrics；None 表示未开启剖析
+ACTIVE = None
+
+# 报告中各阶段的顺序：逐记录的阶段在前，收尾阶段在后，其余阶段按出现顺序排在中间
+STAGE_ORDER = ["读取解析", "基因型解码", "分类与计数", "详情写出"]
+TAIL_STAGES = ["等待写出", "合并分片", "关闭输出"]
+
+
+def add_profile_args(parser):
+    """为脚本添加 --profile / --metrics-json / --progress-interval 参数。"""
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="结束时打印各阶段耗时、吞吐量、峰值内存、写出行数和读取字节数，并定期打印进度"
+    )
+    parser.add_argument(
+        "--metrics-json",
+        help="把剖析结果写入 JSON 文件（隐含开启剖析，但不打印报告）"
+    )
+    parser.add_argument(
+        "--progress-interval", type=float, default=30,
+        help="--profile 时打印进度的间隔（秒），0 为不打印 [默认: 30]"
+    )
+
+
+def io_read_bytes():
+    """本进程累计读取的字节数（Linux 的 /proc/self/io rchar），不可用时返回 None。"""
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def peak_rss_mb(who="self"):
+    """峰值 RSS（MB）：self 为本进程，children 为已回收子进程中最大的一个。"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self"
+                               else resource.RUSAGE_CHILDREN)
+    # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def record_total(path):
+    """输入的总记录数：VCF 取自索引，基因型存储取自 meta.json；无法得到时返回 None。"""
+    if not path:
+        return None
+    meta = os.path.join(path, "meta.json")
+    if os.path.isdir(path) and os.path.exists(meta):
+        with open(meta, encoding="utf-8") as f:
+            return json.load(f).get("n_sites")
+    if not any(os.path.exists(path + ext) for ext in (".csi", ".tbi")):
+        return None
+    try:
+        from cyvcf2 import VCF
+        vcf = VCF(path)
+        total = vcf.num_records
+        vcf.close()
+        return total
+    except Exception:
+        return None
+
+
+def estimate_decompress(path, max_bytes=64 << 20):
+    """
+    估计 bgzip 解压整个文件所需的秒数：用 zlib 解压文件开头至多 max_bytes 的压缩数据，
+    按压缩字节数线性外推（htslib 可能使用更快的 libdeflate，结果偏保守）。
+    """
+    if not path or not path.endswith(".gz") or not os.path.isfile(path):
+        return None
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    used = 0
+    with open(path, "rb") as f:
+        data = f.read(max_bytes)
+    while data:
+        d = zlib.decompressobj(31)
+        d.decompress(data)
+        consumed = len(data) - len(d.unused_data)
+        if not d.eof or consumed == 0:
+            break
+        used += consumed
+        data = d.unused_data
+    elapsed = time.perf_counter() - start
+    return elapsed * size / used if used else None
+
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Metrics:
+    """
+    一个进程内的计量：stages 为 {阶段: 累计秒数}，records / rows 为处理的记录数 /
+    写出的行数，bytes_read 为读取字节数。total 为总记录数（用于进度和 ETA）。
+    """
+
+    def __init__(self, total=None, progress_interval=0):
+        self.stages = {}
+        self.records = 0
+        self.rows = 0
+        self.bytes_read = 0
+        self.children_rss = 0.0
+        self.parts = 0
+        self.total = total
+        self.progress_interval = progress_interval
+        self.start = time.perf_counter()
+        self._io_start = io_read_bytes()
+        self._last_progress = self.start
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def snapshot(self):
+        """可 pickle 的计量结果（子进程返回给主进程）。"""
+        io_now = io_read_bytes()
+        bytes_read = self.bytes_read
+        if io_now is not None and self._io_start is not None:
+            bytes_read += io_now - self._io_start
+        return {"stages": dict(self.stages), "records": self.records, "rows": self.rows,
+                "bytes_read": bytes_read, "rss": peak_rss_mb("self") or 0.0}
+
+    def merge(self, snap):
+        for stage, seconds in snap["stages"].items():
+            self.add(stage, seconds)
+        self.records += snap["records"]
+        self.rows += snap["rows"]
+        self.bytes_read += snap["bytes_read"]
+        self.children_rss = max(self.children_rss, snap["rss"])
+        self.parts += 1
+
+    def progress(self, force=False):
+        """距上次打印超过 progress_interval 秒时打印进度（记录数、速度、ETA）。"""
+        if not self.progress_interval:
+            return
+        now = time.perf_counter()
+        if not force and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        elapsed = now - self.start
+        rate = self.records / elapsed if elapsed > 0 else 0
+        text = f"[PROGRESS] {self.records:,} 条记录"
+        if self.total:
+            text += f" / {self.total:,}（{100 * self.records / self.total:.1f}%）"
+        text += f"，{rate:,.0f} 条/s，已用 {format_seconds(elapsed)}"
+        if self.total and rate > 0 and self.records < self.total:
+            text += f"，预计剩余 {format_seconds((self.total - self.records) / rate)}"
+        print(text, flush=True)
+
+    def summary(self, script, input_path):
+        """汇总为 JSON 可序列化的字典。"""
+        wall = time.perf_counter() - self.start
+        snap = self.snapshot()
+        stages = {name: round(seconds, 4) for name, seconds in self._ordered_stages()}
+        decompress = estimate_decompress(input_path)
+        return {
+            "script": script,
+            "input": input_path,
+            "input_bytes": (os.path.getsize(input_path)
+                            if input_path and os.path.isfile(input_path) else None),
+            "wall_s": round(wall, 4),
+            "records": self.records,
+            "records_total": self.total,
+            "records_per_s": round(self.records / wall, 1) if wall > 0 else None,
+            "rows_written": self.rows,
+            "bytes_read": snap["bytes_read"] if self._io_start is not None else None,
+            "peak_rss_mb": {"main": peak_rss_mb("self"),
+                            "children": max(self.children_rss, peak_rss_mb("children") or 0.0)},
+            "stages_s": stages,
+            "worker_parts": self.parts,
+            "decompress_estimate_s": round(decompress, 4) if decompress is not None else None,
+        }
+
+    def _ordered_stages(self):
+        names = [s for s in STAGE_ORDER if s in self.stages]
+        names += [s for s in self.stages if s not in STAGE_ORDER + TAIL_STAGES]
+        names += [s for s in TAIL_STAGES if s in self.stages]
+        return [(name, self.stages[name]) for name in names]
+
+
+def start_profile(args, input_path=None):
+    """按 --profile / --metrics-json 开启剖析；未开启时返回 None。"""
+    global ACTIVE
+    if not (args.profile or args.metrics_json):
+        return None
+    interval = args.progress_interval if args.profile else 0
+    ACTIVE = Metrics(record_total(input_path), interval)
+    ACTIVE.script = os.path.basename(sys.argv[0])
+    ACTIVE.input_path = input_path
+    return ACTIVE
+
+
+def finish_profile(args):
+    """结束剖析：--profile 时打印报告，--metrics-json 时写出 JSON。"""
+    global ACTIVE
+    metrics, ACTIVE = ACTIVE, None
+    if metrics is None:
+        return
+    result = metrics.summary(metrics.script, metrics.input_path)
+    if args.metrics_json:
+        with open(args.metrics_json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+    if args.profile:
+        print_report(result)
+
+
+def print_report(result):
+    wall = result["wall_s"]
+    line = f"[PROFILE] 总耗时 {wall:.2f} s"
+    if result["records"]:
+        line += f"，记录 {result['records']:,} 条（{result['records_per_s']:,.0f} 条/s）"
+    line += f"，写出 {result['rows_written']:,} 行"
+    if result["bytes_read"] is not None:
+        line += f"，读取 {result['bytes_read'] / 1024 ** 2:,.1f} MB"
+    rss = result["peak_rss_mb"]
+    if rss["main"] is not None:
+        line += f"，峰值 RSS {rss['main']:.0f} MB"
+        if result["worker_parts"] and rss["children"]:
+            line += f"（子进程 {rss['children']:.0f} MB）"
+    print(line)
+    if result["worker_parts"]:
+        print(f"[PROFILE] 含 {result['worker_parts']} 个区域的 worker 计量，"
+              "各阶段为所有进程耗时之和，可超过总耗时")
+    for name, seconds in result["stages_s"].items():
+        share = f"{100 * seconds / wall:5.1f}%" if wall > 0 else ""
+        print(f"[PROFILE]   {name:<10} {seconds:9.2f} s  {share}")
+        if name == "读取解析" and result["decompress_estimate_s"] is not None:
+            print(f"[PROFILE]     其中 bgzip 解压约 {result['decompress_estimate_s']:.2f} s（zlib 估计）")
+
+
+def add_rows(n):
+    """把 n 行计入写出的行数（整表写出的脚本在写出后调用）。"""
+    if ACTIVE is not None:
+        ACTIVE.rows += n
+
+
+@contextmanager
+def stage(name):
+    """把 with 块的耗时累计到阶段 name（未开启剖析时不计时）。"""
+    if ACTIVE is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ACTIVE.add(name, time.perf_counter() - start)
+
+
+class _ProfiledGenotype:
+    __slots__ = ("_genotype", "_metrics")
+
+    def __init__(self, genotype, metrics):
+        self._genotype = genotype
+        self._metrics = metrics
+
+    def array(self):
+        start = time.perf_counter()
+        result = self._genotype.array()
+        self._metrics.add("基因型解码", time.perf_counter() - start)
+        return result
+
+
+class _ProfiledVariant:
+    """转发所有属性，只对 genotype 的取得和 array() 计时。"""
+
+    __slots__ = ("_var", "_metrics")
+
+    def __init__(self, var, metrics):
+        self._var = var
+        self._metrics = metrics
+
+    @property
+    def genotype(self):
+        start = time.perf_counter()
+        genotype = self._var.genotype
+        self._metrics.add("基因型解码", time.perf_counter() - start)
+        return _ProfiledGenotype(genotype, self._metrics)
+
+    def __getattr__(self, name):
+        return getattr(self._var, name)
+
+
+def profile_records(records):
+    """
+    包装记录迭代器：取下一条记录的耗时计入“读取解析”，两次取记录之间（调用方处理
+    该记录）的耗时扣除其间计入其他阶段（基因型解码、详情写出等）的部分后计入
+    “分类与计数”，并定期打印进度。
+    """
+    metrics = ACTIVE
+    if metrics is None:
+        return records
+    return _profiled_records(iter(records), metrics)
+
+
+def _profiled_records(it, metrics):
+    clock = time.perf_counter
+    while True:
+        start = clock()
+        try:
+            var = next(it)
+        except StopIteration:
+            metrics.add("读取解析", clock() - start)
+            return
+        got = clock()
+        metrics.add("读取解析", got - start)
+        before = sum(metrics.stages.values())
+        yield _ProfiledVariant(var, metrics)
+        # 处理该记录期间计入其他阶段（基因型解码、详情写出等）的耗时不重复计入
+        other = sum(metrics.stages.values()) - before
+        metrics.add("分类与计数", clock() - got - other)
+        metrics.records += 1
+        if not metrics.records & 1023:
+            metrics.progress()
+
+
+class _ProfiledWriter:
+    """转发所有属性，对 writerow / writerows 计时并计数写出的行。"""
+
+    __slots__ = ("_writer", "_metrics")
+
+    def __init__(self, writer, metrics):
+        self._writer = writer
+        self._metrics = metrics
+
+    def writerow(self, row):
+        start = time.perf_counter()
+        result = self._writer.writerow(row)
+        self._metrics.add("详情写出", time.perf_counter() - start)
+        self._metrics.rows += 1
+        return result
+
+    def writerows(self, rows):
+        start = time.perf_counter()
+        result = self._writer.writerows(rows)
+        self._metrics.add("详情写出", time.perf_counter() - start)
+        self._metrics.rows += len(rows)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._writer, name)
+
+
+def profile_writer(writer):
+    """包装详情写出器（csv.writer 或 vcf_utils 的写出器）；未开启剖析或 writer 为 None 时原样返回。"""
+    if ACTIVE is None or writer is None:
+        return writer
+    return _ProfiledWriter(writer, ACTIVE)
+
+
+def profiled_call(worker, *args):
+    """
+    在子进程中调用 worker 并单独计量，返回 (worker 结果, 计量快照)。
+    （fork 出的子进程继承了主进程的 ACTIVE，这里换成新的计量。）
+    """
+    global ACTIVE
+    ACTIVE = Metrics()
+    try:
+        result = worker(*args)
+        return result, ACTIVE.snapshot()
+    finally:
+        ACTIVE = None
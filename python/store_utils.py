@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+store_utils.py
+
+基因型存储（.gtstore 目录）：把 VCF 一次性转换为分块、压缩的 int8 基因型矩阵
+和按列存放的位点信息，之后的统计直接读取需要的区块，不再解压、解析文本 VCF。
+
+目录结构：
+    meta.json                     样本、contig、块大小、倍性、来源 VCF 等
+    sites/CHROM.npy POS.npy ...   位点列（np.load(mmap_mode="r") 内存映射）
+    sites/REF.offsets.npy + REF.bin  变长字符串列（偏移 + 字节，内存映射）
+    gt/<位点块>_<样本块>.npy       基因型块（--compress none，内存映射）
+    gt/<位点块>_<样本块>.npy.zlib  基因型块（zlib 压缩，按需解压）
+
+基因型按 ALT 剂量编码为 int8（只支持双等位位点）：
+    二倍体编码：0=0/0  1=0/1  2=1/1  -1=./.  -2=1/0  -3=0/.  -4=1/.  -5=./0  -6=./1
+    单倍体编码：0=0    1=1    -1=.
+非负值即 ALT 剂量；负值保留缺失和等位基因顺序，还原出的基因型数组与 cyvcf2 一致，
+三种计数方式（二倍体 / 伪二倍体 / 单倍体）的结果与直接读取 VCF 完全相同。
+
+GenotypeStore 提供与 cyvcf2.VCF 相同的只读接口子集（samples、seqnames、seqlens、
+迭代、按区域查询、samples= 只读取部分样本），各统计脚本通过 vcf_utils.open_vcf 透明使用。
+"""
+
+import json
+import os
+import sys
+import zlib
+
+import numpy as np
+
+STORE_FORMAT = "gtstore"
+STORE_VERSION = 1
+STORE_SUFFIX = ".gtstore"
+
+# 剂量编码 -> (a0, a1)，下标为 编码 - CODE_MIN
+CODE_MIN = -6
+DIPLOID_ALLELES = {
+    0: (0, 0), 1: (0, 1), 2: (1, 1), -1: (-1, -1), -2: (1, 0),
+    -3: (0, -1), -4: (1, -1), -5: (-1, 0), -6: (-1, 1),
+}
+HAPLOID_ALLELES = {0: 0, 1: 1, -1: -1}
+
+STRING_COLUMNS = ("REF", "ALT", "FILTER")
+
+
+def is_store(path):
+    """path 是否为基因型存储目录。"""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+
+def _code_table(mapping, width):
+    """(a0, a1) -> 编码 的查找表，下标为 (a0 + 1) * 3 + (a1 + 1)，不支持的组合为 127。"""
+    table = np.full(9, 127, dtype=np.int8)
+    for code, alleles in mapping.items():
+        a0, a1 = alleles if width == 2 else (alleles, -1)
+        table[(a0 + 1) * 3 + (a1 + 1)] = code
+    return table
+
+
+ENCODE_DIPLOID = _code_table(DIPLOID_ALLELES, 2)
+ENCODE_HAPLOID = _code_table(HAPLOID_ALLELES, 1)
+
+
+def encode_genotypes(gt, ploidy):
+    """
+    cyvcf2 基因型数组（二倍体 n×3，单倍体 n×2）编码为 int8 剂量；
+    出现多等位或无法编码的等位基因时返回 None。
+    """
+    a0 = gt[:, 0].astype(np.int64)
+    a1 = gt[:, 1].astype(np.int64) if ploidy == 2 else np.full(len(gt), -1)
+    if a0.min(initial=0) < -1 or a0.max(initial=0) > 1 or a1.min(initial=0) < -1 or a1.max(initial=0) > 1:
+        return None
+    table = ENCODE_DIPLOID if ploidy == 2 else ENCODE_HAPLOID
+    codes = table[(a0 + 1) * 3 + (a1 + 1)]
+    if (codes == 127).any():
+        return None
+    return codes
+
+
+def decode_table(ploidy):
+    """编码 -> cyvcf2 基因型数组行的查找表（最后一列为相位标记，存储中不保留，记为 0）。"""
+    width = 3 if ploidy == 2 else 2
+    table = np.zeros((-CODE_MIN + 3, width), dtype=np.int16)
+    mapping = DIPLOID_ALLELES if ploidy == 2 else {c: (a,) for c, a in HAPLOID_ALLELES.items()}
+    for code, alleles in mapping.items():
+        table[code - CODE_MIN, :len(alleles)] = alleles
+    return table
+
+
+class StringColumnWriter:
+    """变长字符串列：逐个追加，写出为 <name>.offsets.npy 和 <name>.bin。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path + ".bin", "wb")
+        self._offsets = [0]
+
+    def append(self, text):
+        data = text.encode("utf-8")
+        self._f.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def close(self):
+        self._f.close()
+        np.save(self.path + ".offsets.npy", np.asarray(self._offsets, dtype=np.int64))
+
+
+class StringColumn:
+    """内存映射的变长字符串列。"""
+
+    def __init__(self, path):
+        self.offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        size = int(self.offsets[-1])
+        self.data = (np.memmap(path + ".bin", dtype=np.uint8, mode="r")
+                     if size else np.zeros(0, dtype=np.uint8))
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def slice(self, lo, hi):
+        """第 lo..hi-1 个字符串的列表（整段读取后再切分，避免逐条访问内存映射）。"""
+        offsets = np.asarray(self.offsets[lo:hi + 1]).tolist()
+        if not offsets:
+            return []
+        raw = bytes(self.data[offsets[0]:offsets[-1]])
+        base = offsets[0]
+        return [raw[a - base:b - base].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+
+class StoreWriter:
+    """
+    逐位点写入基因型存储：基因型按 chunk_sites 个位点缓存，满一块后按
+    chunk_samples 个样本切分写出；位点列在 close 时写出。
+    先写到临时目录，close 成功后才改名为目标目录。
+    """
+
+    def __init__(self, path, samples, contigs, contig_lengths, ploidy,
+                 chunk_sites=16384, chunk_samples=1024, compress="zlib", level=1,
+                 info_fields=(), source=None):
+        self.path = path
+        self.tmp = path.rstrip("/") + ".tmp"
+        if os.path.exists(self.tmp):
+            sys.exit(f"临时目录 {self.tmp} 已存在（上次转换未完成？），请删除后重试。")
+        os.makedirs(os.path.join(self.tmp, "sites"))
+        os.makedirs(os.path.join(self.tmp, "gt"))
+        self.meta = {
+            "format": STORE_FORMAT, "version": STORE_VERSION,
+            "samples": list(samples), "contigs": list(contigs),
+            "contig_lengths": [int(x) for x in contig_lengths],
+            "ploidy": ploidy, "chunk_sites": chunk_sites, "chunk_samples": chunk_samples,
+            "compress": compress, "info_fields": list(info_fields), "source": source,
+        }
+        self.level = level
+        self.contig_index = {name: k for k, name in enumerate(contigs)}
+        self._block = np.empty((chunk_sites, len(samples)), dtype=np.int8)
+        self._n_block = 0
+        self._n_chunks = 0
+        self.n_sites = 0
+        self._columns = {name: [] for name in ("CHROM", "POS", "IS_SNP", "INFO_AN", "INFO_AC")}
+        self._strings = {name: StringColumnWriter(os.path.join(self.tmp, "sites", name))
+                         for name in STRING_COLUMNS}
+
+    def add(self, chrom, pos, ref, alt, filt, is_snp, codes, info_an=-1, info_ac=-1):
+        self._columns["CHROM"].append(self.contig_index[chrom])
+        self._columns["POS"].append(pos)
+        self._columns["IS_SNP"].append(is_snp)
+        self._columns["INFO_AN"].append(info_an)
+        self._columns["INFO_AC"].append(info_ac)
+        for name, text in zip(STRING_COLUMNS, (ref, alt, filt)):
+            self._strings[name].append(text)
+        self._block[self._n_block] = codes
+        self._n_block += 1
+        self.n_sites += 1
+        if self._n_block == len(self._block):
+            self._flush()
+
+    def _flush(self):
+        if not self._n_block:
+            return
+        block = self._block[:self._n_block]
+        step = self.meta["chunk_samples"]
+        for j, start in enumerate(range(0, block.shape[1], step)):
+            chunk = np.ascontiguousarray(block[:, start:start + step])
+            name = os.path.join(self.tmp, "gt", f"{self._n_chunks:06d}_{j:04d}.npy")
+            if self.meta["compress"] == "zlib":
+                with open(name + ".zlib", "wb") as f:
+                    f.write(zlib.compress(chunk.tobytes(), self.level))
+            else:
+                np.save(name, chunk)
+        self._n_chunks += 1
+        self._n_block = 0
+
+    def close(self):
+        self._flush()
+        sites = os.path.join(self.tmp, "sites")
+        dtypes = {"CHROM": np.int32, "POS": np.int64, "IS_SNP": bool,
+                  "INFO_AN": np.int64, "INFO_AC": np.int64}
+        for name, values in self._columns.items():
+            np.save(os.path.join(sites, f"{name}.npy"), np.asarray(values, dtype=dtypes[name]))
+        for column in self._strings.values():
+            column.close()
+        self.meta["n_sites"] = self.n_sites
+        with open(os.path.join(self.tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(self.tmp, self.path)
+
+
+class _Genotype:
+    __slots__ = ("_codes", "_table")
+
+    def __init__(self, codes, table):
+        self._codes = codes
+        self._table = table
+
+    def array(self):
+        return self._table[self._codes.astype(np.intp) - CODE_MIN]
+
+
+class StoreVariant:
+    """存储中的一个位点，提供统计代码用到的 cyvcf2.Variant 属性。"""
+
+    __slots__ = ("CHROM", "POS", "REF", "ALT", "FILTER", "is_snp", "INFO", "ploidy", "genotype")
+
+    def __init__(self, chrom, pos, ref, alt, filt, is_snp, an, ac, ploidy, genotype):
+        self.CHROM = chrom
+        self.POS = pos
+        self.REF = ref
+        self.ALT = [alt]
+        self.FILTER = filt or None
+        self.is_snp = is_snp
+        self.INFO = {}
+        if an >= 0:
+            self.INFO["AN"] = an
+        if ac >= 0:
+            self.INFO["AC"] = ac
+        self.ploidy = ploidy
+        self.genotype = genotype
+
+
+class GenotypeStore:
+    """
+    只读打开基因型存储，接口与 cyvcf2.VCF 一致：迭代得到全部位点，
+    store("chr1:1000-2000") / store("chr1:1000-") / store("chr1") 按区域查询；
+    samples 为样本 ID 列表时只读取这些样本所在的样本块（结果按存储中的样本顺序）。
+    """
+
+    def __init__(self, path, samples=None):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT or meta.get("version") != STORE_VERSION:
+            sys.exit(f"{path} 不是可识别的基因型存储（format/version 不符）。")
+        self.path = path
+        self.meta = meta
+        self.ploidy = meta["ploidy"]
+        self.seqnames = meta["contigs"]
+        self.seqlens = meta["contig_lengths"]
+        self.n_sites = meta["n_sites"]
+        self.chunk_sites = meta["chunk_sites"]
+        self.chunk_samples = meta["chunk_samples"]
+        self.decode = decode_table(self.ploidy)
+
+        sites = os.path.join(path, "sites")
+        self.chrom, self.pos, self.is_snp, self.info_an, self.info_ac = (
+            np.load(os.path.join(sites, f"{name}.npy"), mmap_mode="r")
+            for name in ("CHROM", "POS", "IS_SNP", "INFO_AN", "INFO_AC"))
+        self.ref, self.alt, self.filter = (StringColumn(os.path.join(sites, name))
+                                           for name in STRING_COLUMNS)
+        # 每个 contig 在位点列中的 [起, 止)（转换时保证同一 contig 连续且 POS 有序）
+        bounds = np.searchsorted(self.chrom, np.arange(len(self.seqnames) + 1))
+        self._contig_range = {name: (int(bounds[k]), int(bounds[k + 1]))
+                              for k, name in enumerate(self.seqnames)}
+
+        all_samples = meta["samples"]
+        if samples is None:
+            self._sel = np.arange(len(all_samples))
+        else:
+            wanted = set(samples)
+            self._sel = np.asarray([i for i, s in enumerate(all_samples) if s in wanted],
+                                   dtype=np.intp)
+        self.samples = [all_samples[i] for i in self._sel]
+        # 需要读取的样本块及块内列
+        blocks = self._sel // self.chunk_samples
+        self._sample_chunks = [(int(j), self._sel[blocks == j] - j * self.chunk_samples)
+                               for j in np.unique(blocks)]
+        self._cached = (None, None)
+
+    def _chunk(self, k, j):
+        name = os.path.join(self.path, "gt", f"{k:06d}_{j:04d}.npy")
+        if self.meta["compress"] == "zlib":
+            with open(name + ".zlib", "rb") as f:
+                data = np.frombuffer(zlib.decompress(f.read()), dtype=np.int8)
+            rows = min(self.chunk_sites, self.n_sites - k * self.chunk_sites)
+            return data.reshape(rows, -1)
+        return np.load(name, mmap_mode="r")
+
+    def _block(self, k):
+        """第 k 个位点块中所选样本的编码矩阵（位点 × 样本），缓存最近一块。"""
+        if self._cached[0] != k:
+            parts = [self._chunk(k, j)[:, cols] for j, cols in self._sample_chunks]
+            block = (np.concatenate(parts, axis=1) if len(parts) > 1 else
+                     parts[0] if parts else
+                     np.zeros((min(self.chunk_sites, self.n_sites - k * self.chunk_sites), 0),
+                              dtype=np.int8))
+            self._cached = (k, block)
+        return self._cached[1]
+
+    def _iter_range(self, lo, hi):
+        # 按位点块整段取出各列，再逐位点组装
+        while lo < hi:
+            k, r0 = divmod(lo, self.chunk_sites)
+            end = min(hi, (k + 1) * self.chunk_sites)
+            block = self._block(k)
+            columns = zip(
+                (self.seqnames[c] for c in np.asarray(self.chrom[lo:end]).tolist()),
+                np.asarray(self.pos[lo:end]).tolist(),
+                self.ref.slice(lo, end), self.alt.slice(lo, end), self.filter.slice(lo, end),
+                np.asarray(self.is_snp[lo:end]).tolist(),
+                np.asarray(self.info_an[lo:end]).tolist(),
+                np.asarray(self.info_ac[lo:end]).tolist(),
+            )
+            for r, fields in enumerate(columns, r0):
+                yield StoreVariant(*fields, self.ploidy, _Genotype(block[r], self.decode))
+            lo = end
+
+    def __iter__(self):
+        return self._iter_range(0, self.n_sites)
+
+    def __call__(self, region):
+        """按 CHROM[:START[-[END]]]（1-based，闭区间）查询。"""
+        chrom, _, span = region.partition(":")
+        if chrom not in self._contig_range:
+            return iter(())
+        lo, hi = self._contig_range[chrom]
+        if span:
+            start, _, end = span.replace(",", "").partition("-")
+            pos = self.pos[lo:hi]
+            new_lo = lo + int(np.searchsorted(pos, int(start), "left")) if start else lo
+            hi = lo + int(np.searchsorted(pos, int(end), "right")) if end else hi
+            lo = new_lo
+        return self._iter_range(lo, hi)
+
+    def get_header_type(self, tag):
+        if tag not in self.meta["info_fields"]:
+            raise KeyError(tag)
+        return "Integer"
+
+    def close(self):
+        self._cached = (None, None)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+table_utils.py
+
+下游脚本（4/5/6/7）共用的表格读取工具：
+- 按扩展名透明读取 .csv / .parquet / .feather 变异表，支持列投影；
+  CSV 可为 gzip（.gz）或 zstd（.zst，需 zstandard）压缩
+- MAF 列统一转换为百分数浮点数
+- 逐行流式读取变异表（常数内存，供 k 路归并使用）
+- 分块读取变异表，并在每块内先做过滤（不匹配的行不会累积在内存中）
+- 变异键编码：(CHROM, POS, REF, ALT) 打包为 64 位整数，合并/去重/存在性判断
+  都用整数完成
+"""
+
+import csv
+import gzip
+import io
+import re
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# 变异详情文件的匹配模式（4-结果整理.py 按目录收集）
+VAR_PATTERNS = [
+    "*.var.csv", "*.var_*.csv",
+    "*.var.csv.gz", "*.var_*.csv.gz", "*.var.csv.zst", "*.var_*.csv.zst",
+    "*.var.parquet", "*.var.feather",
+]
+
+
+def open_text(path):
+    """
+    以文本方式打开（可能压缩的）CSV：.gz 用 gzip（支持多个成员），
+    .zst 用 zstandard 并跨帧读取（断点续写的文件由多个帧组成）。
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            sys.exit(f"读取 {path} 需要安装 zstandard：pip install zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True)
+        return io.TextIOWrapper(raw, newline="", encoding="utf-8")
+    return open(path, newline="", encoding="utf-8")
+
+
+@contextmanager
+def csv_source(path):
+    """交给 pandas.read_csv 的输入：.zst 为跨帧读取的文本流，其余直接为路径（.gz 由 pandas 解压）。"""
+    if not path.endswith(".zst"):
+        yield path
+        return
+    with open_text(path) as f:
+        yield f
+
+
+def read_var_table(path, columns=None, dtype=None):
+    """
+    读取变异表，只加载 columns 指定的列（None 表示全部）。
+
+    - .parquet / .feather：列式读取，只解码需要的列；dtype 用于把类型统一到
+      与 CSV 读取一致（如 POS 转 str），分类列会随之转为普通列
+    - 其他：按 CSV 读取（usecols + dtype）
+    """
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path, columns=columns)
+    elif path.endswith(".feather"):
+        df = pd.read_feather(path, columns=columns)
+    else:
+        with csv_source(path) as src:
+            return pd.read_csv(src, usecols=columns, dtype=dtype)
+
+    if dtype is not None:
+        if isinstance(dtype, dict):
+            dtype = {k: v for k, v in dtype.items() if k in df.columns}
+        df = df.astype(dtype)
+    return df
+
+
+def maf_pct(series):
+    """
+    MAF 列转为百分数浮点数：CSV 中为 '0.25%' 形式的字符串，
+    Parquet/Feather 中已是浮点数（0.25），无需再解析。
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    return series.astype(str).str.rstrip('%').astype(float)
+
+
+def iter_var_rows(path, columns, batch_rows=65536):
+    """
+    逐行流式读取变异表，按 columns 顺序产出元组，内存只与批大小有关。
+
+    CSV 中的值均为字符串；Parquet/Feather 中保持原类型（如 POS 为 int）。
+    """
+    if path.endswith((".parquet", ".feather")):
+        import pyarrow as pa
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            batches = pq.ParquetFile(path).iter_batches(
+                batch_size=batch_rows, columns=columns)
+        else:
+            reader = pa.ipc.open_file(path)
+            batches = (reader.get_batch(i)
+                       for i in range(reader.num_record_batches))
+        for batch in batches:
+            missing = [c for c in columns if c not in batch.schema.names]
+            if missing:
+                sys.exit(f"文件 {path} 中缺少必需的列：{','.join(missing)}")
+            yield from zip(*(batch.column(c).to_pylist() for c in columns))
+        return
+
+    with open_text(path) as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        missing = [c for c in columns if c not in header]
+        if missing:
+            sys.exit(f"文件 {path} 中缺少必需的列：{','.join(missing)}")
+        idx = [header.index(c) for c in columns]
+        for row in reader:
+            yield tuple(row[i] for i in idx)
+
+
+# 过滤表达式可以引用的列
+FILTER_COLUMNS = ["Freq", "Type", "Special", "MAF"]
+
+
+def filter_columns(expr):
+    """返回过滤表达式中引用到的 FILTER_COLUMNS 列"""
+    if not expr:
+        return []
+    names = set(re.findall(r"[A-Za-z_]\w*", expr))
+    return [c for c in FILTER_COLUMNS if c in names]
+
+
+def iter_var_chunks(path, columns, expr=None, chunk_rows=500_000):
+    """
+    分块读取变异表（只读 columns 及过滤用到的列），每块内先用 DataFrame.query(expr)
+    过滤后再产出，不匹配的行不会在块之外保留。
+
+    MAF 在过滤前统一为百分数浮点数，Freq/Type/Special 的空值统一为空字符串
+    （CSV 的空单元格不读作 NaN），因此 CSV 与 Parquet/Feather 可用同一表达式，
+    如 "Freq == 'Common' and Type == 'Indel' and MAF >= 5" 或 "Special == ''"。
+    """
+    read_cols = list(dict.fromkeys(list(columns) + filter_columns(expr)))
+    if path.endswith(".zst"):
+        with csv_source(path) as src:
+            for chunk in pd.read_csv(src, usecols=read_cols, chunksize=chunk_rows):
+                yield from _filter_chunk(chunk, columns, expr)
+        return
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        chunks = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(
+            batch_size=chunk_rows, columns=read_cols))
+    elif path.endswith(".feather"):
+        import pyarrow as pa
+        reader = pa.ipc.open_file(path)
+        chunks = (reader.get_batch(i).select(read_cols).to_pandas()
+                  for i in range(reader.num_record_batches))
+    else:
+        chunks = pd.read_csv(path, usecols=read_cols, chunksize=chunk_rows)
+
+    for chunk in chunks:
+        yield from _filter_chunk(chunk, columns, expr)
+
+
+def _filter_chunk(chunk, columns, expr):
+    for col in ("Freq", "Type", "Special"):
+        if col in chunk.columns:
+            chunk[col] = chunk[col].fillna("")
+    if "MAF" in chunk.columns:
+        chunk["MAF"] = maf_pct(chunk["MAF"])
+    if expr:
+        chunk = chunk.query(expr)
+    yield chunk[list(columns)]
+
+
+# 64 位变异键的位宽：染色体编号 | POS | 等位基因对编号（最高位留作符号位）
+CONTIG_BITS = 12
+POS_BITS = 30
+ALLELE_BITS = 21
+
+
+class VariantKeyEncoder:
+    """
+    把 (CHROM, POS, REF, ALT) 编码为 int64 变异键：
+
+        key = contig_id << (POS_BITS + ALLELE_BITS) | POS << ALLELE_BITS | allele_id
+
+    contig_id 和 allele_id（(REF, ALT) 对）按首次出现顺序分配，编号表保存在
+    编码器中，因此同一个编码器编码的各表之间键可直接比较（np.isin / 整数 merge）。
+    每行只在编码时做一次字符串哈希，之后的合并都是整数运算。
+    """
+
+    def __init__(self):
+        self.contigs = {}
+        self.alleles = {}
+
+    @staticmethod
+    def _assign(mapping, uniques, limit, what):
+        ids = np.empty(len(uniques), dtype=np.int64)
+        for i, u in enumerate(uniques):
+            j = mapping.get(u)
+            if j is None:
+                j = mapping[u] = len(mapping)
+                if j >= limit:
+                    sys.exit(f"{what}种类超过 {limit}，无法编码为 64 位变异键。")
+            ids[i] = j
+        return ids
+
+    def encode(self, chrom, pos, ref, alt):
+        """
+        编码等长的列（Series / 数组），返回 int64 数组。
+        chrom 为 None 时所有行的染色体编号为 0（只按 POS, REF, ALT 比较）。
+        """
+        pos = np.asarray(pos, dtype=np.int64)
+        if pos.size and (pos.min() < 0 or pos.max() >= 1 << POS_BITS):
+            sys.exit(f"POS 超出 {POS_BITS} 位范围，无法编码为 64 位变异键。")
+
+        if chrom is None:
+            contig_ids = np.zeros(len(pos), dtype=np.int64)
+        else:
+            codes, uniques = pd.factorize(pd.Series(chrom).astype(str))
+            contig_ids = self._assign(self.contigs, uniques, 1 << CONTIG_BITS, "染色体")[codes]
+
+        # (REF, ALT) 对：先分别因子化，再对组合的整数码因子化，避免拼接字符串
+        ref_codes, ref_uniques = pd.factorize(pd.Series(ref).astype(str))
+        alt_codes, alt_uniques = pd.factorize(pd.Series(alt).astype(str))
+        n_alt = max(len(alt_uniques), 1)
+        pair_codes, pair_uniques = pd.factorize(ref_codes.astype(np.int64) * n_alt + alt_codes)
+        pairs = [(ref_uniques[p // n_alt], alt_uniques[p % n_alt]) for p in pair_uniques]
+        allele_ids = self._assign(self.alleles, pairs, 1 << ALLELE_BITS, "等位基因对")[pair_codes]
+
+        return ((contig_ids << (POS_BITS + ALLELE_BITS))
+                | (pos << ALLELE_BITS)
+                | allele_ids)
+
+    def decode(self, keys):
+        """键数组还原为 (CHROM, POS, REF, ALT) 四个数组（CHROM 未编码时为空字符串）"""
+        keys = np.asarray(keys, dtype=np.int64)
+        contig_names = np.array(list(self.contigs) or [""], dtype=object)
+        allele_pairs = list(self.alleles)
+        refs = np.array([r for r, _ in allele_pairs], dtype=object)
+        alts = np.array([a for _, a in allele_pairs], dtype=object)
+        allele_ids = keys & ((1 << ALLELE_BITS) - 1)
+        return (contig_names[keys >> (POS_BITS + ALLELE_BITS)],
+                (keys >> ALLELE_BITS) & ((1 << POS_BITS) - 1),
+                refs[allele_ids], alts[allele_ids])
+
+    def sort_keys(self, keys):
+        """
+        按 (染色体首次出现顺序, POS, REF, ALT) 排序键：等位基因对编号按出现顺序分配，
+        这里换算为字符串字典序的名次后再排序。
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        allele_rank = np.empty(len(self.alleles), dtype=np.int64)
+        allele_rank[[self.alleles[p] for p in sorted(self.alleles)]] = np.arange(len(self.alleles))
+        allele_ids = keys & ((1 << ALLELE_BITS) - 1)
+        order = np.lexsort((allele_rank[allele_ids], keys >> ALLELE_BITS))
+        return keys[order]
+
+
+def key_isin(keys, other):
+    """keys 中每个变异键是否出现在 other 中（哈希查找，比 np.isin 的排序实现快）"""
+    return pd.Series(keys, dtype=np.int64).isin(other).to_numpy()
@@ -0,0 +1,1952 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+vcf_utils.py
+
+各统计脚本共用的工具函数：
+- Source 名称推导、频率 / Special 分类、MAF 格式化
+- 汇总统计 CSV 的写出；变异详情的 CSV / Parquet / Feather 写出
+- MAF 分箱计数（统计时流式累计，可按其他群体是否出现拆分）
+- 位点频率谱（SFS，按 (AN, AC) 整数计数，输出时可折叠 / 投影到固定 AN）
+  及两群体联合频率谱 / 联合 MAF 分箱矩阵
+- 样本列表 / 样本信息表表达式定义群体，叶子划分汇总各级群体（多群体单次遍历模式）
+- 基于 NumPy 的伪二倍体等位基因计数；双等位位点的位打包（popcount）计数
+- AN / AC 来源（INFO 或基因型）与倍性的自动识别，共用的逐 ALT 分类写出循环
+- 输入可为 VCF 或基因型存储（.gtstore，见 store_utils.py）
+- 基于索引（.csi/.tbi）的区域切分与多进程并行；按区域保存断点、续跑
+- 单群体统计主流程（详情输出、并行、流式汇总计数、结果缓存）
+"""
+
+import argparse
+import csv
+import glob
+import io
+import math
+import os
+import pickle
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import warnings
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from cyvcf2 import VCF
+
+import cache_utils
+import profile_utils
+import store_utils
+from cache_utils import cache_key, code_digest, vcf_identity
+from profile_utils import profile_records, profile_writer, profiled_call, stage
+from store_utils import GenotypeStore, STORE_SUFFIX, is_store
+
+# 变异详情 CSV 表头
+VAR_HEADER = [
+    "CHROM", "POS", "REF", "ALT", "AC", "Source",
+    "Freq", "Type", "Special", "MAF"
+]
+
+# 变异详情输出格式及对应后缀
+VAR_FORMATS = {
+    "csv": ".var.csv",
+    "parquet": ".var.parquet",
+    "feather": ".var.feather",
+}
+
+# CSV 详情的压缩方式及对应后缀
+VAR_COMPRESSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+# 列式格式中分类列的固定类别（各批次共用同一字典）
+FREQ_CLASSES = ["Common", "LowFreq", "Rare", "UltraRare"]
+TYPE_CLASSES = ["SNV", "Indel"]
+SPECIAL_CLASSES = ["Singleton", "Doubleton", ""]
+
+
+def open_vcf(path, samples=None, threads=None):
+    """
+    打开输入：VCF / BCF 用 cyvcf2，基因型存储目录（.gtstore）用 GenotypeStore，
+    两者接口相同。samples 为样本 ID 列表时只读取这些样本（按文件中的顺序）。
+    threads 为 htslib 的 BGZF 解压线程数（只对 VCF / BCF 有效）。
+    """
+    if is_store(path):
+        return GenotypeStore(path, samples)
+    kwargs = {"threads": threads} if threads else {}
+    if samples is not None:
+        kwargs["samples"] = list(samples)
+    return VCF(path, **kwargs)
+
+
+def derive_source(vcf_path):
+    """
+    从文件名中提取基本名作为 Source，去掉 .vcf / .vcf.gz / .gtstore 后缀
+    """
+    base = os.path.basename(vcf_path.rstrip("/"))
+    for ext in (".vcf.gz", ".vcf", STORE_SUFFIX):
+        if base.endswith(ext):
+            return base[:-len(ext)]
+    return base
+
+
+def classify_freq(maf):
+    """按 MAF 返回频率分类标签。"""
+    if maf >= 0.05:
+        return "Common"
+    elif maf >= 0.01:
+        return "LowFreq"
+    elif maf >= 0.001:
+        return "Rare"
+    return "UltraRare"
+
+
+def classify_special(ac):
+    """按 AC 返回 Singleton / Doubleton 标签，其余为空字符串。"""
+    if ac == 1:
+        return "Singleton"
+    elif ac == 2:
+        return "Doubleton"
+    return ""
+
+
+def format_maf(maf):
+    """MAF 格式化为百分比字符串，保留两位小数（如 0.25%）。"""
+    return f"{maf * 100:.2f}%"
+
+
+def write_summary(path, freq_counts, type_counts, special_counts, source):
+    """写出 Category/Class/Count/Source 汇总统计 CSV。"""
+    try:
+        with open(path, "w", newline="", encoding="utf-8") as out_f:
+            writer = csv.writer(out_f)
+            writer.writerow(["Category", "Class", "Count", "Source"])
+            for cls, cnt in freq_counts.items():
+                writer.writerow(["Frequency", cls, cnt, source])
+            for cls, cnt in type_counts.items():
+                writer.writerow(["Type", cls, cnt, source])
+            for cls, cnt in special_counts.items():
+                writer.writerow(["Special", cls, cnt, source])
+    except Exception as e:
+        sys.exit(f"无法写入 {path}：{e}")
+
+
+def merge_counts(dst, src):
+    """把计数字典 src 累加到 dst（保持各类别首次出现的顺序）。"""
+    for key, cnt in src.items():
+        dst[key] = dst.get(key, 0) + cnt
+
+
+def var_format(path, fmt=None):
+    """确定详情输出格式：显式指定优先，否则按扩展名判断，默认 csv。"""
+    if fmt:
+        return fmt
+    for name in VAR_FORMATS:
+        if path and path.endswith("." + name):
+            return name
+    return "csv"
+
+
+def var_compression(path, compress=None):
+    """确定 CSV 详情的压缩方式：显式指定优先（none 为不压缩），否则按 .gz / .zst 后缀判断。"""
+    if compress:
+        return None if compress == "none" else compress
+    for name, suffix in VAR_COMPRESSIONS.items():
+        if path and path.endswith(suffix):
+            return name
+    return None
+
+
+def gzip_member(data, level):
+    """把 data 压缩为一个独立的 gzip 成员。"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class GzipBlocks:
+    """
+    分块 gzip 压缩：每 block_bytes 字节压缩为一个独立的 gzip 成员（多个成员首尾相接
+    仍是合法的 gzip 文件，gzip / zcat / pandas 均可直接读取）。threads > 1 时在线程池中
+    并行压缩（zlib 压缩时释放 GIL），按提交顺序写出，同时最多 2×threads 块在途。
+    flush 后文件在成员边界上，可作为断点偏移截断续写。
+    """
+
+    def __init__(self, f, level=6, threads=1, block_bytes=1 << 20):
+        self._f = f
+        self.level = level
+        self.threads = threads
+        self.block_bytes = block_bytes
+        self._buf = bytearray()
+        self._pool = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._pending = deque()
+
+    def write(self, data):
+        self._buf += data
+        if len(self._buf) >= self.block_bytes:
+            self._submit()
+
+    def _submit(self):
+        if not self._buf:
+            return
+        data = bytes(self._buf)
+        self._buf.clear()
+        if self._pool is None:
+            self._f.write(gzip_member(data, self.level))
+            return
+        self._pending.append(self._pool.submit(gzip_member, data, self.level))
+        while len(self._pending) > 2 * self.threads:
+            self._f.write(self._pending.popleft().result())
+
+    def flush(self):
+        self._submit()
+        while self._pending:
+            self._f.write(self._pending.popleft().result())
+
+    def close(self):
+        self.flush()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+class ZstdFrames:
+    """zstd 压缩（需要 zstandard），threads > 1 时由 zstd 多线程压缩；flush 结束当前帧。"""
+
+    def __init__(self, f, level=3, threads=1):
+        try:
+            import zstandard
+        except ImportError:
+            sys.exit("zstd 压缩需要安装 zstandard：pip install zstandard")
+        self._flush_frame = zstandard.FLUSH_FRAME
+        cctx = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+        self._writer = cctx.stream_writer(f, closefd=False)
+
+    def write(self, data):
+        self._writer.write(data)
+
+    def flush(self):
+        self._writer.flush(self._flush_frame)
+
+    def close(self):
+        self._writer.close()
+
+
+class PlainBytes:
+    """不压缩，直接写出。"""
+
+    def __init__(self, f):
+        self.write = f.write
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CsvVarWriter:
+    """
+    变异详情 CSV 写出（写表头，支持追加并行分片）。
+
+    详情行先缓存，每 block_rows 行用 csv.writer.writerows 一次格式化到内存缓冲区，
+    编码后整块写出，不再逐行写文件。compress 为 gzip / zstd 时写出压缩文件，
+    threads 为压缩线程数（gzip 分块并行压缩，zstd 用其内置多线程）。
+    resume_offset 不为 None 时为断点续跑：截断到该字节偏移后继续追加，不再写表头
+    （压缩文件的偏移总在 gzip 成员 / zstd 帧的边界上）。
+    """
+
+    def __init__(self, path, resume_offset=None, header=True, compress=None, threads=1,
+                 block_rows=4096):
+        if resume_offset is None:
+            self._f = open(path, "wb")
+        else:
+            self._f = open(path, "r+b")
+            self._f.truncate(resume_offset)
+            self._f.seek(0, os.SEEK_END)
+        if compress == "gzip":
+            self._out = GzipBlocks(self._f, threads=threads)
+        elif compress == "zstd":
+            self._out = ZstdFrames(self._f, threads=threads)
+        else:
+            self._out = PlainBytes(self._f)
+        self.block_rows = block_rows
+        self._rows = []
+        self._text = io.StringIO(newline="")
+        self._csv = csv.writer(self._text)
+        if header and resume_offset is None:
+            self.writerow(VAR_HEADER)
+
+    def writerow(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.block_rows:
+            self._write_rows()
+
+    def writerows(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.block_rows:
+            self._write_rows()
+
+    def _write_rows(self):
+        if self._rows:
+            self._csv.writerows(self._rows)
+            self._out.write(self._text.getvalue().encode("utf-8"))
+            self._text.seek(0)
+            self._text.truncate()
+            self._rows = []
+
+    def flush(self):
+        self._write_rows()
+        self._out.flush()
+        self._f.flush()
+
+    def tell(self):
+        """落盘后的文件字节数，作为断点中的详情输出偏移。"""
+        self.flush()
+        os.fsync(self._f.fileno())
+        return os.fstat(self._f.fileno()).st_size
+
+    def append_part(self, part_path):
+        """把（未压缩的）CSV 分片追加到输出文件。"""
+        self._write_rows()
+        with open(part_path, "rb") as pf:
+            while True:
+                data = pf.read(1 << 20)
+                if not data:
+                    break
+                self._out.write(data)
+
+    def close(self):
+        self._write_rows()
+        self._out.close()
+        self._f.close()
+
+
+class ColumnarVarWriter:
+    """
+    变异详情 Parquet / Feather 写出（需要 pyarrow）。
+
+    按列缓存详情行，每 batch_rows 行写出一个批次：POS/AC 为 int64，
+    MAF 为百分数浮点数（与 CSV 中去掉 % 后的数值一致），
+    Source/Freq/Type/Special 为字典编码的分类列。
+    """
+
+    def __init__(self, path, fmt, source, batch_rows=500_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("输出 Parquet/Feather 需要安装 pyarrow：pip install pyarrow")
+        self._pa = pa
+        self.batch_rows = batch_rows
+
+        cat = pa.dictionary(pa.int8(), pa.string())
+        self.schema = pa.schema([
+            ("CHROM", pa.string()), ("POS", pa.int64()),
+            ("REF", pa.string()), ("ALT", pa.string()), ("AC", pa.int64()),
+            ("Source", cat), ("Freq", cat), ("Type", cat), ("Special", cat),
+            ("MAF", pa.float64()),
+        ])
+        self._classes = {
+            "Source": [source], "Freq": FREQ_CLASSES,
+            "Type": TYPE_CLASSES, "Special": SPECIAL_CLASSES,
+        }
+        self._codes = {name: {v: i for i, v in enumerate(values)}
+                       for name, values in self._classes.items()}
+
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(
+                path, self.schema,
+                options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        self._cols = [[] for _ in VAR_HEADER]
+
+    def writerow(self, row):
+        for col, value in zip(self._cols, row):
+            col.append(value)
+        if len(self._cols[0]) >= self.batch_rows:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if not self._cols[0]:
+            return
+        pa = self._pa
+        arrays = []
+        for name, values in zip(VAR_HEADER, self._cols):
+            if name in self._codes:
+                codes = self._codes[name]
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array([codes[v] for v in values], pa.int8()),
+                    pa.array(self._classes[name], pa.string())
+                ))
+            elif name in ("POS", "AC"):
+                arrays.append(pa.array([int(v) for v in values], pa.int64()))
+            elif name == "MAF":
+                arrays.append(pa.array([float(v.rstrip("%")) for v in values],
+                                       pa.float64()))
+            else:
+                arrays.append(pa.array([str(v) for v in values], pa.string()))
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self._cols = [[] for _ in VAR_HEADER]
+
+    def append_part(self, part_path):
+        """读取 CSV 分片（无表头）并按行转为列式批次。"""
+        with open(part_path, encoding="utf-8", newline="") as pf:
+            for row in csv.reader(pf):
+                self.writerow(row)
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+class StagedColumnarWriter(CsvVarWriter):
+    """
+    断点模式下的 Parquet / Feather 详情：列式文件无法截断续写，
+    先写入无表头的 <path>.staging.csv（可按偏移续写），结束时再整体转换。
+    """
+
+    def __init__(self, path, fmt, source, resume_offset=None):
+        self._target = (path, fmt, source)
+        self._staging = path + ".staging.csv"
+        super().__init__(self._staging, resume_offset, header=False)
+
+    def close(self):
+        super().close()
+        writer = ColumnarVarWriter(*self._target)
+        writer.append_part(self._staging)
+        writer.close()
+        os.remove(self._staging)
+
+
+def open_var_writer(path, fmt, source, resume_offset=None, staged=False,
+                    compress=None, threads=1):
+    """
+    按格式打开变异详情写出器，失败时退出。
+    staged 为真时（断点模式）列式格式先写可续写的暂存 CSV；
+    resume_offset 为断点记录的详情偏移。
+    compress（gzip / zstd）与压缩线程数 threads 只用于 CSV。
+    """
+    if compress and fmt != "csv":
+        sys.exit(f"--var-compress 只用于 CSV 详情，{fmt} 格式已自带压缩。")
+    try:
+        if fmt == "csv":
+            return CsvVarWriter(path, resume_offset, compress=compress, threads=threads)
+        if staged:
+            return StagedColumnarWriter(path, fmt, source, resume_offset)
+        return ColumnarVarWriter(path, fmt, source)
+    except OSError as e:
+        sys.exit(f"无法创建 {path}：{e}")
+
+
+class QueuedWriter:
+    """WriterThread.wrap 返回的写出器：详情行攒满 block_rows 行后整块交给后台线程写出。"""
+
+    def __init__(self, writer, thread, block_rows):
+        self._writer = writer
+        self._thread = thread
+        self.block_rows = block_rows
+        self._rows = []
+
+    def writerow(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.block_rows:
+            self.flush()
+
+    def writerows(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.block_rows:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._thread.submit(self._writer, self._rows)
+            self._rows = []
+
+
+class WriterThread:
+    """
+    后台写出线程（--pipeline）：主线程解析、分类，格式化后的详情行按块经有界队列
+    （max_blocks 块）交给一个后台线程调用各写出器的 writerows，写盘与计算重叠；
+    队列满时主线程等待，内存有上限。同一写出器的块按提交顺序写出，输出与直接写出相同。
+
+    作为上下文管理器使用，退出时写完剩余的块并等待线程结束，后台写出出错时在主线程重新抛出。
+    enabled 为假时 wrap 原样返回写出器，不启动线程。
+    """
+
+    def __init__(self, enabled=True, max_blocks=8, block_rows=4096):
+        self.enabled = enabled
+        self.block_rows = block_rows
+        self._writers = []
+        self._error = None
+        if enabled:
+            self._queue = queue.Queue(max_blocks)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def wrap(self, writer):
+        if not self.enabled or writer is None:
+            return writer
+        queued = QueuedWriter(writer, self, self.block_rows)
+        self._writers.append(queued)
+        return queued
+
+    def submit(self, writer, rows):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((writer, rows))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is None:
+                writer, rows = item
+                try:
+                    writer.writerows(rows)
+                except BaseException as e:
+                    self._error = e
+
+    def close(self):
+        if not self.enabled:
+            return
+        with stage("等待写出"):
+            for queued in self._writers:
+                queued.flush()
+            self._queue.put(None)
+            self._thread.join()
+        self.enabled = False
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.enabled:
+            # 主线程已出错：不再写剩余的块，只结束线程
+            self._queue.put(None)
+            self._thread.join()
+        return False
+
+
+def add_pipeline_args(parser):
+    """为统计脚本添加 --pipeline / --io-threads 参数。"""
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="单进程流水线：htslib 解压线程 + 按块向量化分类 + 后台线程写出详情，"
+             "结果与默认方式相同；与 --threads 同用时各进程只按块分类"
+    )
+    parser.add_argument(
+        "--io-threads", type=int, default=2,
+        help="--pipeline 时 htslib 的 BGZF 解压线程数 [默认: 2]"
+    )
+
+
+# 流水线模式每块的位点数
+PIPELINE_BLOCK_SITES = 1024
+
+
+# ---------------------------------------------------------------------------
+# MAF 分箱计数
+# ---------------------------------------------------------------------------
+
+# 默认分箱边界（%，左闭右开）与标签，与 7-分箱堆叠.py 的 define_bins() 相同
+DEFAULT_MAF_EDGES = [0, 0.1, 0.3, 0.5, 0.7, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 40.0, 50.0]
+DEFAULT_MAF_LABELS = [
+    '<0.1', '0.1-0.3', '0.3-0.5', '0.5-0.7', '0.7-1.0',
+    '1-2', '2-5', '5-10', '10-20', '20-30', '30-40', '40-50'
+]
+
+
+def parse_maf_bins(text):
+    """解析逗号分隔的 MAF 分箱边界（%），要求严格递增且至少两个。"""
+    try:
+        edges = [float(x) for x in text.split(",") if x.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无法解析分箱边界：{text}")
+    if len(edges) < 2 or any(a >= b for a, b in zip(edges, edges[1:])):
+        raise argparse.ArgumentTypeError(f"分箱边界需至少两个且严格递增：{text}")
+    return edges
+
+
+def maf_bin_labels(edges):
+    """分箱标签：默认边界时与 7-分箱堆叠.py 相同，否则为 '下界-上界'（起点为 0 时首箱为 '<上界'）。"""
+    if list(edges) == DEFAULT_MAF_EDGES:
+        return list(DEFAULT_MAF_LABELS)
+    labels = [f"{a:g}-{b:g}" for a, b in zip(edges, edges[1:])]
+    if edges[0] == 0:
+        labels[0] = f"<{edges[1]:g}"
+    return labels
+
+
+class MafHistogram:
+    """
+    按 MAF 分箱计数（左闭右开，超出边界的不计）。
+
+    MAF 与详情表中的 MAF 列一致，取百分数并保留两位小数，逐个追加到缓冲区，
+    每 buffer_rows 个用 np.searchsorted + np.bincount 成批分箱。
+    groups 非空时同时记录每个变异在哪些群体中出现（位掩码，第 k 位对应 groups[k]），
+    present[k] 为在 groups[k] 中出现的变异按本群体 MAF 的分箱计数。
+    """
+
+    def __init__(self, edges, groups=(), buffer_rows=65536):
+        self.edges = np.asarray(edges, dtype=float)
+        self.groups = list(groups)
+        self.buffer_rows = buffer_rows
+        n_bins = len(self.edges) - 1
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.present = np.zeros((len(self.groups), n_bins), dtype=np.int64)
+        self._maf = []
+        self._mask = []
+
+    def add(self, maf, mask=0):
+        self._maf.append(round(maf * 100, 2))
+        self._mask.append(mask)
+        if len(self._maf) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._maf:
+            return
+        n_bins = len(self.counts)
+        bins = np.searchsorted(self.edges, np.asarray(self._maf), side="right") - 1
+        keep = (bins >= 0) & (bins < n_bins)
+        bins = bins[keep]
+        self.counts += np.bincount(bins, minlength=n_bins)
+        if self.groups:
+            mask = np.asarray(self._mask, dtype=np.int64)[keep]
+            for k in range(len(self.groups)):
+                self.present[k] += np.bincount(bins[(mask >> k) & 1 == 1], minlength=n_bins)
+        self._maf = []
+        self._mask = []
+
+    def merge(self, other):
+        """累加另一个（例如并行 worker 返回的）同分箱直方图。"""
+        self.flush()
+        other.flush()
+        self.counts += other.counts
+        self.present += other.present
+
+    def write(self, path, name):
+        """
+        写出 Bin_MAF_Comparison 格式的 CSV：MAF, <name>_count，
+        以及每个其他群体 H 的 <H>_count（在 H 中也出现）、non_<H>_count。
+        """
+        self.flush()
+        header = ["MAF", f"{name}_count"]
+        others = [k for k, g in enumerate(self.groups) if g != name]
+        for k in others:
+            header += [f"{self.groups[k]}_count", f"non_{self.groups[k]}_count"]
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as out_f:
+                writer = csv.writer(out_f)
+                writer.writerow(header)
+                for b, label in enumerate(maf_bin_labels(self.edges.tolist())):
+                    row = [label, int(self.counts[b])]
+                    for k in others:
+                        row += [int(self.present[k, b]), int(self.counts[b] - self.present[k, b])]
+                    writer.writerow(row)
+        except Exception as e:
+            sys.exit(f"无法写入 {path}：{e}")
+
+
+def add_maf_args(parser, multi=False):
+    """为统计脚本添加 --maf-bins / --maf-out（多群体模式另加 --maf-hist）参数。"""
+    parser.add_argument(
+        "--maf-bins", type=parse_maf_bins, default=DEFAULT_MAF_EDGES,
+        help="MAF 分箱边界（%%，逗号分隔，左闭右开）[默认: 0,0.1,0.3,0.5,0.7,1,2,5,10,20,30,40,50]"
+    )
+    parser.add_argument(
+        "--maf-out",
+        help="统计时直接输出 MAF 分箱计数 CSV（无需读回变异详情）"
+    )
+    if multi:
+        parser.add_argument(
+            "--maf-hist", action="store_true",
+            help="多群体模式：为每个群体输出 <群体>.maf.csv，"
+                 "含在其他各群体中出现 / 未出现的分箱计数"
+        )
+
+
+# ---------------------------------------------------------------------------
+# 位点频率谱（SFS）
+# ---------------------------------------------------------------------------
+
+# 默认投影大小：使 AN 不小于它的等位基因至少占此比例（见 projection_size）
+SFS_KEEP = 0.95
+
+
+def projection_size(an_counts, keep=SFS_KEEP):
+    """
+    由 {AN: 等位基因数} 取默认的投影大小：AN 不小于它的等位基因至少占 keep 的最大 AN
+    （AN 分布的 1 - keep 分位数）。缺失率不同时绝大多数位点向下投影而不是被跳过；
+    所有位点 AN 相同时即为该 AN。
+    """
+    total = sum(an_counts.values())
+    kept = 0
+    for an in sorted(an_counts, reverse=True):
+        kept += an_counts[an]
+        if kept >= keep * total:
+            return an
+    return 0
+
+
+class SiteFrequencySpectrum:
+    """
+    位点频率谱：统计时只按 (AN, AC) 做整数计数（每个 ALT 一条，与详情行一致），
+    写出时再折叠或投影，因此输出大小只与样本量有关。
+
+    (AN, AC) 对先追加到缓冲区，每 buffer_rows 个打包为 AN << 32 | AC
+    后用 np.unique 成批累加到 {AN: 按 AC 的计数数组}。
+    """
+
+    def __init__(self, buffer_rows=65536):
+        self.buffer_rows = buffer_rows
+        self.by_an = {}
+        self._codes = []
+
+    def add(self, an, ac):
+        self._codes.append((an << 32) | ac)
+        if len(self._codes) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._codes:
+            return
+        codes, cnts = np.unique(np.asarray(self._codes, dtype=np.int64), return_counts=True)
+        ans, acs = codes >> 32, codes & 0xFFFFFFFF
+        for an in np.unique(ans).tolist():
+            sel = ans == an
+            hist = self.by_an.get(an)
+            if hist is None:
+                hist = self.by_an[an] = np.zeros(an + 1, dtype=np.int64)
+            np.add.at(hist, acs[sel], cnts[sel])
+        self._codes = []
+
+    def merge(self, other):
+        """累加另一个（例如并行 worker 返回的）频率谱。"""
+        self.flush()
+        other.flush()
+        for an, hist in other.by_an.items():
+            if an in self.by_an:
+                self.by_an[an] += hist
+            else:
+                self.by_an[an] = hist.copy()
+
+    def spectrum(self, target=None, folded=False):
+        """
+        返回 (target, 频率谱数组, 因 AN < target 被跳过的等位基因数)。
+
+        target 为 None 时由 projection_size 取（至少保留 95% 的等位基因）；
+        AN 大于 target 的位点按超几何分布投影到 target 个等位基因，
+        结果为浮点数（期望计数）。folded 时按 min(AC, target - AC) 折叠。
+        """
+        self.flush()
+        if target is None:
+            target = projection_size({an: int(hist.sum()) for an, hist in self.by_an.items()})
+        sfs = np.zeros(target + 1)
+        skipped = 0
+        for an, hist in self.by_an.items():
+            if an < target:
+                skipped += int(hist.sum())
+            elif an == target:
+                sfs += hist
+            else:
+                acs = np.flatnonzero(hist)
+                sfs += hist[acs] @ hypergeom_projection(an, target, acs)
+
+        if folded:
+            half = target // 2
+            folded_sfs = sfs[:half + 1].copy()
+            folded_sfs[:target - half] += sfs[target:half:-1]
+            sfs = folded_sfs
+        return target, sfs, skipped
+
+    def write(self, path, name, target=None, folded=False):
+        """
+        写出 AN, AC, Count, Source 四列的频率谱 CSV（AN 为投影后的等位基因数）。
+        Count 为投影后的期望计数，始终写为 6 位小数（未投影时也是，如 12.000000），
+        同一批输出的各群体文件格式一致。
+        """
+        target, sfs, skipped = self.spectrum(target, folded)
+        if skipped:
+            print(f"[WARN] {name}：{skipped} 个等位基因的 AN 小于 {target}，未计入频率谱"
+                  f"（可用 --sfs-an 指定更小的投影大小）。")
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as out_f:
+                writer = csv.writer(out_f)
+                writer.writerow(["AN", "AC", "Count", "Source"])
+                for ac, cnt in enumerate(sfs.tolist()):
+                    writer.writerow([target, ac, f"{cnt:.6f}", name])
+        except Exception as e:
+            sys.exit(f"无法写入 {path}：{e}")
+
+
+def hypergeom_projection(an, target, acs):
+    """
+    投影矩阵：第 i 行为 AC = acs[i]（共 an 个等位基因）的位点
+    无放回抽取 target 个等位基因后 AC 为 0..target 的概率（超几何分布）。
+    返回 (len(acs), target + 1) 矩阵。
+    """
+    lg = np.array([math.lgamma(i + 1) for i in range(an + 1)])
+    k = np.arange(target + 1)
+    proj = np.zeros((len(acs), target + 1))
+    for i, j in enumerate(np.asarray(acs).tolist()):
+        valid = (k <= j) & (target - k <= an - j)
+        kv = k[valid]
+        log_p = (lg[j] - lg[kv] - lg[j - kv]
+                 + lg[an - j] - lg[target - kv] - lg[an - j - target + kv]
+                 - (lg[an] - lg[target] - lg[an - target]))
+        proj[i, valid] = np.exp(log_p)
+    return proj
+
+
+class JointFrequencySpectrum:
+    """
+    两个群体的联合频率谱：按 (AN_A, AC_A, AN_B, AC_B) 稀疏整数计数
+    （至少在一个群体中 AC > 0 的每个 ALT 一条），写出时再投影 / 折叠，
+    并可由同一份计数得到联合 MAF 分箱矩阵。
+    """
+
+    def __init__(self):
+        self.cells = {}
+
+    def add(self, an_a, ac_a, an_b, ac_b):
+        key = (an_a, ac_a, an_b, ac_b)
+        self.cells[key] = self.cells.get(key, 0) + 1
+
+    def merge(self, other):
+        merge_counts(self.cells, other.cells)
+
+    def spectrum(self, target_a=None, target_b=None, folded=False):
+        """
+        返回 (n_a, n_b, 二维频率谱, 跳过的等位基因数)。两个群体分别按超几何分布
+        投影到 n_a / n_b（默认由 projection_size 按各自的 AN 分布取）；
+        folded 时按两群体合计频率折叠，
+        (k_a, k_b) 与 (n_a - k_a, n_b - k_b) 合并到合计 AC 较小的一侧。
+        """
+        cells = self.cells
+        an_a_counts, an_b_counts = {}, {}
+        for (an_a, _, an_b, _), cnt in cells.items():
+            an_a_counts[an_a] = an_a_counts.get(an_a, 0) + cnt
+            an_b_counts[an_b] = an_b_counts.get(an_b, 0) + cnt
+        n_a = target_a if target_a is not None else projection_size(an_a_counts)
+        n_b = target_b if target_b is not None else projection_size(an_b_counts)
+        sfs = np.zeros((n_a + 1, n_b + 1))
+        skipped = 0
+
+        by_an = {}
+        for (an_a, ac_a, an_b, ac_b), cnt in cells.items():
+            if an_a < n_a or an_b < n_b:
+                skipped += cnt
+                continue
+            by_an.setdefault((an_a, an_b), []).append((ac_a, ac_b, cnt))
+        for (an_a, an_b), entries in by_an.items():
+            ac_a, ac_b, cnt = (np.array(x) for x in zip(*entries))
+            uniq_a, uniq_b = np.unique(ac_a), np.unique(ac_b)
+            proj_a = hypergeom_projection(an_a, n_a, uniq_a)[np.searchsorted(uniq_a, ac_a)]
+            proj_b = hypergeom_projection(an_b, n_b, uniq_b)[np.searchsorted(uniq_b, ac_b)]
+            sfs += (proj_a * cnt[:, None]).T @ proj_b
+
+        if folded:
+            total = np.add.outer(np.arange(n_a + 1), np.arange(n_b + 1))
+            flip = total > (n_a + n_b) / 2
+            folded_sfs = np.where(flip, 0.0, sfs)
+            folded_sfs += np.where(flip, sfs, 0.0)[::-1, ::-1]
+            sfs = folded_sfs
+        return n_a, n_b, sfs, skipped
+
+    def maf_matrix(self, edges):
+        """
+        联合 MAF 分箱矩阵：行 / 列依次为 'absent'（该群体 AC 为 0）和各 MAF 分箱，
+        MAF 与详情表一致取百分数两位小数，超出分箱边界的不计。
+        """
+        edges = np.asarray(edges, dtype=float)
+        n_bins = len(edges) - 1
+        matrix = np.zeros((n_bins + 1, n_bins + 1), dtype=np.int64)
+
+        def maf_bin(an, ac):
+            if ac == 0 or an == 0:
+                return 0
+            af = ac / an
+            b = int(np.searchsorted(edges, round(min(af, 1 - af) * 100, 2), side="right"))
+            return b if 1 <= b <= n_bins else -1
+
+        for (an_a, ac_a, an_b, ac_b), cnt in self.cells.items():
+            i, j = maf_bin(an_a, ac_a), maf_bin(an_b, ac_b)
+            if i >= 0 and j >= 0:
+                matrix[i, j] += cnt
+        return matrix
+
+    def write(self, path, names, target=None, folded=False):
+        """
+        写出稀疏联合频率谱：<A>_AN, <A>_AC, <B>_AN, <B>_AC, Count（只写非零格），
+        Count 与 SiteFrequencySpectrum.write 相同，始终写为 6 位小数。
+        """
+        name_a, name_b = names
+        n_a, n_b, sfs, skipped = self.spectrum(target, target, folded)
+        if skipped:
+            print(f"[WARN] {name_a}/{name_b}：{skipped} 个等位基因的 AN 小于投影大小，"
+                  f"未计入联合频率谱（可用 --sfs-an 指定更小的投影大小）。")
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as out_f:
+                writer = csv.writer(out_f)
+                writer.writerow([f"{name_a}_AN", f"{name_a}_AC",
+                                 f"{name_b}_AN", f"{name_b}_AC", "Count"])
+                for k_a, k_b in zip(*np.nonzero(sfs > 1e-12)):
+                    cnt = sfs[k_a, k_b]
+                    writer.writerow([n_a, int(k_a), n_b, int(k_b), f"{cnt:.6f}"])
+        except Exception as e:
+            sys.exit(f"无法写入 {path}：{e}")
+
+    def write_maf(self, path, names, edges):
+        """写出联合 MAF 分箱矩阵（长表）：<A>_MAF, <B>_MAF, Count。"""
+        name_a, name_b = names
+        labels = ["absent"] + maf_bin_labels(list(edges))
+        matrix = self.maf_matrix(edges)
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as out_f:
+                writer = csv.writer(out_f)
+                writer.writerow([f"{name_a}_MAF", f"{name_b}_MAF", "Count"])
+                for i, label_a in enumerate(labels):
+                    for j, label_b in enumerate(labels):
+                        writer.writerow([label_a, label_b, int(matrix[i, j])])
+        except Exception as e:
+            sys.exit(f"无法写入 {path}：{e}")
+
+
+def add_sfs_args(parser, multi=False):
+    """为统计脚本添加 --sfs / --sfs-fold / --sfs-an 参数。"""
+    parser.add_argument(
+        "--sfs", nargs="?", const=True, default=None, metavar="FILE",
+        help="统计时累计位点频率谱并输出；不给文件名时为 <--out 去掉 .csv>.sfs.csv"
+             + ("，多群体模式为每个群体输出 <群体>.sfs.csv" if multi else "")
+    )
+    parser.add_argument(
+        "--sfs-fold", action="store_true",
+        help="输出折叠的频率谱（按 min(AC, AN-AC)，不区分祖先 / 衍生等位基因）"
+    )
+    parser.add_argument(
+        "--sfs-an", type=int, default=None,
+        help="把频率谱投影到固定的 AN（缺失率不同的位点按超几何分布投影，"
+             "AN 更小的位点跳过）；默认取至少保留 95%% 等位基因的最大 AN"
+    )
+
+
+def sfs_path(sfs, out_path):
+    """--sfs 的输出路径：给了文件名时直接使用，否则由 --out 推导。"""
+    if sfs is None:
+        return None
+    if sfs is not True:
+        return sfs
+    base = out_path[:-len(".csv")] if out_path.endswith(".csv") else out_path
+    return base + ".sfs.csv"
+
+
+def merge_accumulators(items):
+    """合并各区域返回的直方图 / 频率谱（均为 None 时返回 None）。"""
+    items = [x for x in items if x is not None]
+    if not items:
+        return None
+    total = items[0]
+    for item in items[1:]:
+        total.merge(item)
+    return total
+
+
+def read_sample_list(path):
+    """
+    读取样本 ID 列表（与 bcftools --samples-file 相同：每行一个 ID，
+    只取第一列，忽略空行）。
+    """
+    ids = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if fields:
+                ids.append(fields[0])
+    return ids
+
+
+def load_sample_groups(sample_dir, samples):
+    """
+    读取目录下所有 .txt 样本列表，返回 {组名: 样本下标数组}。
+
+    组名取 .txt 文件基本名；VCF 中不存在的 ID 被忽略
+    （等价于 bcftools view --force-samples），下标按 VCF 样本顺序排列。
+    """
+    files = sorted(glob.glob(os.path.join(sample_dir, "*.txt")))
+    if not files:
+        sys.exit(f"在目录 {sample_dir} 中未找到 .txt 样本列表。")
+
+    index = {s: i for i, s in enumerate(samples)}
+    groups = {}
+    for path in files:
+        name = os.path.basename(path)[:-len(".txt")]
+        idx = sorted({index[s] for s in read_sample_list(path) if s in index})
+        if not idx:
+            print(f"[WARN] {path} 中的样本均不在 VCF 中，跳过。")
+            continue
+        groups[name] = np.asarray(idx, dtype=np.intp)
+    if not groups:
+        sys.exit(f"目录 {sample_dir} 中没有可用的样本分组。")
+    return groups
+
+
+def read_metadata(path, sheet=None):
+    """读取样本信息表：.xlsx/.xls（可指定 sheet，需 openpyxl）、.tsv/.txt（制表符分隔）或 .csv。"""
+    import pandas as pd
+    try:
+        if path.endswith((".xlsx", ".xls")):
+            return pd.read_excel(path, sheet_name=sheet or 0)
+        sep = "\t" if path.endswith((".tsv", ".txt")) else ","
+        return pd.read_csv(path, sep=sep)
+    except ImportError as e:
+        sys.exit(f"读取 {path} 需要额外的依赖：{e}")
+    except (OSError, ValueError) as e:
+        sys.exit(f"无法读取样本信息表 {path}：{e}")
+
+
+def metadata_group_ids(meta, id_column="ID", where=None, defs=(), group_by=()):
+    """
+    由样本信息表定义群体，返回 {组名: 样本 ID 列表}：
+      - where：先用 pandas query 表达式筛选样本（如 "`7544个样本` == 'YES'"）
+      - defs：[(组名, query 表达式)]，如 ("East_Asia_High", "Continent == 'East_Asia' and Elevation >= 2000")
+      - group_by：列名列表，按各级前缀的取值组合生成层级群体，
+        如 [Continent, Chromopainter4] 生成 East_Asia、East_Asia-hspEAsia 等（组名用 - 连接）
+    列名含非 ASCII 字符或以数字开头时在表达式中用反引号括起。
+    """
+    if id_column not in meta.columns:
+        sys.exit(f"样本信息表中没有 ID 列：{id_column}")
+    missing = [c for c in group_by if c not in meta.columns]
+    if missing:
+        sys.exit(f"样本信息表中没有 --group-by 指定的列：{', '.join(missing)}")
+    meta = meta.astype({id_column: str})
+
+    def query(expr):
+        try:
+            return meta.query(expr)
+        except Exception as e:
+            sys.exit(f"无法解析群体表达式 {expr!r}：{e}")
+
+    if where:
+        meta = query(where)
+    groups = {}
+    for name, expr in defs:
+        groups[name] = query(expr)[id_column].tolist()
+    for level in range(1, len(group_by) + 1):
+        cols = list(group_by[:level])
+        for values, sub in meta.dropna(subset=cols).groupby(cols, sort=True):
+            name = "-".join(str(v) for v in values)
+            groups.setdefault(name, sub[id_column].tolist())
+    return groups
+
+
+def load_metadata_groups(path, samples, id_column="ID", sheet=None, where=None,
+                         defs=(), group_by=()):
+    """
+    按样本信息表中的表达式定义群体，返回 {组名: 样本下标数组}（与 load_sample_groups 相同），
+    参数含义见 metadata_group_ids。VCF 中不存在的 ID 被忽略，没有样本的群体跳过。
+    """
+    ids = metadata_group_ids(read_metadata(path, sheet), id_column, where, defs, group_by)
+    if not ids:
+        sys.exit("未定义任何群体：请指定 --group 名称=表达式 或 --group-by 列名。")
+    index = {s: i for i, s in enumerate(samples)}
+    groups = {}
+    for name, members in ids.items():
+        if not name or "/" in name or name.startswith("."):
+            sys.exit(f"群体名不能作为文件名：{name!r}")
+        idx = sorted({index[s] for s in members if s in index})
+        if not idx:
+            print(f"[WARN] 群体 {name} 的样本均不在 VCF 中，跳过。")
+            continue
+        groups[name] = np.asarray(idx, dtype=np.intp)
+    if not groups:
+        sys.exit(f"样本信息表 {path} 中定义的群体都没有 VCF 中的样本。")
+    return groups
+
+
+class GroupRollup:
+    """
+    群体的叶子划分：样本按“属于哪些群体”的成员模式归类，同一模式的样本为一个叶子
+    （如 Continent × Chromopainter4 × 海拔段）。每个位点只对这些样本做一次
+    (叶子, 类别) 计数，各群体（含嵌套的父群体）的 AN / AC 由其包含的叶子计数相加
+    （成员矩阵乘一次），不必为每个群体重新索引样本。
+    """
+
+    def __init__(self, groups):
+        self.names = list(groups)
+        n_samples = max(int(idx.max()) for idx in groups.values()) + 1
+        member = np.zeros((len(self.names), n_samples), dtype=bool)
+        for k, idx in enumerate(groups.values()):
+            member[k, idx] = True
+        self.samples = np.flatnonzero(member.any(axis=0))
+        patterns, leaf = np.unique(member[:, self.samples].T, axis=0, return_inverse=True)
+        self.leaf = leaf.reshape(-1).astype(np.intp)
+        self.n_leaves = len(patterns)
+        # matrix[k, j]：叶子 j 是否属于群体 k
+        self.matrix = patterns.T.astype(np.int64)
+        self._member = member
+        self._masks = None
+
+    def counts(self, cat, n_alt):
+        """由样本类别数组（pseudo_diploid_categories）计算各群体的 [(AN, AC 数组)]。"""
+        width = n_alt + 2
+        leaf_counts = np.bincount(self.leaf * width + cat[self.samples],
+                                  minlength=self.n_leaves * width).reshape(self.n_leaves, width)
+        group_counts = self.matrix @ leaf_counts
+        an = group_counts.sum(axis=1) - group_counts[:, n_alt + 1]
+        return [(int(an[k]), group_counts[k, 1:n_alt + 1]) for k in range(len(self.names))]
+
+    def packed_counts(self, planes):
+        """由一批双等位位点的 Bitplanes 计算各群体的 AN、AC（形状均为 群体 × 位点）。"""
+        if self._masks is None or self._masks[0] != planes.n_samples:
+            member = np.zeros((len(self.names), planes.n_samples), dtype=bool)
+            member[:, :self._member.shape[1]] = self._member
+            self._masks = (planes.n_samples, pack_bits(member), member.sum(axis=1))
+        return planes.group_counts(*self._masks[1:])
+
+
+def pseudo_diploid_categories(gt, n_alt):
+    """
+    将基因型数组（cyvcf2 的 var.genotype.array()，形状 n×3）转为每个样本的类别：
+      - 0          ：同型，计入 AN，不计入任何 AC（REF 或越界等位基因）
+      - 1..n_alt   ：同型，计入 AN 和对应 ALT 的 AC
+      - n_alt + 1  ：杂合，不计入 AN
+
+    与原逐样本循环一致：只统计 a0 == a1 的基因型（./. 两侧均为 -1，同样计入 AN）。
+    """
+    a0 = gt[:, 0]
+    hom = a0 == gt[:, 1]
+    valid = (a0 >= 1) & (a0 <= n_alt)
+    cat = np.where(valid, a0, 0)
+    cat[~hom] = n_alt + 1
+    return cat
+
+
+def allele_counts(cat, n_alt, idx=None):
+    """
+    由样本类别数组计算 (AN, AC 数组)；idx 为样本下标子集，None 表示全部样本。
+    """
+    if idx is not None:
+        cat = cat[idx]
+    counts = np.bincount(cat, minlength=n_alt + 2)
+    an = len(cat) - int(counts[n_alt + 1])
+    return an, counts[1:n_alt + 1]
+
+
+# ---------------------------------------------------------------------------
+# 位打包基因型（双等位位点按 popcount 计数）
+# ---------------------------------------------------------------------------
+
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    # NumPy < 2.0 没有 bitwise_count，按字节查表
+    _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(words):
+        """每个 uint64 字中置 1 的位数。"""
+        return _POPCOUNT8[words.view(np.uint8)].reshape(words.shape + (8,)).sum(
+            axis=-1, dtype=np.uint8)
+
+
+def pack_bits(mask):
+    """布尔数组沿最后一维打包为 uint64 字：每个字 64 个样本，低位在前，末字补 0。"""
+    n_words = -(-mask.shape[-1] // 64)
+    packed = np.packbits(mask, axis=-1, bitorder="little")
+    pad = [(0, 0)] * (packed.ndim - 1) + [(0, n_words * 8 - packed.shape[-1])]
+    return np.ascontiguousarray(np.pad(packed, pad)).view("<u8")
+
+
+def unpack_bits(words, n):
+    """pack_bits 的逆：沿最后一维还原 n 个样本的 0/1（uint8）数组。"""
+    return np.unpackbits(words.view(np.uint8), axis=-1, count=n, bitorder="little")
+
+
+def masked_popcount(planes, masks):
+    """planes（位点 × 字）与每个掩码（掩码 × 字）求交后的置位数，形状为 (掩码, 位点)。"""
+    out = np.empty((len(masks), len(planes)), dtype=np.int64)
+    for k, mask in enumerate(masks):
+        out[k] = popcount(planes & mask).sum(axis=-1, dtype=np.int64)
+    return out
+
+
+class Bitplanes:
+    """
+    一批双等位位点的位打包基因型，两个位平面均为 位点 × 字（每个 uint64 字 64 个样本）：
+      - alt ：计入 AC 的样本
+      - miss：不计入 AN 的样本
+    gt 为按位点堆叠的基因型数组（位点 × 样本 × k）。haploid 只看第一个等位基因
+    （ALT 计入 AC，缺失不计入 AN）；pseudo-diploid 与 pseudo_diploid_categories 一致
+    （1/1 计入 AC，杂合不计入 AN，./. 计入 AN）。每个样本只占 2 位，
+    AN / AC 及各群体的计数都是位平面（与群体掩码求交后）的 popcount。
+    """
+
+    def __init__(self, gt, ploidy):
+        a0 = gt[:, :, 0]
+        if ploidy == "haploid":
+            alt, miss = a0 == 1, a0 < 0
+        else:
+            hom = a0 == gt[:, :, 1]
+            alt, miss = hom & (a0 == 1), ~hom
+        self.n_samples = a0.shape[1]
+        self.alt = pack_bits(alt)
+        self.miss = pack_bits(miss)
+
+    def __len__(self):
+        return len(self.alt)
+
+    def allele_counts(self):
+        """每个位点的 AN、AC 数组。"""
+        an = self.n_samples - popcount(self.miss).sum(axis=-1, dtype=np.int64)
+        return an, popcount(self.alt).sum(axis=-1, dtype=np.int64)
+
+    def group_counts(self, masks, sizes):
+        """
+        masks 为 pack_bits 打包的群体成员（群体 × 字），sizes 为各群体样本数；
+        返回各群体的 AN、AC，形状均为 (群体, 位点)。
+        """
+        return (sizes[:, None] - masked_popcount(self.miss, masks),
+                masked_popcount(self.alt, masks))
+
+
+# ---------------------------------------------------------------------------
+# AN / AC 来源与倍性
+# ---------------------------------------------------------------------------
+
+PLOIDIES = ("diploid", "pseudo-diploid", "haploid")
+AC_SOURCES = ("info", "genotypes", "auto")
+# --ploidy auto：杂合基因型比例高于此值判为 diploid，否则为 pseudo-diploid
+HET_THRESHOLD = 0.05
+
+
+def info_counts(var, scale=1):
+    """
+    从 INFO/AN、INFO/AC 取 (AN, AC 列表)；缺失时返回 None。
+    scale 为每个样本在 INFO 中的等位基因数（伪二倍体按二倍体写出，scale=2）。
+    """
+    an = var.INFO.get("AN")
+    ac_info = var.INFO.get("AC")
+    if an is None or ac_info is None:
+        return None
+    # 多等位时 cyvcf2 返回元组
+    ac_list = list(ac_info) if isinstance(ac_info, (list, tuple)) else [ac_info]
+    if scale == 1:
+        return an, ac_list
+    if an % scale or any(ac % scale for ac in ac_list):
+        return None
+    return an // scale, [ac // scale for ac in ac_list]
+
+
+def genotype_counts(var, ploidy):
+    """
+    由基因型数组计算 (AN, AC 列表)：
+      - pseudo-diploid：只统计同型基因型，每个样本计 1 个等位基因（与原逐样本循环一致）
+      - diploid：两个等位基因分别计数，缺失不计入 AN（与 bcftools 的 INFO/AN 一致）
+      - haploid：只取第一个等位基因，缺失不计入 AN
+    """
+    n_alt = len(var.ALT)
+    gt = var.genotype.array()
+    if ploidy == "pseudo-diploid":
+        an, ac = allele_counts(pseudo_diploid_categories(gt, n_alt), n_alt)
+        return an, ac.tolist()
+
+    alleles = gt[:, :2] if ploidy == "diploid" else gt[:, :1]
+    called = alleles[alleles >= 0]
+    counts = np.bincount(called, minlength=n_alt + 1)
+    return len(called), counts[1:n_alt + 1].tolist()
+
+
+def site_counts(var, ploidy, ac_source):
+    """
+    按 ac_source（info / genotypes）取一个位点的 (AN, AC 列表)，无法计算时返回 None。
+    伪二倍体使用 INFO 时，若 INFO 缺失或 AN / AC 不能被 2 整除
+    （存在杂合或单倍体编码），该位点回退到基因型计数。
+    """
+    if ac_source == "genotypes":
+        return genotype_counts(var, ploidy)
+    if ploidy == "pseudo-diploid":
+        counts = info_counts(var, scale=2)
+        return counts if counts is not None else genotype_counts(var, ploidy)
+    return info_counts(var)
+
+
+def detect_ploidy(vcf_path, n_check=1000, het_threshold=HET_THRESHOLD):
+    """
+    检查前 n_check 条记录的基因型数组判断倍性，返回 (ploidy, 说明)：
+    单倍体编码 -> haploid；二倍体编码时统计杂合基因型占非缺失基因型的比例，
+    超过 het_threshold -> diploid，否则 -> pseudo-diploid
+    （伪二倍体数据中常有少量零星杂合，不能见到一个杂合就判为二倍体）。
+    比例只在 MAF >= 5% 的位点上统计：二倍体在这些位点上按 HWE 的杂合比例
+    至少约 9.5%，不受稀有变异多少的影响；没有这样的位点时用全部位点。
+    """
+    vcf = open_vcf(vcf_path)
+    het = [0, 0]     # [MAF >= 5% 的位点, 全部位点]
+    called = [0, 0]
+    for k, var in enumerate(vcf):
+        if k >= n_check:
+            break
+        if var.ploidy == 1:
+            vcf.close()
+            return "haploid", "基因型为单倍体编码"
+        gt = var.genotype.array()
+        a0, a1 = gt[:, 0], gt[:, 1]
+        ok = (a0 >= 0) & (a1 >= 0)
+        n = int(ok.sum())
+        if not n:
+            continue
+        n_het = int((ok & (a0 != a1)).sum())
+        alt = (int((a0[ok] > 0).sum()) + int((a1[ok] > 0).sum())) / (2 * n)
+        for i in ((0, 1) if min(alt, 1 - alt) >= 0.05 else (1,)):
+            het[i] += n_het
+            called[i] += n
+    vcf.close()
+    i = 0 if called[0] else 1
+    if not called[i]:
+        return "pseudo-diploid", "前若干条记录中没有非缺失的基因型"
+    frac = het[i] / called[i]
+    where = "MAF >= 5% 的位点" if i == 0 else "全部位点"
+    ploidy = "diploid" if frac > het_threshold else "pseudo-diploid"
+    return ploidy, (f"{where}中杂合基因型占 {frac:.2%}，"
+                    f"{'高于' if ploidy == 'diploid' else '不高于'} --het-threshold {het_threshold:g}")
+
+
+def detect_ac_source(vcf_path, ploidy, n_check=1000):
+    """
+    header 中有 INFO/AC 和 INFO/AN，且前 n_check 条记录的 INFO 计数
+    与按 ploidy 从基因型计算的结果完全一致时使用 info，否则使用 genotypes。
+    返回 (ac_source, 说明)。
+    """
+    vcf = open_vcf(vcf_path)
+    try:
+        for tag in ("AC", "AN"):
+            vcf.get_header_type(tag)
+    except KeyError:
+        vcf.close()
+        return "genotypes", "header 中没有 INFO/AC 或 INFO/AN"
+
+    scale = 2 if ploidy == "pseudo-diploid" else 1
+    checked = 0
+    for var in vcf:
+        if checked >= n_check:
+            break
+        checked += 1
+        if info_counts(var, scale) != genotype_counts(var, ploidy):
+            vcf.close()
+            return "genotypes", f"{var.CHROM}:{var.POS} 的 INFO/AC、AN 与基因型计数不一致"
+    vcf.close()
+    if not checked:
+        return "info", "VCF 中没有记录"
+    return "info", f"前 {checked} 条记录的 INFO/AC、AN 与基因型计数一致"
+
+
+def resolve_counting(vcf_path, ploidy, ac_source, het_threshold=HET_THRESHOLD):
+    """
+    解析 auto 选项，打印实际使用的倍性和 AN / AC 来源，返回 (ploidy, ac_source)。
+    het_threshold 为自动识别倍性时判为二倍体的杂合比例下限（见 detect_ploidy）。
+    """
+    if ploidy == "auto":
+        ploidy, reason = detect_ploidy(vcf_path, het_threshold=het_threshold)
+        print(f"[INFO] 自动识别倍性：{ploidy}（{reason}）")
+    if ac_source == "auto":
+        ac_source, reason = detect_ac_source(vcf_path, ploidy)
+        print(f"[INFO] AN/AC 来源：{ac_source}（{reason}）")
+    else:
+        print(f"[INFO] AN/AC 来源：{ac_source}（指定）")
+    return ploidy, ac_source
+
+
+def add_ac_source_args(parser, default_source, with_ploidy=False):
+    """添加 --ac-source（with_ploidy 为真时同时添加 --ploidy）参数。"""
+    if with_ploidy:
+        parser.add_argument(
+            "-p", "--ploidy", choices=PLOIDIES + ("auto",), default="auto",
+            help="倍性：diploid / pseudo-diploid / haploid / auto（单倍体编码为 haploid；"
+                 "否则按杂合比例，见 --het-threshold，高于阈值为 diploid，否则为 pseudo-diploid）"
+                 "[默认: auto]"
+        )
+        parser.add_argument(
+            "--het-threshold", type=float, default=HET_THRESHOLD,
+            help="--ploidy auto 时，MAF >= 5%% 位点（没有时为全部位点）上杂合基因型占非缺失"
+                 f"基因型的比例高于此值判为 diploid，否则为 pseudo-diploid [默认: {HET_THRESHOLD}]"
+        )
+    parser.add_argument(
+        "--ac-source", choices=AC_SOURCES, default=default_source,
+        help="AN/AC 来源：info（INFO 字段，最快）/ genotypes（解析基因型）/ "
+             f"auto（检查 header 和前若干条记录自动选择）[默认: {default_source}]"
+    )
+
+
+def write_site_variants(records, var_writer, source, ploidy, ac_source,
+                        maf_edges=None, sfs=False, block_sites=None):
+    """
+    共用的逐位点统计循环：按 ploidy / ac_source 取 AN 和各 ALT 的 AC，
+    把每个 ALT 的详情行写入 var_writer（为 None 时不写），
+    同时累计汇总计数，返回 (freq, type, special) 计数字典、MAF 直方图
+    （maf_edges 为 None 时为 None）和频率谱（sfs 为假时为 None）。
+    block_sites 不为 None 时改为按块处理（write_site_blocks），结果相同。
+    """
+    if block_sites:
+        return write_site_blocks(records, var_writer, source, ploidy, ac_source,
+                                 maf_edges, sfs, block_sites)
+    freq_counts    = {}
+    type_counts    = {}
+    special_counts = {}
+    maf_hist = MafHistogram(maf_edges) if maf_edges is not None else None
+    sfs_hist = SiteFrequencySpectrum() if sfs else None
+
+    for var in records:
+        counts = site_counts(var, ploidy, ac_source)
+        if counts is None:
+            continue
+        an, ac_list = counts
+        if an == 0:
+            continue
+
+        # 变异类型（基于位点，对所有 ALT 相同）
+        type_label = "SNV" if var.is_snp else "Indel"
+
+        # 逐等位统计
+        for alt, ac_val in zip(var.ALT, ac_list):
+            if ac_val <= 0:
+                continue
+
+            # 计算 AF 和 MAF
+            af = ac_val / an
+            maf = af if af <= 0.5 else 1 - af
+            freq_label = classify_freq(maf)
+            special_label = classify_special(ac_val)
+
+            if var_writer is not None:
+                var_writer.writerow([
+                    var.CHROM, var.POS, var.REF, alt, ac_val, source,
+                    freq_label, type_label, special_label, format_maf(maf)
+                ])
+
+            freq_counts[freq_label] = freq_counts.get(freq_label, 0) + 1
+            type_counts[type_label] = type_counts.get(type_label, 0) + 1
+            special_counts[special_label] = special_counts.get(special_label, 0) + 1
+            if maf_hist is not None:
+                maf_hist.add(maf)
+            if sfs_hist is not None:
+                sfs_hist.add(an, ac_val)
+
+    return freq_counts, type_counts, special_counts, maf_hist, sfs_hist
+
+
+def count_labels(counts, codes, names):
+    """把标签编号数组 codes 按 names 计入计数字典，新类别按首次出现的顺序加入。"""
+    values, first, n = np.unique(codes, return_index=True, return_counts=True)
+    for k in np.argsort(first).tolist():
+        name = names[values[k]]
+        counts[name] = counts.get(name, 0) + int(n[k])
+
+
+def write_site_blocks(records, var_writer, source, ploidy, ac_source,
+                      maf_edges=None, sfs=False, block_sites=PIPELINE_BLOCK_SITES):
+    """
+    write_site_variants 的分块版本（--pipeline）：逐位点只取 CHROM/POS/REF/ALT 和
+    (AN, AC)，单倍体 / 伪二倍体从基因型计数时双等位位点的 AN / AC 由 Bitplanes
+    整块计算；每 block_sites 个位点的 MAF、分类和计数向量化完成，详情行整块
+    交给 var_writer.writerows。返回值、详情行及其顺序与 write_site_variants 相同。
+    """
+    freq_counts, type_counts, special_counts = {}, {}, {}
+    maf_hist = MafHistogram(maf_edges) if maf_edges is not None else None
+    sfs_hist = SiteFrequencySpectrum() if sfs else None
+    packed = ac_source == "genotypes" and ploidy in ("haploid", "pseudo-diploid")
+    # 每个 ALT 一项：所属位点、ALT、AN、AC；pending 为待整块计数的 (ALT 下标, 基因型数组)
+    chroms, positions, refs, snps = [], [], [], []
+    site_of, alts, ans, acs = [], [], [], []
+    pending = []
+
+    def count_pending():
+        if pending:
+            an, ac = Bitplanes(np.stack([gt for _, gt in pending]), ploidy).allele_counts()
+            for (k, _), x, y in zip(pending, an.tolist(), ac.tolist()):
+                ans[k] = x
+                acs[k] = y
+            pending.clear()
+
+    def flush():
+        count_pending()
+        if not alts:
+            return
+        an, ac = np.asarray(ans, dtype=np.int64), np.asarray(acs, dtype=np.int64)
+        keep = np.flatnonzero((an > 0) & (ac > 0))
+        an, ac = an[keep], ac[keep]
+        af = ac / an
+        maf = np.where(af <= 0.5, af, 1 - af)
+        freq = np.select([maf >= 0.05, maf >= 0.01, maf >= 0.001], [0, 1, 2], 3)
+        special = np.where(ac == 1, 0, np.where(ac == 2, 1, 2))
+        sites = np.asarray(site_of)[keep]
+        kind = np.where(np.asarray(snps, dtype=bool)[sites], 0, 1)
+
+        count_labels(freq_counts, freq, FREQ_CLASSES)
+        count_labels(type_counts, kind, TYPE_CLASSES)
+        count_labels(special_counts, special, SPECIAL_CLASSES)
+        maf_list = maf.tolist()
+        if maf_hist is not None:
+            for value in maf_list:
+                maf_hist.add(value)
+        if sfs_hist is not None:
+            for x, y in zip(an.tolist(), ac.tolist()):
+                sfs_hist.add(x, y)
+        if var_writer is not None:
+            var_writer.writerows([
+                [chroms[i], positions[i], refs[i], alts[k], ac_val, source,
+                 FREQ_CLASSES[f], TYPE_CLASSES[t], SPECIAL_CLASSES[x], format_maf(m)]
+                for i, k, ac_val, f, t, x, m in zip(
+                    sites.tolist(), keep.tolist(), ac.tolist(), freq.tolist(),
+                    kind.tolist(), special.tolist(), maf_list)
+            ])
+        for items in (chroms, positions, refs, snps, site_of, alts, ans, acs):
+            items.clear()
+
+    for var in records:
+        alt_list = var.ALT
+        if packed and len(alt_list) == 1:
+            # cyvcf2 的记录在迭代前进后不能再取基因型，读到时取出数组
+            gt = var.genotype.array()
+            if pending and pending[0][1].shape != gt.shape:
+                count_pending()
+            pending.append((len(alts), gt))
+            an, ac_list = 0, [0]
+        else:
+            counts = site_counts(var, ploidy, ac_source)
+            if counts is None or counts[0] == 0:
+                continue
+            an, ac_list = counts
+        n = min(len(alt_list), len(ac_list))
+        site_of.extend([len(chroms)] * n)
+        alts.extend(alt_list[:n])
+        ans.extend([an] * n)
+        acs.extend(ac_list[:n])
+        chroms.append(var.CHROM)
+        positions.append(var.POS)
+        refs.append(var.REF)
+        snps.append(var.is_snp)
+        if len(chroms) == block_sites:
+            flush()
+    flush()
+    return freq_counts, type_counts, special_counts, maf_hist, sfs_hist
+
+
+# ---------------------------------------------------------------------------
+# 基于索引的区域切分与并行
+# ---------------------------------------------------------------------------
+
+def add_format_arg(parser):
+    """为统计脚本添加 --var-format / --var-compress / --compress-threads 参数。"""
+    parser.add_argument(
+        "--var-format", choices=list(VAR_FORMATS), default=None,
+        help="变异详情格式：csv / parquet / feather（列式格式需 pyarrow，"
+             "MAF 存为百分数浮点数）；默认按 --var-out 扩展名判断，否则 csv"
+    )
+    parser.add_argument(
+        "--var-compress", choices=["none", *VAR_COMPRESSIONS], default=None,
+        help="CSV 详情的压缩方式：none / gzip（.gz）/ zstd（.zst，需 zstandard）；"
+             "默认按 --var-out 后缀判断，多群体模式默认不压缩"
+    )
+    parser.add_argument(
+        "--compress-threads", type=int, default=min(4, os.cpu_count() or 1),
+        help="压缩线程数 [默认: min(4, CPU 数)]"
+    )
+
+
+def add_parallel_args(parser):
+    """为统计脚本添加 --threads / --region-chunk 参数。"""
+    parser.add_argument(
+        "-t", "--threads", type=int, default=1,
+        help="并行进程数；>1 时按索引切分区域并行处理（需 .csi/.tbi 索引）[默认: 1]"
+    )
+    parser.add_argument(
+        "--region-chunk", type=int, default=None,
+        help="每个区域的长度（bp）；默认按基因组总长度自动切为 threads×4 块"
+    )
+
+
+def split_regions(vcf_path, threads, region_chunk=None):
+    """
+    按 contig 顺序把基因组切分为 (CHROM, start, end) 区域列表（1-based，闭区间）。
+
+    每个 contig 的最后一块 end 为 None，表示一直取到 contig 末尾；
+    header 中没有 contig 长度时，整条 contig 作为一个区域。
+    """
+    if not is_store(vcf_path) and not any(os.path.exists(vcf_path + ext)
+                                          for ext in (".csi", ".tbi")):
+        sys.exit(f"并行模式需要索引文件，请先运行：bcftools index {vcf_path}")
+
+    vcf = open_vcf(vcf_path)
+    names = list(vcf.seqnames)
+    try:
+        lengths = list(vcf.seqlens)
+    except Exception:
+        lengths = [0] * len(names)
+    vcf.close()
+
+    if region_chunk is None:
+        total = sum(lengths)
+        region_chunk = math.ceil(total / (threads * 4)) if total else 0
+
+    regions = []
+    for chrom, length in zip(names, lengths):
+        if not region_chunk or not length:
+            regions.append((chrom, 1, None))
+            continue
+        start = 1
+        while start + region_chunk <= length:
+            regions.append((chrom, start, start + region_chunk - 1))
+            start += region_chunk
+        regions.append((chrom, start, None))
+    return regions
+
+
+def fetch_region(vcf, region):
+    """
+    查询区域内的记录。只保留 POS 落在区域内的记录，
+    跨越区域边界的长 indel 只归属于其起始位置所在的区域，不会重复计数。
+    """
+    chrom, start, end = region
+    query = f"{chrom}:{start}-" if end is None else f"{chrom}:{start}-{end}"
+    with warnings.catch_warnings():
+        # 空区域时 cyvcf2 会给出 "no intervals found" 警告
+        warnings.simplefilter("ignore")
+        for var in vcf(query):
+            if var.POS < start or (end is not None and var.POS > end):
+                continue
+            yield var
+
+
+def run_regions(worker, vcf_path, regions, threads, part_dir=None, *args):
+    """
+    在进程池中对每个区域调用 worker(vcf_path, region, part_path, *args)，
+    按区域顺序返回各 worker 的结果，保证与串行运行的顺序一致。
+
+    part_path 为 part_dir 下该区域的分片文件前缀（part_dir 为 None 时为 None）。
+    开启剖析（profile_utils）时各 worker 在子进程中单独计量，按区域顺序合并到主进程。
+    """
+    metrics = profile_utils.ACTIVE
+    with ProcessPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(*((profiled_call, worker) if metrics else (worker,)),
+                        vcf_path, region,
+                        part_file(part_dir, k) if part_dir else None, *args)
+            for k, region in enumerate(regions)
+        ]
+        if metrics is None:
+            return [f.result() for f in futures]
+        results = []
+        for f in futures:
+            result, snap = f.result()
+            metrics.merge(snap)
+            metrics.progress()
+            results.append(result)
+        return results
+
+
+def make_part_dir(out_path):
+    """在输出文件所在目录下创建存放分片文件的临时目录。"""
+    return tempfile.mkdtemp(prefix=".parts_",
+                            dir=os.path.dirname(os.path.abspath(out_path)))
+
+
+def part_file(part_dir, k, suffix=""):
+    """第 k 个区域的分片文件路径。"""
+    return os.path.join(part_dir, f"{k:06d}{suffix}")
+
+
+def concat_parts(part_dir, n_parts, var_writer, suffix=""):
+    """按区域顺序把 CSV 分片文件追加到详情写出器 var_writer 中。"""
+    with stage("合并分片"):
+        for k in range(n_parts):
+            path = part_file(part_dir, k, suffix)
+            if os.path.exists(path):
+                var_writer.append_part(path)
+
+
+# ---------------------------------------------------------------------------
+# 断点续跑
+# ---------------------------------------------------------------------------
+
+def add_checkpoint_args(parser):
+    """为统计脚本添加 --checkpoint / --checkpoint-chunk / --resume 参数。"""
+    parser.add_argument(
+        "--checkpoint", action="store_true",
+        help="按区域顺序统计，每完成一批区域保存断点（计数状态、详情输出偏移），需 .csi/.tbi 索引"
+    )
+    parser.add_argument(
+        "--checkpoint-chunk", type=int, default=5_000_000,
+        help="断点模式下每个区域的长度（bp）[默认: 5000000]"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="从上次的断点继续（隐含 --checkpoint）；最终输出与不中断运行完全一致"
+    )
+
+
+class Checkpoint:
+    """
+    断点文件：pickle 保存 {signature, regions, next, state, offsets}，
+    先写临时文件再改名，保存过程中被杀掉也不会损坏上一个断点。
+    signature 包含输入身份和参数，不一致时拒绝续跑。
+    """
+
+    def __init__(self, path, signature, regions):
+        self.path = path
+        self.signature = signature
+        self.regions = regions
+        self.saved = None
+
+    def load(self):
+        """读取断点；不存在时返回 None，与当前输入 / 参数不符时退出。"""
+        if not os.path.exists(self.path):
+            print(f"[INFO] 未找到断点 {self.path}，从头开始。")
+            return None
+        with open(self.path, "rb") as f:
+            saved = pickle.load(f)
+        if saved["signature"] != self.signature:
+            sys.exit(f"断点 {self.path} 与当前输入或参数不一致，请删除后重新运行（或去掉 --resume）。")
+        self.regions = saved["regions"]
+        self.saved = saved
+        done = self.regions[saved["next"] - 1]
+        print(f"[INFO] 从断点继续：已完成 {saved['next']}/{len(self.regions)} 个区域"
+              f"（至 {done[0]}:{done[2] or 'end'}）")
+        return saved
+
+    def save(self, next_region, state, offsets):
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"signature": self.signature, "regions": self.regions,
+                         "next": next_region, "state": state, "offsets": offsets}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def open_checkpoint(args, path, vcf_path, **signature):
+    """
+    断点模式（--checkpoint / --resume）时按 --checkpoint-chunk 切分区域并创建 Checkpoint，
+    --resume 时读取已有断点；否则返回 None。signature 为输入身份以外的参数。
+    """
+    if not (args.checkpoint or args.resume):
+        return None
+    regions = split_regions(vcf_path, 1, args.checkpoint_chunk)
+    ckpt = Checkpoint(path, cache_key(vcf=vcf_identity(vcf_path), **signature), regions)
+    if args.resume:
+        ckpt.load()
+    return ckpt
+
+
+def resume_offsets(ckpt, n_writers):
+    """各详情写出器续写的字节偏移（无断点时为 None）。"""
+    if ckpt is None or ckpt.saved is None:
+        return [None] * n_writers
+    return ckpt.saved["offsets"]
+
+
+def run_checkpointed(ckpt, worker, vcf_path, threads, writers, merge, *args):
+    """
+    按区域顺序统计并保存断点：每批 threads 个区域交给 run_regions，
+    分片按顺序追加到 writers（[(详情写出器, 分片后缀)]），
+    merge(state, results) 累加计数状态，然后保存 (下一区域, 状态, 详情偏移)。
+    续跑时从断点的下一区域和状态开始。返回最终状态。
+    """
+    regions = ckpt.regions
+    start, state = (ckpt.saved["next"], ckpt.saved["state"]) if ckpt.saved else (0, None)
+    part_dir = make_part_dir(ckpt.path) if writers else None
+    try:
+        for k in range(start, len(regions), threads):
+            batch = regions[k:k + threads]
+            results = run_regions(worker, vcf_path, batch, threads, part_dir, *args)
+            for var_writer, suffix in writers:
+                concat_parts(part_dir, len(batch), var_writer, suffix)
+            state = merge(state, results)
+            ckpt.save(k + len(batch), state, [w.tell() for w, _ in writers])
+    finally:
+        if part_dir:
+            shutil.rmtree(part_dir, ignore_errors=True)
+    return state
+
+
+# ---------------------------------------------------------------------------
+# 单群体统计主流程
+# ---------------------------------------------------------------------------
+
+def stats_region(vcf_path, region, part_path, write_variants, source):
+    """并行 worker：统计一个区域；part_path 为 None 时只计数不写详情。"""
+    vcf = open_vcf(vcf_path)
+    records = profile_records(fetch_region(vcf, region))
+    if part_path is None:
+        return write_variants(records, None, source)
+    with open(part_path, "w", newline="", encoding="utf-8") as part_f:
+        return write_variants(records, profile_writer(csv.writer(part_f)), source)
+
+
+def stats_code_digest():
+    """统计代码（本模块、缓存 / 存储模块和当前脚本）的校验和，作为缓存键的一部分。"""
+    return code_digest(__file__, cache_utils.__file__, store_utils.__file__,
+                       os.path.abspath(sys.argv[0]))
+
+
+def stats_outputs(args, sfs_out):
+    """单群体模式的输出文件：{缓存角色: 路径}。"""
+    outputs = {"summary": args.out}
+    if not args.summary_only:
+        outputs["var"] = args.var_out
+    if args.maf_out:
+        outputs["maf"] = args.maf_out
+    if sfs_out is not None:
+        outputs["sfs"] = sfs_out
+    return outputs
+
+
+def stats_params(args, write_variants, source, sfs_out):
+    """
+    单群体模式中影响输出内容的参数：Source + 计数方式（倍性、AN/AC 来源等）+ 输出格式。
+    --threads / --region-chunk 不影响结果，不计入。
+    """
+    params = {
+        "script": os.path.basename(sys.argv[0]),
+        "source": source,
+        "counting": dict(getattr(write_variants, "keywords", {})),
+        "var_format": None if args.summary_only else var_format(args.var_out, args.var_format),
+        "sfs": (args.sfs_an, args.sfs_fold) if sfs_out is not None else None,
+    }
+    compress = None if args.summary_only else var_compression(args.var_out, args.var_compress)
+    if compress:
+        params["var_compress"] = compress
+    return params
+
+
+def stats_cache_key(args, write_variants, source, sfs_out):
+    """单群体模式的缓存键：VCF 身份 + 影响输出的参数 + 代码校验和。"""
+    params = stats_params(args, write_variants, source, sfs_out)
+    return cache_key(vcf=vcf_identity(args.vcf), params=params, code=stats_code_digest())
+
+
+def combine_stats(results):
+    """
+    按区域顺序合并各区域的 (freq, type, special, MAF 直方图, 频率谱)，
+    返回同样结构的元组；None（断点模式的初始状态）跳过。
+    """
+    results = [r for r in results if r is not None]
+    counts = ({}, {}, {})
+    for result in results:
+        for dst, src in zip(counts, result[:3]):
+            merge_counts(dst, src)
+    return (*counts,
+            merge_accumulators(result[3] for result in results),
+            merge_accumulators(result[4] for result in results))
+
+
+def run_stats(args, write_variants, source, cache=None):
+    """
+    单群体统计主流程，供 1/2/3 三个统计脚本共用。
+
+    write_variants(records, var_writer, source, maf_edges=..., sfs=...) 逐位点统计并写出详情行，
+    同时返回 (freq, type, special) 三个计数字典、MAF 直方图和频率谱；
+    var_writer 为 None 时只计数。
+    汇总表直接由这些计数写出，不再读回详情文件；
+    args.summary_only 为真时完全不写详情文件。
+    详情格式由 args.var_format（或 --var-out 扩展名）决定：csv / parquet / feather；
+    CSV 的压缩方式由 args.var_compress（或 --var-out 的 .gz / .zst 后缀）决定。
+    指定 args.maf_out 时按 args.maf_bins 同时累计 MAF 分箱计数并写出；
+    指定 args.sfs 时同时累计位点频率谱并写出。
+    cache（cache_utils.ResultCache）不为 None 时，键命中则直接复制缓存的输出，
+    否则统计完成后存入缓存。
+    args.checkpoint / args.resume 时按区域顺序统计，每批区域后保存断点（<汇总表>.ckpt），
+    续跑时详情文件截断到断点记录的偏移后继续追加。
+    args.pipeline 时按块分类（write_site_blocks）；单进程时另用 args.io_threads 个
+    htslib 解压线程读取，详情由后台线程写出（WriterThread）。
+    """
+    maf_edges = args.maf_bins if args.maf_out else None
+    sfs_out = sfs_path(args.sfs, args.out)
+    write_variants = partial(write_variants, maf_edges=maf_edges, sfs=sfs_out is not None)
+    pipeline = getattr(args, "pipeline", False)
+    # 实际运行的统计函数；按块处理不影响结果，缓存键和断点签名仍用 write_variants
+    run_variants = (partial(write_variants, block_sites=PIPELINE_BLOCK_SITES)
+                    if pipeline else write_variants)
+
+    if cache is not None:
+        key = stats_cache_key(args, write_variants, source, sfs_out)
+        outputs = stats_outputs(args, sfs_out)
+        if cache.fetch(key, outputs):
+            print(f"[CACHE] {source}：输入和参数未变化，使用缓存结果")
+            return
+
+    ckpt = open_checkpoint(args, args.out + ".ckpt", args.vcf,
+                           params=stats_params(args, write_variants, source, sfs_out),
+                           code=stats_code_digest())
+    # 断点和多进程模式由各区域的 worker 自己打开 VCF，单进程时才在这里打开；
+    # 都在写出详情前完成，输入有误时不留下空的详情文件
+    if ckpt is None and args.threads > 1:
+        # 按索引切分区域，多进程统计，分片按区域顺序拼接、计数按区域顺序合并
+        regions = split_regions(args.vcf, args.threads, args.region_chunk)
+    elif ckpt is None:
+        try:
+            vcf = open_vcf(args.vcf, threads=args.io_threads if pipeline else None)
+        except Exception as e:
+            sys.exit(f"无法打开 VCF：{e}")
+    var_writer = None
+    if not args.summary_only:
+        fmt = var_format(args.var_out, args.var_format)
+        var_writer = open_var_writer(args.var_out, fmt, source,
+                                     resume_offset=resume_offsets(ckpt, 1)[0],
+                                     staged=ckpt is not None,
+                                     compress=var_compression(args.var_out, args.var_compress),
+                                     threads=args.compress_threads)
+
+    if ckpt is not None:
+        writers = [(var_writer, "")] if var_writer else []
+        state = run_checkpointed(
+            ckpt, stats_region, args.vcf, args.threads, writers,
+            lambda state, results: combine_stats([state, *results]),
+            run_variants, source)
+        *counts, maf_hist, sfs_hist = combine_stats([state])
+    elif args.threads > 1:
+        part_dir = make_part_dir(args.var_out) if var_writer else None
+        try:
+            results = run_regions(stats_region, args.vcf, regions, args.threads,
+                                  part_dir, run_variants, source)
+            if var_writer:
+                concat_parts(part_dir, len(regions), var_writer)
+        finally:
+            if part_dir:
+                shutil.rmtree(part_dir, ignore_errors=True)
+        *counts, maf_hist, sfs_hist = combine_stats(results)
+    else:
+        with WriterThread(enabled=pipeline) as writer_thread:
+            *counts, maf_hist, sfs_hist = run_variants(
+                profile_records(vcf), profile_writer(writer_thread.wrap(var_writer)), source)
+
+    if var_writer:
+        with stage("关闭输出"):
+            var_writer.close()
+    write_summary(args.out, *counts, source)
+    if maf_edges is not None:
+        maf_hist = maf_hist or MafHistogram(maf_edges)
+        maf_hist.write(args.maf_out, source)
+    if sfs_out is not None:
+        sfs_hist = sfs_hist or SiteFrequencySpectrum()
+        sfs_hist.write(sfs_out, source, args.sfs_an, args.sfs_fold)
+    if ckpt is not None:
+        ckpt.remove()
+    if cache is not None:
+        cache.store(key, outputs)